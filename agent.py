@@ -1,39 +1,195 @@
-from typing import Tuple, List
-from gridworld import GridWorld
+import numpy as np
+from typing import Tuple, List, Dict, Any, Optional
+from gridworld import GridWorld, policy_action_indices
 
 
-def follow_policy(grid_world: GridWorld, verbose: bool = True) -> List[Tuple[int, int]]:
+# Default step budget for a single rollout
+DEFAULT_MAX_STEPS = 10000
+
+# Reasons a rollout stops
+TERMINAL = 'terminal'
+MAX_STEPS = 'max_steps'
+CYCLE = 'cycle'
+
+
+class PathBuffer:
     """
-    Follow the policy and return the path taken by the agent.
+    Growable int32 buffer of visited states stored as flat indices row * N + col.
+    
+    Storage is preallocated and doubled when full, so recording a long episode
+    costs one int32 per step instead of one Python tuple per step. The buffer
+    can be cleared and reused across rollouts.
+    """
+    
+    def __init__(self, N: int, capacity: int = 64):
+        """
+        Initialize the PathBuffer.
+        
+        Args:
+            N: Size of the grid (N x N)
+            capacity: Initial number of slots
+        """
+        self.N = N
+        self._data = np.empty(max(1, capacity), dtype=np.int32)
+        self._length = 0
+    
+    def append(self, position: Tuple[int, int]) -> None:
+        """Record a (row, col) position."""
+        if self._length == len(self._data):
+            grown = np.empty(2 * len(self._data), dtype=np.int32)
+            grown[:self._length] = self._data
+            self._data = grown
+        self._data[self._length] = position[0] * self.N + position[1]
+        self._length += 1
+    
+    def clear(self) -> None:
+        """Forget all recorded positions, keeping the storage."""
+        self._length = 0
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    @property
+    def array(self) -> np.ndarray:
+        """View of the recorded flat state indices."""
+        return self._data[:self._length]
+    
+    def positions(self) -> List[Tuple[int, int]]:
+        """Recorded path as a list of (row, col) tuples."""
+        return [divmod(int(s), self.N) for s in self.array]
+
+
+def iter_policy(grid_world: GridWorld, max_steps: int = DEFAULT_MAX_STEPS):
+    """
+    Follow the policy lazily, yielding one step at a time.
+    
+    Consumers that only need a prefix of the episode can stop iterating early.
+    Deterministic worlds stop as soon as a state repeats (the policy is then
+    stuck in a cycle), detected with a visited-state bitmap. Every rollout also
+    stops after max_steps steps. The reason for stopping (TERMINAL, MAX_STEPS
+    or CYCLE) is the generator's return value.
     
     Args:
-        grid_world: GridWorld instance
-        verbose: Whether to print step-by-step information
+        grid_world: GridWorld or StochasticGridWorld instance
+        max_steps: Maximum number of steps before giving up
         
-    Returns:
-        List of positions visited by the agent
+    Yields:
+        Tuples of (move, state, reward, done)
     """
-    grid_world.reset()
-    path = [grid_world.position]
-    steps = 0
+    N = grid_world.N
+    detect_cycles = getattr(grid_world, 'deterministic', False)
+    visited = bytearray(N * N) if detect_cycles else None
     
-    if verbose:
-        print("Following policy:")
+    grid_world.reset()
+    if detect_cycles:
+        visited[grid_world.position[0] * N + grid_world.position[1]] = 1
     
-    while True:
+    for _ in range(max_steps):
         row, col = grid_world.position
         move = grid_world.policy[row][col]
         reward, state, done = grid_world.action(move)
+        yield move, state, reward, done
+        
+        if done:
+            return TERMINAL
+        
+        if detect_cycles:
+            index = state[0] * N + state[1]
+            if visited[index]:
+                return CYCLE
+            visited[index] = 1
+    
+    return MAX_STEPS
+
+
+def rollout(grid_world: GridWorld, max_steps: int = DEFAULT_MAX_STEPS, 
+            verbose: bool = False, compact: bool = False) -> Dict[str, Any]:
+    """
+    Follow the policy once, collecting path, reward and length in a single pass.
+    
+    Stops at the terminal state, after max_steps steps, or (in deterministic
+    worlds) as soon as the policy revisits a state; see iter_policy.
+    
+    Args:
+        grid_world: GridWorld or StochasticGridWorld instance
+        max_steps: Maximum number of steps before giving up
+        verbose: Whether to print step-by-step information
+        compact: Return the path as an int32 array of flat state indices
+            (row * N + col) instead of a list of (row, col) tuples
+        
+    Returns:
+        Dictionary with 'path', 'total_reward', 'length' and 'termination'
+        (TERMINAL, MAX_STEPS or CYCLE)
+    """
+    steps_iter = iter_policy(grid_world, max_steps)
+    path = PathBuffer(grid_world.N) if compact else []
+    path.append(grid_world.start)
+    total_reward = 0
+    steps = 0
+    
+    while True:
+        try:
+            move, state, reward, done = next(steps_iter)
+        except StopIteration as stop:
+            termination = stop.value
+            break
         steps += 1
+        total_reward += reward
         path.append(state)
         
         if verbose:
             print(f"Step {steps}: Move {move} → State {state}, Reward {reward}, Done {done}")
+    
+    return {
+        'path': path.array if compact else path,
+        'total_reward': total_reward,
+        'length': steps,
+        'termination': termination
+    }
+
+
+def follow_policy(grid_world: GridWorld, verbose: bool = True, 
+                  max_steps: int = DEFAULT_MAX_STEPS,
+                  performance: Optional[Dict[str, Any]] = None) -> List[Tuple[int, int]]:
+    """
+    Follow the policy and return the path taken by the agent.
+    
+    Args:
+        grid_world: GridWorld instance
+        verbose: Whether to print step-by-step information
+        max_steps: Maximum number of steps before giving up
+        performance: Result of analyze_policy_performance to replay instead of
+            rolling out a new episode, so that the printed trace describes the
+            same run (in a stochastic world, another rollout samples another
+            episode)
         
-        if done:
-            if verbose:
-                print(f"\nReached terminal state in {steps} steps.")
-            break
+    Returns:
+        List of positions visited by the agent
+    """
+    if verbose:
+        print("Following policy:")
+    
+    if performance is None:
+        result = rollout(grid_world, max_steps=max_steps, verbose=verbose)
+        path, length = result['path'], result['length']
+    else:
+        result = performance
+        path, length = performance['path'], performance['path_length']
+        if verbose:
+            # Every step pays the reward of the cell it enters
+            for step in range(1, len(path)):
+                (row, col), state = path[step - 1], path[step]
+                print(f"Step {step}: Move {grid_world.policy[row][col]} → State {state}, "
+                      f"Reward {grid_world.rewards[state[0]][state[1]]}, "
+                      f"Done {state == grid_world.terminal}")
+    
+    if verbose:
+        if result['termination'] == TERMINAL:
+            print(f"\nReached terminal state in {length} steps.")
+        elif result['termination'] == CYCLE:
+            print(f"\nPolicy is stuck in a cycle after {length} steps.")
+        else:
+            print(f"\nStopped after {length} steps without reaching the terminal state.")
     
     return path
 
@@ -51,47 +207,125 @@ def get_policy_path(grid_world: GridWorld) -> List[Tuple[int, int]]:
     return follow_policy(grid_world, verbose=False)
 
 
-def calculate_total_reward(grid_world: GridWorld) -> float:
+def calculate_total_reward(grid_world: GridWorld, max_steps: int = DEFAULT_MAX_STEPS) -> float:
     """
     Calculate the total reward obtained by following the policy.
     
     Args:
         grid_world: GridWorld instance
+        max_steps: Maximum number of steps before giving up
         
     Returns:
         Total reward obtained
     """
-    grid_world.reset()
-    total_reward = 0
+    return rollout(grid_world, max_steps=max_steps)['total_reward']
+
+
+def analyze_policy_performance(grid_world: GridWorld, max_steps: int = DEFAULT_MAX_STEPS) -> dict:
+    """
+    Analyze the performance of the current policy.
     
-    while True:
-        row, col = grid_world.position
-        move = grid_world.policy[row][col]
-        reward, state, done = grid_world.action(move)
-        total_reward += reward
+    Args:
+        grid_world: GridWorld instance
+        max_steps: Maximum number of steps before giving up
         
-        if done:
-            break
+    Returns:
+        Dictionary containing performance metrics
+    """
+    result = rollout(grid_world, max_steps=max_steps)
+    path_length = result['length']
     
-    return total_reward
+    return {
+        'path_length': path_length,
+        'total_reward': result['total_reward'],
+        'path': result['path'],
+        'efficiency': result['total_reward'] / path_length if path_length > 0 else 0,
+        'termination': result['termination']
+    }
 
 
-def analyze_policy_performance(grid_world: GridWorld) -> dict:
+def policy_successors(grid_world: GridWorld) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Analyze the performance of the current policy.
+    Build the successor and step-reward arrays of a deterministic policy.
+    
+    States are flat indices row * N + col. The terminal state is absorbing
+    with zero reward.
     
     Args:
         grid_world: GridWorld instance
         
     Returns:
-        Dictionary containing performance metrics
+        Tuple of (successor, reward) arrays of length N * N
+    """
+    N = grid_world.N
+    actions = policy_action_indices(grid_world)
+    rows, cols = np.divmod(np.arange(N * N), N)
+    
+    # Moves off the grid leave the agent in place, as in GridWorld.move
+    next_rows = np.clip(rows + np.array([-1, 1, 0, 0])[actions], 0, N - 1)
+    next_cols = np.clip(cols + np.array([0, 0, 1, -1])[actions], 0, N - 1)
+    successor = next_rows * N + next_cols
+    reward = np.asarray(grid_world.rewards, dtype=float)[next_rows, next_cols]
+    
+    terminal = grid_world.terminal[0] * N + grid_world.terminal[1]
+    successor[terminal] = terminal
+    reward[terminal] = 0.0
+    return successor, reward
+
+
+def all_start_paths(grid_world: GridWorld) -> Dict[str, np.ndarray]:
     """
-    path = get_policy_path(grid_world)
-    total_reward = calculate_total_reward(grid_world)
+    Compute path length and total reward to the terminal from every start cell.
+    
+    Uses pointer doubling (binary lifting) over the successor array: level k
+    stores where each state is after 2^k steps and the reward collected on the
+    way, so every start state is resolved with O(log S) vectorized jumps
+    instead of one rollout per cell.
     
+    Args:
+        grid_world: GridWorld instance (deterministic)
+        
+    Returns:
+        Dictionary of (N, N) arrays: 'steps' (-1 if the goal is never reached),
+        'total_reward' (nan if never reached) and boolean 'reaches_goal'
+    """
+    N = grid_world.N
+    S = N * N
+    terminal = grid_world.terminal[0] * N + grid_world.terminal[1]
+    successor, reward = policy_successors(grid_world)
+    
+    # A path that reaches the goal visits each state at most once
+    levels = max(1, int(np.ceil(np.log2(S)))) + 1
+    jumps = [successor]
+    gains = [reward]
+    for _ in range(1, levels):
+        jump, gain = jumps[-1], gains[-1]
+        gains.append(gain + gain[jump])
+        jumps.append(jump[jump])
+    
+    current = np.arange(S)
+    steps = np.zeros(S, dtype=np.int64)
+    total = np.zeros(S)
+    for k in range(levels - 1, -1, -1):
+        # Take the 2^k jump only where it does not land on the terminal yet
+        target = jumps[k][current]
+        move = target != terminal
+        steps[move] += 1 << k
+        total[move] += gains[k][current[move]]
+        current[move] = target[move]
+    
+    # One more step reaches the terminal for every state that can reach it
+    reaches = (successor[current] == terminal)
+    away = reaches & (np.arange(S) != terminal)
+    steps[away] += 1
+    total[away] += reward[current[away]]
+    steps[terminal] = 0
+    total[terminal] = 0.0
+    
+    steps[~reaches] = -1
+    total[~reaches] = np.nan
     return {
-        'path_length': len(path) - 1,  # Subtract 1 because path includes start position
-        'total_reward': total_reward,
-        'path': path,
-        'efficiency': total_reward / (len(path) - 1) if len(path) > 1 else 0
-    } 
\ No newline at end of file
+        'steps': steps.reshape(N, N),
+        'total_reward': total.reshape(N, N),
+        'reaches_goal': reaches.reshape(N, N)
+    }
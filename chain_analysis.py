@@ -0,0 +1,257 @@
+"""
+Exact analysis of the Markov chain a policy induces on a StochasticGridWorld.
+
+Under a fixed policy the windy grid world is an absorbing Markov chain with the
+terminal cell as its only absorbing state. Writing Q for the transient-to-
+transient block of the transition matrix, the fundamental-matrix identities
+
+    (I - Q) t = 1                       expected steps to the goal
+    (I - Q) x = t,  Var = 2x - t - t^2  variance of the number of steps
+    (I - gamma Q) v = r                 expected (discounted) return
+
+give exact per-state statistics from a few sparse linear solves instead of
+thousands of sampled rollouts. Returns count the reward of every cell entered,
+including the terminal one, and nothing after absorption.
+
+SciPy's sparse solvers are used when available; otherwise the same systems are
+solved densely with NumPy.
+"""
+
+import numpy as np
+from typing import Dict, Optional
+
+from gridworld import policy_action_indices
+
+try:
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+except ImportError:
+    sp = None
+    spla = None
+
+
+def policy_transition_matrix(grid_world, policy: Optional[np.ndarray] = None):
+    """
+    Build the state-to-state transition matrix of the policy-induced chain.
+
+    Args:
+        grid_world: StochasticGridWorld instance
+        policy: Optional flat array of action indices; defaults to grid_world.policy
+
+    Returns:
+        (S, S) matrix in CSR format (or a dense array without SciPy); the
+        terminal row is an absorbing self-loop
+    """
+    model = grid_world.transitions
+    actions = policy_action_indices(grid_world) if policy is None else np.asarray(policy)
+    S = model.n_states
+    states = np.arange(S)
+    cols = np.asarray(model.next_states[states, actions]).ravel()
+    vals = np.asarray(model.probs[states, actions]).ravel()
+    rows = np.repeat(states, model.next_states.shape[2])
+
+    if sp is not None:
+        # Duplicate (row, col) entries, e.g. clipped outcomes, are summed
+        return sp.csr_matrix((vals, (rows, cols)), shape=(S, S))
+
+    matrix = np.zeros((S, S))
+    np.add.at(matrix, (rows, cols), vals)
+    return matrix
+
+
+def _can_reach(P, target: np.ndarray) -> np.ndarray:
+    """Mask of states with a positive-probability path into the target set."""
+    adjacency = P > 0
+    reach = target.copy()
+    while True:
+        step = np.asarray(adjacency @ reach.astype(float)).ravel() > 0
+        grown = reach | step
+        if np.array_equal(grown, reach):
+            return reach
+        reach = grown
+
+
+def absorbed_states(P, terminal: int) -> np.ndarray:
+    """
+    Mask of states absorbed at the terminal with probability one.
+
+    A state qualifies if it can reach the terminal and cannot reach any state
+    from which the terminal is unreachable.
+    """
+    goal = np.zeros(P.shape[0], dtype=bool)
+    goal[terminal] = True
+    stuck = ~_can_reach(P, goal)
+    if not stuck.any():
+        return np.ones(P.shape[0], dtype=bool)
+    return ~_can_reach(P, stuck)
+
+
+class _Solver:
+    """Factorize I - c * Q once and reuse it for several right-hand sides."""
+
+    def __init__(self, Q, c: float = 1.0):
+        n = Q.shape[0]
+        if sp is not None:
+            self._lu = spla.splu(sp.identity(n, format='csc') - c * sp.csc_matrix(Q))
+            self._solve = self._lu.solve
+        else:
+            A = np.eye(n) - c * Q
+            self._solve = lambda b: np.linalg.solve(A, b)
+
+    def __call__(self, b: np.ndarray) -> np.ndarray:
+        return self._solve(b)
+
+
+def absorbing_chain_statistics(grid_world, gamma: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    Compute exact episode statistics for every start state.
+
+    Args:
+        grid_world: StochasticGridWorld instance
+        gamma: Discount factor for the expected return
+
+    Returns:
+        Dictionary of (N, N) arrays: 'expected_steps', 'steps_variance',
+        'steps_std', 'expected_return' and the boolean 'reaches_goal'. States
+        that are not absorbed with probability one get inf steps and nan return.
+    """
+    N = grid_world.N
+    terminal = grid_world.terminal[0] * N + grid_world.terminal[1]
+    rewards = np.asarray(grid_world.rewards, dtype=float).ravel()
+    P = policy_transition_matrix(grid_world)
+
+    good = absorbed_states(P, terminal)
+    transient = np.flatnonzero(good & (np.arange(P.shape[0]) != terminal))
+
+    expected_steps = np.full(P.shape[0], np.inf)
+    steps_variance = np.full(P.shape[0], np.inf)
+    expected_return = np.full(P.shape[0], np.nan)
+    expected_steps[terminal] = steps_variance[terminal] = expected_return[terminal] = 0.0
+
+    if len(transient):
+        P_t = P[transient]
+        Q = P_t[:, transient]
+        # Expected reward of the next cell entered, terminal included
+        step_reward = np.asarray(P_t @ rewards).ravel()
+
+        solve = _Solver(Q)
+        t = solve(np.ones(len(transient)))
+        x = solve(t)
+        expected_steps[transient] = t
+        steps_variance[transient] = np.maximum(2.0 * x - t - t * t, 0.0)
+        expected_return[transient] = (solve if gamma == 1.0 else _Solver(Q, gamma))(step_reward)
+
+    return {
+        'expected_steps': expected_steps.reshape(N, N),
+        'steps_variance': steps_variance.reshape(N, N),
+        'steps_std': np.sqrt(steps_variance).reshape(N, N),
+        'expected_return': expected_return.reshape(N, N),
+        'reaches_goal': good.reshape(N, N),
+    }
+
+
+def start_state_statistics(grid_world, gamma: float = 1.0) -> Dict[str, float]:
+    """
+    Exact statistics for grid_world.start, shaped like analyze_policy_performance.
+
+    Returns:
+        Dictionary with 'expected_path_length', 'path_length_std',
+        'expected_total_reward' and 'efficiency'
+    """
+    stats = absorbing_chain_statistics(grid_world, gamma)
+    row, col = grid_world.start
+    steps = float(stats['expected_steps'][row, col])
+    total = float(stats['expected_return'][row, col])
+    return {
+        'expected_path_length': steps,
+        'path_length_std': float(stats['steps_std'][row, col]),
+        'expected_total_reward': total,
+        'efficiency': total / steps if 0 < steps < np.inf else 0,
+    }
+
+
+def propagate_occupancy(grid_world, T: int, start=None, store_steps: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Push a start-state distribution through the policy-induced chain for T steps.
+
+    Args:
+        grid_world: StochasticGridWorld instance
+        T: Number of steps to propagate
+        start: (row, col) start cell (tuple, list or array) or an (N, N) or
+            flat (N * N,) start distribution; defaults to grid_world.start
+        store_steps: Whether to keep the full (T + 1, N, N) occupancy tensor;
+            set to False on large maps to keep only the cumulative heatmap
+
+    Returns:
+        Dictionary with:
+            'occupancy': (T + 1, N, N) distribution over cells at steps 0..T
+                (absorbed mass stays on the terminal cell); only if store_steps
+            'absorbed': (T + 1,) probability of first reaching the terminal at each step
+            'visits': (N, N) expected number of visits to each cell within T steps,
+                counting the terminal once on arrival
+            'remaining': probability mass not yet absorbed after T steps
+    """
+    N = grid_world.N
+    S = N * N
+    terminal = grid_world.terminal[0] * N + grid_world.terminal[1]
+    P = policy_transition_matrix(grid_world)
+    P_T = P.T.tocsr() if sp is not None else P.T
+
+    if start is None:
+        start = grid_world.start
+    p = np.zeros(S)
+    if np.ndim(start) == 1 and len(start) == 2:
+        # A (row, col) cell, as a tuple, list or array
+        p[int(start[0]) * N + int(start[1])] = 1.0
+    elif np.shape(start) in ((N, N), (S,)):
+        p[:] = np.asarray(start, dtype=float).ravel()
+    else:
+        raise ValueError(f"start must be a (row, col) cell or an ({N}, {N}) distribution, "
+                         f"got shape {np.shape(start)}")
+
+    occupancy = np.empty((T + 1, S)) if store_steps else None
+    absorbed = np.zeros(T + 1)
+    visits = np.zeros(S)
+
+    absorbed[0] = p[terminal]
+    for t in range(T + 1):
+        if t > 0:
+            reached = p[terminal]
+            p = P_T @ p
+            absorbed[t] = p[terminal] - reached
+        if store_steps:
+            occupancy[t] = p
+        visits += p
+        visits[terminal] -= p[terminal]
+
+    visits[terminal] = absorbed.sum()
+    result = {
+        'absorbed': absorbed,
+        'visits': visits.reshape(N, N),
+        'remaining': float(1.0 - p[terminal]),
+    }
+    if store_steps:
+        result['occupancy'] = occupancy.reshape(T + 1, N, N)
+    return result
+
+
+def path_length_quantiles(absorbed: np.ndarray, quantiles=(0.05, 0.5, 0.95)) -> Dict[float, float]:
+    """
+    Exact quantiles of the episode length from per-step absorption probabilities.
+
+    Quantiles beyond the propagated horizon are reported as inf.
+    """
+    cdf = np.cumsum(absorbed)
+    result = {}
+    for q in quantiles:
+        idx = int(np.searchsorted(cdf, q - 1e-12))
+        result[q] = float(idx) if idx < len(cdf) else np.inf
+    return result
+
+
+def default_horizon(grid_world, tail_std: float = 6.0) -> int:
+    """Horizon covering the expected episode length plus tail_std standard deviations."""
+    stats = start_state_statistics(grid_world)
+    if not np.isfinite(stats['expected_path_length']):
+        return 4 * grid_world.N * grid_world.N
+    return int(np.ceil(stats['expected_path_length'] + tail_std * stats['path_length_std'])) + 1
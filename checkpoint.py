@@ -0,0 +1,83 @@
+"""
+Checkpoint files for long training runs.
+
+A checkpoint is a single uncompressed .npz archive: the learner's arrays (Q,
+visit flags, return statistics, progress logs) stored as raw NumPy arrays,
+plus one 'meta' entry holding the scalars (episode index, epsilon, ...) and
+the bit-generator states as UTF-8 JSON. Nothing is pickled, so a checkpoint
+can be loaded with allow_pickle=False and does not depend on the learner's
+class definition.
+
+Files are written to a temporary file in the target directory, flushed to
+disk and then moved over the previous checkpoint with os.replace, so a crash
+mid-write leaves the last complete checkpoint intact.
+"""
+
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Any, Dict, Tuple
+
+
+def save_checkpoint(path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+    """
+    Atomically write a checkpoint.
+
+    Args:
+        path: Checkpoint file; replaced if it exists
+        arrays: Named arrays to store
+        meta: JSON-serializable scalars and generator states
+    """
+    if 'meta' in arrays:
+        raise ValueError("'meta' is reserved for the checkpoint metadata")
+    directory = os.path.dirname(os.path.abspath(path))
+    encoded = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, meta=encoded, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Read a checkpoint written by save_checkpoint.
+
+    Returns:
+        Tuple of (arrays, meta)
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != 'meta'}
+        meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+    return arrays, meta
+
+
+def restore_rng(rng: np.random.Generator, state: Dict[str, Any]) -> np.random.Generator:
+    """
+    Put a generator back into a saved bit_generator.state.
+
+    The state is set in place when the bit generators match, so every object
+    sharing the generator (e.g. a learner and its QTable) continues from it;
+    otherwise a new generator of the saved kind is returned.
+    """
+    if type(rng.bit_generator).__name__ != state['bit_generator']:
+        rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+    rng.bit_generator.state = state
+    return rng
+
+
+def check_shapes(arrays: Dict[str, np.ndarray], expected: Dict[str, Tuple[int, ...]]) -> None:
+    """Raise ValueError if a checkpoint's arrays do not fit the learner restoring them."""
+    for name, shape in expected.items():
+        if name not in arrays:
+            raise ValueError(f"Checkpoint has no {name!r} array")
+        if arrays[name].shape != tuple(shape):
+            raise ValueError(f"Checkpoint {name!r} has shape {arrays[name].shape}, expected {tuple(shape)}")
@@ -0,0 +1,230 @@
+"""
+Convergence monitors for the tabular learners.
+
+A ConvergenceMonitor is checked every check_interval episodes with the
+learner's current values (Q as an (S, A) array, or V for prediction) and,
+for control, its greedy policy as an (S,) array of action indices. Each
+criterion latches the first episode at which it is satisfied:
+
+    PolicyStability     the greedy policy was identical at `checks`
+                        consecutive checks
+    ValueTolerance      max |delta Q| between consecutive checks fell below
+                        a tolerance
+    ReferenceAgreement  the greedy policy picks an acceptable action of a
+                        reference (e.g. dynamic-programming) policy in at
+                        least a given fraction of its states
+
+Training stops once all criteria (or any, with stop='any') have been met;
+monitor.met_at maps every criterion name to its episode, or None.
+
+Example:
+    monitor = ConvergenceMonitor([PolicyStability(5), ValueTolerance(1e-3)], check_interval=1000)
+    learner.train(episodes=100000, monitor=monitor)
+    print(monitor.met_at)
+"""
+
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Sequence
+
+ACTIONS = ['N', 'S', 'E', 'W']
+
+
+def reference_mask(reference, n: int, actions: Sequence[str] = ACTIONS) -> np.ndarray:
+    """
+    Turn a reference policy into an (S, A) mask of acceptable actions.
+
+    Args:
+        reference: An (S, A) boolean mask (returned as is); a grid of action
+            strings such as GridWorld.policy after calculate_new_policy; a
+            dictionary mapping (row, col) to an action string, as returned by
+            extract_policy; or an (S,) array of action indices. Entries that
+            are not actions (e.g. '' or 'G' at the terminal, or -1) are not
+            compared
+        n: Size of the grid (n x n)
+        actions: Action strings, in index order
+    """
+    if isinstance(reference, np.ndarray) and reference.ndim == 2 and reference.dtype == bool:
+        return reference
+    mask = np.zeros((n * n, len(actions)), dtype=bool)
+    if isinstance(reference, dict):
+        items = ((r * n + c, action) for (r, c), action in reference.items())
+    elif isinstance(reference, np.ndarray) and reference.ndim == 1:
+        items = ((s, int(a)) for s, a in enumerate(reference))
+    else:
+        items = ((r * n + c, action) for r, row in enumerate(reference) for c, action in enumerate(row))
+    for s, action in items:
+        if isinstance(action, str):
+            if action in actions:
+                mask[s, actions.index(action)] = True
+        elif 0 <= action < len(actions):
+            mask[s, action] = True
+    return mask
+
+
+def optimal_actions(Q: np.ndarray, tolerance: float = 1e-9) -> np.ndarray:
+    """
+    Return the (S, A) mask of actions within tolerance of max_a Q(s, a).
+
+    Use it on an exact Q* (e.g. from offline_rl.EmpiricalModel.value_iteration)
+    so that ReferenceAgreement accepts every optimal action, not one tie.
+    """
+    return Q >= np.nanmax(Q, axis=1, keepdims=True) - tolerance
+
+
+class Criterion(ABC):
+    """
+    Base class of the convergence criteria.
+    """
+
+    name = 'criterion'
+
+    def __init__(self):
+        self.met_at = None
+
+    @abstractmethod
+    def satisfied(self, episode: int, values: np.ndarray, policy: Optional[np.ndarray]) -> bool:
+        """Whether the criterion holds at this check."""
+
+    def update(self, episode: int, values: np.ndarray, policy: Optional[np.ndarray]) -> bool:
+        """Evaluate the criterion at a check; returns whether it has been met (latched)."""
+        if self.satisfied(episode, values, policy) and self.met_at is None:
+            self.met_at = episode
+        return self.met_at is not None
+
+    def _require(self, policy: Optional[np.ndarray]) -> np.ndarray:
+        if policy is None:
+            raise ValueError(f"{self.name} needs a greedy policy; use ValueTolerance for prediction")
+        return policy
+
+
+class PolicyStability(Criterion):
+    """
+    The greedy policy did not change over `checks` consecutive checks.
+    """
+
+    name = 'policy_stability'
+
+    def __init__(self, checks: int = 5):
+        super().__init__()
+        if checks < 2:
+            raise ValueError("checks must be at least 2")
+        self.checks = checks
+        self._previous = None
+        self._streak = 0
+
+    def satisfied(self, episode, values, policy):
+        policy = self._require(policy)
+        same = self._previous is not None and np.array_equal(policy, self._previous)
+        self._streak = self._streak + 1 if same else 1
+        self._previous = policy.copy()
+        return self._streak >= self.checks
+
+
+class ValueTolerance(Criterion):
+    """
+    max |delta Q| (or |delta V|) between consecutive checks is below tolerance.
+    """
+
+    name = 'value_tolerance'
+
+    def __init__(self, tolerance: float = 1e-3):
+        super().__init__()
+        self.tolerance = tolerance
+        self._previous = None
+        self.last_delta = np.inf
+
+    def satisfied(self, episode, values, policy):
+        values = np.asarray(values, dtype=float)
+        if self._previous is not None:
+            self.last_delta = float(np.nanmax(np.abs(values - self._previous)))
+        self._previous = values.copy()
+        return self.last_delta < self.tolerance
+
+
+class ReferenceAgreement(Criterion):
+    """
+    The greedy policy agrees with a reference policy in at least min_agreement of its states.
+    """
+
+    name = 'reference_agreement'
+
+    def __init__(self, reference, n: int, actions: Sequence[str] = ACTIONS, min_agreement: float = 1.0):
+        """
+        Args:
+            reference: Reference policy in any form accepted by reference_mask
+            n: Size of the grid (n x n)
+            actions: Action strings, in index order
+            min_agreement: Fraction of the reference's states that must agree
+        """
+        super().__init__()
+        self.mask = reference_mask(reference, n, actions)
+        self.states = np.flatnonzero(self.mask.any(axis=1))
+        self.min_agreement = min_agreement
+        self.agreement = 0.0
+
+    def satisfied(self, episode, values, policy):
+        policy = self._require(policy)
+        self.agreement = float(self.mask[self.states, policy[self.states]].mean())
+        return self.agreement >= self.min_agreement
+
+
+class ConvergenceMonitor:
+    """
+    Checks a set of criteria during training and decides when to stop.
+    """
+
+    def __init__(self, criteria: Sequence[Criterion], check_interval: int = 1000,
+                 stop: str = 'all', verbose: bool = True):
+        """
+        Initialize the monitor.
+
+        Args:
+            criteria: Criterion instances; their names must be distinct
+            check_interval: Episodes between checks
+            stop: 'all' to stop once every criterion has been met, 'any' for the first
+            verbose: Whether to print when a criterion is met
+        """
+        if not criteria:
+            raise ValueError("At least one criterion is needed")
+        if stop not in ('all', 'any'):
+            raise ValueError(f"Unknown stop rule {stop!r}; use 'all' or 'any'")
+        if len({criterion.name for criterion in criteria}) != len(criteria):
+            raise ValueError("Criterion names must be distinct")
+        self.criteria = list(criteria)
+        self.check_interval = check_interval
+        self.stop = stop
+        self.verbose = verbose
+        self.stopped_at = None
+
+    @property
+    def met_at(self) -> Dict[str, Optional[int]]:
+        """Episode at which each criterion was first met (None if not yet)."""
+        return {criterion.name: criterion.met_at for criterion in self.criteria}
+
+    def due(self, first_ep: int, last_ep: int) -> bool:
+        """Whether a check falls in the episodes (first_ep, last_ep]."""
+        return last_ep // self.check_interval > first_ep // self.check_interval
+
+    def check(self, episode: int, values: np.ndarray, policy: Optional[np.ndarray] = None) -> bool:
+        """
+        Evaluate every criterion.
+
+        Args:
+            episode: Number of episodes trained so far
+            values: Current Q (S, A) or V
+            policy: Current greedy action index of every state, for control
+
+        Returns:
+            Whether training should stop
+        """
+        for criterion in self.criteria:
+            was_met = criterion.met_at is not None
+            if criterion.update(episode, values, policy) and not was_met and self.verbose:
+                print(f"Episode {episode}: {criterion.name} met")
+
+        met = [criterion.met_at is not None for criterion in self.criteria]
+        if all(met) if self.stop == 'all' else any(met):
+            self.stopped_at = episode
+            return True
+        return False
@@ -0,0 +1,218 @@
+"""
+Dyna-Q planning for the tabular learners.
+
+DynaModel remembers the last observed outcome (r, s', done) of every
+(state, action) pair in flat preallocated arrays, plus the pairs in order of
+first observation, so planning samples from dense arrays instead of a dict.
+After every real step, plan() applies up to k simulated Q-learning updates:
+
+    uniform      k observed pairs drawn at random, duplicates merged, applied
+                 in one vectorized batch from the Q before the batch (Dyna-Q)
+    prioritized  prioritized sweeping: the pairs with the largest |TD error|
+                 above a threshold are popped from a max-heap one at a time,
+                 and each update queues the predecessors of its state
+
+Prioritized sweeping only ever looks at the pair just taken and the
+predecessors of the states it updates, so a planning step costs
+O(k * predecessors * log queue) instead of a pass over every observed pair.
+With deterministic dynamics the model is exact.
+
+episodes_to_optimal measures how many episodes and real environment steps a
+learner needs until its greedy policy is optimal, for several planning
+budgets, to trade computation for environment interaction.
+"""
+
+import heapq
+import time
+import numpy as np
+from typing import Callable, Dict, List, Sequence
+
+from convergence import ConvergenceMonitor, ReferenceAgreement
+from metrics import Metrics
+
+
+class DynaModel:
+    """
+    Array-backed deterministic model of observed transitions.
+    """
+
+    def __init__(self, n_states: int, n_actions: int):
+        """
+        Initialize an empty model.
+
+        Args:
+            n_states: Number of flat states
+            n_actions: Number of actions
+        """
+        size = n_states * n_actions
+        self.n_states = n_states
+        self.n_actions = n_actions
+        self.rewards = np.zeros(size)
+        self.next_states = np.zeros(size, dtype=np.intp)
+        self.dones = np.zeros(size, dtype=bool)
+        self.seen = np.zeros(size, dtype=bool)
+        # Flat (state * n_actions + action) codes of the observed pairs
+        self.pairs = np.zeros(size, dtype=np.intp)
+        self.n_observed = 0
+
+        # Prioritized sweeping: the observed pairs leading into every state,
+        # a max-heap of (-priority, pair) entries and the queued priority of
+        # every pair (0 if not queued; heap entries that disagree are stale)
+        self.predecessors = [set() for _ in range(n_states)]
+        self.queue = []
+        self.priority = np.zeros(size)
+        self.last_pair = None
+
+    def update(self, s: int, a: int, reward: float, next_state: int, done: bool) -> None:
+        """Record the outcome of one real step."""
+        pair = s * self.n_actions + a
+        if not self.seen[pair]:
+            self.seen[pair] = True
+            self.pairs[self.n_observed] = pair
+            self.n_observed += 1
+        else:
+            self.predecessors[self.next_states[pair]].discard(pair)
+        self.predecessors[next_state].add(pair)
+        self.last_pair = pair
+        self.rewards[pair] = reward
+        self.next_states[pair] = next_state
+        self.dones[pair] = done
+
+    def td_errors(self, Q: np.ndarray, pairs: np.ndarray, gamma: float) -> np.ndarray:
+        """Q-learning TD errors of the given flat pairs under the model."""
+        bootstrap = np.where(self.dones[pairs], 0.0, Q[self.next_states[pairs]].max(axis=1))
+        return self.rewards[pairs] + gamma * bootstrap - Q.reshape(-1)[pairs]
+
+    def _td_error(self, Q: np.ndarray, pair: int, gamma: float) -> float:
+        bootstrap = 0.0 if self.dones[pair] else max(Q[self.next_states[pair]].tolist())
+        return self.rewards[pair] + gamma * bootstrap - Q.item(pair)
+
+    def _push(self, pair: int, priority: float) -> None:
+        """Queue a pair, or raise its queued priority."""
+        if priority > self.priority[pair]:
+            self.priority[pair] = priority
+            heapq.heappush(self.queue, (-priority, pair))
+
+    def _pop(self) -> int:
+        """Remove and return the queued pair of highest priority, or -1 if none."""
+        while self.queue:
+            negative, pair = heapq.heappop(self.queue)
+            if -negative == self.priority[pair]:
+                self.priority[pair] = 0.0
+                return pair
+        return -1
+
+    def _sweep(self, Q: np.ndarray, k: int, alpha: float, gamma: float, threshold: float) -> None:
+        """Prioritized sweeping: up to k updates, starting from the last real pair."""
+        Q_flat = Q.reshape(-1)
+        n_actions = self.n_actions
+        if self.last_pair is not None:
+            # The real step has just changed Q(s, a), so s's predecessors may
+            # have become inconsistent, as may (s, a) itself
+            for pair in (self.last_pair, *self.predecessors[self.last_pair // n_actions]):
+                priority = abs(self._td_error(Q, pair, gamma))
+                if priority > threshold:
+                    self._push(pair, priority)
+            self.last_pair = None
+        for _ in range(k):
+            pair = self._pop()
+            if pair < 0:
+                return
+            Q_flat[pair] += alpha * self._td_error(Q, pair, gamma)
+            for predecessor in self.predecessors[pair // n_actions]:
+                priority = abs(self._td_error(Q, predecessor, gamma))
+                if priority > threshold:
+                    self._push(predecessor, priority)
+
+    def plan(self, Q: np.ndarray, k: int, alpha: float, gamma: float, rng: np.random.Generator,
+             prioritized: bool = False, threshold: float = 1e-6) -> None:
+        """
+        Apply up to k simulated Q-learning updates to Q in place.
+
+        Args:
+            Q: (S, A) C-contiguous action values
+            k: Number of planning updates
+            alpha: Step size
+            gamma: Discount factor
+            rng: Generator used for uniform sampling
+            prioritized: Use prioritized sweeping instead of a uniform sample
+            threshold: Prioritized mode only queues pairs whose |TD error| is above this
+        """
+        if prioritized:
+            self._sweep(Q, k, alpha, gamma, threshold)
+            return
+        if k == 0 or self.n_observed == 0:
+            return
+        # A pair drawn twice is updated once
+        pairs = np.unique(self.pairs[rng.integers(self.n_observed, size=k)])
+        Q.reshape(-1)[pairs] += alpha * self.td_errors(Q, pairs, gamma)
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the arrays needed to checkpoint the model."""
+        return {
+            'model_rewards': self.rewards,
+            'model_next_states': self.next_states,
+            'model_dones': self.dones,
+            'model_pairs': self.pairs[:self.n_observed],
+            'model_priority': self.priority,
+            'model_queue': np.array(self.queue, dtype=float).reshape(-1, 2),
+            'model_last_pair': np.array(-1 if self.last_pair is None else self.last_pair),
+        }
+
+    def load_state_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the model from arrays saved by state_arrays."""
+        self.rewards[:] = arrays['model_rewards']
+        self.next_states[:] = arrays['model_next_states']
+        self.dones[:] = arrays['model_dones']
+        pairs = arrays['model_pairs']
+        self.n_observed = len(pairs)
+        self.pairs[:self.n_observed] = pairs
+        self.seen[:] = False
+        self.seen[pairs] = True
+        self.predecessors = [set() for _ in range(self.n_states)]
+        for pair in pairs.tolist():
+            self.predecessors[self.next_states[pair]].add(pair)
+        self.priority[:] = arrays['model_priority']
+        # Saved in heap order, so the restored list is already a heap
+        self.queue = [(priority, int(pair)) for priority, pair in arrays['model_queue'].tolist()]
+        last_pair = int(arrays['model_last_pair'])
+        self.last_pair = None if last_pair < 0 else last_pair
+
+
+def episodes_to_optimal(make_learner: Callable, reference: np.ndarray,
+                        planning_steps: Sequence[int] = (0, 5, 20, 50), prioritized: bool = False,
+                        episodes: int = 50000, check_interval: int = 10,
+                        min_agreement: float = 1.0, **train_kwargs) -> List[Dict]:
+    """
+    Measure the interaction needed to reach an optimal greedy policy per planning budget.
+
+    Args:
+        make_learner: Returns a fresh learner (e.g. a seeded GridWorldTD); called once per budget
+        reference: (S, A) mask of optimal actions, e.g.
+            convergence.optimal_actions(learner.optimal_q())
+        planning_steps: Planning updates per real step to compare
+        prioritized: Whether planning is prioritized by TD error
+        episodes: Episode budget per run
+        check_interval: Episodes between policy checks
+        min_agreement: Fraction of states whose greedy action must be optimal
+        **train_kwargs: Passed to learner.train
+
+    Returns:
+        One dictionary per budget with 'planning_steps', 'episodes' (None if
+        the policy never became optimal), 'env_steps' and 'seconds'
+    """
+    results = []
+    for k in planning_steps:
+        learner = make_learner()
+        criterion = ReferenceAgreement(reference, learner.n, learner.actions, min_agreement)
+        monitor = ConvergenceMonitor([criterion], check_interval=check_interval, verbose=False)
+        start = time.perf_counter()
+        learner.train(episodes=episodes, planning_steps=k, prioritized=prioritized,
+                      metrics=Metrics(callback=None), monitor=monitor, **train_kwargs)
+        results.append({
+            'planning_steps': k,
+            'episodes': criterion.met_at,
+            'env_steps': learner.env_steps,
+            'seconds': time.perf_counter() - start,
+        })
+    return results
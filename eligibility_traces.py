@@ -0,0 +1,69 @@
+"""
+Sparse eligibility traces for TD(lambda) and Q(lambda).
+
+Only the recently visited keys (states for prediction, flat state-action
+pairs for control) carry a trace. Every step the traces decay by
+gamma * lambda and any that fall below the cutoff are dropped, so at most
+about log(cutoff) / log(gamma * lambda) steps' worth of keys stay active and
+the per-step cost is bounded by that, not by the number of states. The bound
+needs gamma * lambda < 1, which SparseTraces enforces: with a decay of 1 no
+trace would ever fall below the cutoff.
+
+    accumulating  e(key) += 1 on every visit
+    replacing     e(key) = 1 on every visit
+
+A learner computes its TD error, calls visit(key) for the current key, adds
+step * e to every active key from items(), and then calls decay() (or
+clear(), e.g. after an exploratory action in Watkins's Q(lambda)).
+"""
+
+from typing import Dict, Hashable, ItemsView
+
+TRACE_KINDS = ('accumulating', 'replacing')
+
+
+class SparseTraces:
+    """
+    Eligibility traces stored only for keys above a cutoff.
+    """
+
+    def __init__(self, decay: float, kind: str = 'replacing', cutoff: float = 1e-4):
+        """
+        Initialize empty traces.
+
+        Args:
+            decay: Per-step decay factor, gamma * lambda, in [0, 1)
+            kind: 'accumulating' or 'replacing'
+            cutoff: Traces below this are dropped
+        """
+        if not 0 <= decay < 1:
+            raise ValueError("gamma * lam must be in [0, 1) for traces to expire")
+        if kind not in TRACE_KINDS:
+            raise ValueError(f"Unknown trace kind {kind!r}; use 'accumulating' or 'replacing'")
+        self.decay_factor = decay
+        self.replacing = kind == 'replacing'
+        self.cutoff = cutoff
+        self.traces: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.traces)
+
+    def visit(self, key: Hashable) -> None:
+        """Mark a visit to key."""
+        if self.replacing:
+            self.traces[key] = 1.0
+        else:
+            self.traces[key] = self.traces.get(key, 0.0) + 1.0
+
+    def items(self) -> ItemsView:
+        """Return the active (key, trace) pairs."""
+        return self.traces.items()
+
+    def decay(self) -> None:
+        """Decay every trace by gamma * lambda and drop those below the cutoff."""
+        factor, cutoff = self.decay_factor, self.cutoff
+        self.traces = {key: e * factor for key, e in self.traces.items() if e * factor >= cutoff}
+
+    def clear(self) -> None:
+        """Drop every trace (start of an episode, or after an exploratory action)."""
+        self.traces.clear()
@@ -0,0 +1,326 @@
+"""
+Append-only, memory-mapped store of logged episodes.
+
+A store is a directory of segment files holding packed NumPy records
+(RECORD_DTYPE): one record per step with its episode id, step number, flat
+state index, action index, reward, next state, done flag, end-of-episode
+marker and the behaviour probability of the action (nan if unknown). Segments
+are raw record arrays with no header, so a reader maps each one with np.memmap
+and works on field views without copying, and the number of records is simply
+the file size divided by the record size.
+
+EpisodeWriter buffers whole episodes and writes them in bulk; an episode never
+spans two segments, so every segment can be replayed on its own. Only records
+up to the last end marker count: the tail of an interrupted write is ignored
+by readers and dropped when a writer reopens the store. The writer
+has the same add/add_batch interface as off_policy.EpisodeLog, so it can be
+passed as the log of GridWorldMC.generate_episodes / train,
+MonteCarloControl.update_q_and_policy or GridWorldTD.train.
+
+EpisodeStore reads a store back as per-segment arrays for the off-policy
+estimators, as padded episode batches for GridWorldMC.update_batch, or as
+flat (s, a, r, s', done) transitions for TD-style learners.
+"""
+
+import json
+import os
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+RECORD_DTYPE = np.dtype([
+    ('episode', '<i8'),
+    ('step', '<i4'),
+    ('state', '<i4'),
+    ('action', '<i1'),
+    ('reward', '<f8'),
+    ('next_state', '<i4'),
+    ('done', '?'),
+    ('end', '?'),
+    ('behavior_prob', '<f8'),
+])
+
+DEFAULT_SEGMENT_RECORDS = 1 << 23
+DEFAULT_BUFFER_RECORDS = 1 << 16
+
+_SEGMENT_FORMAT = 'segment-{:06d}.bin'
+
+
+def _segment_paths(directory: str) -> List[str]:
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith('segment-') and name.endswith('.bin'))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _map_segment(path: str) -> np.ndarray:
+    """Memory-map the complete records of a segment (a torn trailing record is ignored)."""
+    n = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(n,))
+
+
+def _complete_records(segment: np.ndarray) -> int:
+    """Number of records up to and including the last end-of-episode marker."""
+    ends = np.flatnonzero(segment['end'])
+    return int(ends[-1]) + 1 if len(ends) else 0
+
+
+def _check_meta(directory: str) -> None:
+    with open(os.path.join(directory, 'meta.json')) as f:
+        descr = json.load(f)['dtype']
+    if np.dtype([tuple(field) for field in descr]) != RECORD_DTYPE:
+        raise ValueError(f"Store {directory} was written with a different record layout")
+
+
+class EpisodeWriter:
+    """
+    Buffered, append-only writer of episode records.
+    """
+
+    def __init__(self, directory: str, segment_records: int = DEFAULT_SEGMENT_RECORDS,
+                 buffer_records: int = DEFAULT_BUFFER_RECORDS):
+        """
+        Open (or create) a store for appending.
+
+        Args:
+            directory: Store directory
+            segment_records: Records per segment file before a new one is started
+            buffer_records: Records buffered in memory between writes
+        """
+        self.directory = directory
+        self.segment_records = segment_records
+        os.makedirs(directory, exist_ok=True)
+
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w') as f:
+                json.dump({'dtype': RECORD_DTYPE.descr, 'segment_records': segment_records}, f)
+        _check_meta(directory)
+
+        # Continue after the last complete episode of an existing store
+        paths = _segment_paths(directory)
+        self._segment = len(paths) - 1 if paths else 0
+        self._segment_size = self._recover(paths[-1]) if paths else 0
+        self.next_episode = 0
+        for path in reversed(paths):
+            episodes = _map_segment(path)['episode']
+            if len(episodes):
+                self.next_episode = int(episodes[-1]) + 1
+                break
+
+        self._buffer = np.zeros(buffer_records, dtype=RECORD_DTYPE)
+        self._buffered = 0
+        self._file = open(self._segment_path(), 'ab')
+
+    @staticmethod
+    def _recover(path: str) -> int:
+        """
+        Drop what an interrupted write left after the last complete episode of a segment.
+
+        Returns:
+            Number of records kept
+        """
+        segment = _map_segment(path)
+        complete = _complete_records(segment)
+        # Release the map before truncating the file under it
+        del segment
+        if complete * RECORD_DTYPE.itemsize != os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(complete * RECORD_DTYPE.itemsize)
+        return complete
+
+    def _segment_path(self) -> str:
+        return os.path.join(self.directory, _SEGMENT_FORMAT.format(self._segment))
+
+    def _write(self, records: np.ndarray) -> None:
+        self._file.write(records.tobytes())
+        self._segment_size += len(records)
+
+    def flush(self) -> None:
+        """Write the buffered records to disk."""
+        if self._buffered:
+            self._write(self._buffer[:self._buffered])
+            self._buffered = 0
+        self._file.flush()
+
+    def _roll(self) -> None:
+        """Flush and start a new segment file."""
+        self.flush()
+        self._file.close()
+        self._segment += 1
+        self._segment_size = 0
+        self._file = open(self._segment_path(), 'ab')
+
+    def _append(self, records: np.ndarray) -> None:
+        if self._buffered + len(records) > len(self._buffer):
+            self.flush()
+        if len(records) > len(self._buffer):
+            self._write(records)
+        else:
+            self._buffer[self._buffered:self._buffered + len(records)] = records
+            self._buffered += len(records)
+
+    def add_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                  behavior_probs: Optional[np.ndarray], lengths: np.ndarray,
+                  next_states: Optional[np.ndarray] = None, reached: Optional[np.ndarray] = None) -> None:
+        """
+        Append a batch of episodes stored as zero-padded (B, T) arrays.
+
+        Args:
+            states, actions, rewards: (B, T) per-step arrays
+            behavior_probs: (B, T) probability of each action taken, or None
+            lengths: (B,) episode lengths
+            next_states: (B, T) state reached by each step, or None if unknown (-1)
+            reached: (B,) whether each episode ended in the terminal; sets the
+                done flag of its last step
+        """
+        B, T = states.shape
+        valid = np.arange(T) < lengths[:, np.newaxis]
+        n = int(lengths.sum())
+        records = np.zeros(n, dtype=RECORD_DTYPE)
+        records['episode'] = np.repeat(np.arange(self.next_episode, self.next_episode + B), lengths)
+        records['step'] = np.broadcast_to(np.arange(T), (B, T))[valid]
+        records['state'] = states[valid]
+        records['action'] = actions[valid]
+        records['reward'] = rewards[valid]
+        records['next_state'] = next_states[valid] if next_states is not None else -1
+        records['behavior_prob'] = behavior_probs[valid] if behavior_probs is not None else np.nan
+        last = np.cumsum(lengths)[lengths > 0] - 1
+        records['end'][last] = True
+        if reached is not None:
+            records['done'][last] = np.asarray(reached)[lengths > 0]
+        self.next_episode += B
+
+        # Keep episodes whole within a segment
+        bounds = np.r_[0, np.cumsum(lengths)]
+        first = 0
+        while first < B:
+            pending = self._segment_size + self._buffered
+            # As many whole episodes as still fit in the current segment
+            last = int(np.searchsorted(bounds, bounds[first] + self.segment_records - pending, side='right')) - 1
+            if last <= first:
+                if pending:
+                    self._roll()
+                    continue
+                # An episode longer than a segment gets a segment of its own
+                last = first + 1
+            self._append(records[bounds[first]:bounds[last]])
+            first = last
+
+    def add(self, states: Sequence[int], actions: Sequence[int], rewards: Sequence[float],
+            behavior_probs: Optional[Sequence[float]] = None, next_states: Optional[Sequence[int]] = None,
+            reached: bool = False) -> None:
+        """
+        Append one episode.
+
+        Args:
+            states: Flat state index of every step
+            actions: Action index taken at every step
+            rewards: Reward received after every step
+            behavior_probs: Probability of each action taken, or None
+            next_states: State reached by every step, or None
+            reached: Whether the episode ended in the terminal
+        """
+        as_row = lambda values, dtype: np.asarray(values, dtype=dtype)[np.newaxis]
+        self.add_batch(as_row(states, np.intp), as_row(actions, np.intp), as_row(rewards, float),
+                       as_row(behavior_probs, float) if behavior_probs is not None else None,
+                       np.array([len(states)]),
+                       as_row(next_states, np.intp) if next_states is not None else None,
+                       np.array([reached]))
+
+    def close(self) -> None:
+        """Flush and close the current segment."""
+        self.flush()
+        self._file.close()
+
+    def __enter__(self) -> 'EpisodeWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class EpisodeStore:
+    """
+    Read-only, memory-mapped view of an episode store.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Open a store for reading.
+
+        Args:
+            directory: Store directory written by EpisodeWriter
+        """
+        self.directory = directory
+        _check_meta(directory)
+        # Records after the last end marker belong to an interrupted write
+        self.segments = []
+        for path in _segment_paths(directory):
+            segment = _map_segment(path)
+            complete = _complete_records(segment)
+            if complete:
+                self.segments.append(segment[:complete])
+
+    def __len__(self) -> int:
+        """Total number of records (steps)."""
+        return sum(len(segment) for segment in self.segments)
+
+    @staticmethod
+    def _lengths(segment: np.ndarray) -> np.ndarray:
+        starts = np.flatnonzero(np.r_[True, segment['episode'][1:] != segment['episode'][:-1]])
+        return np.diff(np.r_[starts, len(segment)])
+
+    def iter_segments(self) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Yield every segment as a dictionary shaped like off_policy.EpisodeLog.arrays().
+
+        The per-step arrays are views into the memory map, so the estimators
+        in off_policy can replay a store of any size segment by segment.
+        """
+        for segment in self.segments:
+            yield {
+                'states': segment['state'],
+                'actions': segment['action'],
+                'rewards': segment['reward'],
+                'behavior_probs': segment['behavior_prob'],
+                'next_states': segment['next_state'],
+                'dones': segment['done'],
+                'lengths': self._lengths(segment),
+            }
+
+    def iter_episode_batches(self, batch_episodes: int = 4096) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Yield (states, actions, rewards, lengths) zero-padded (B, T) batches.
+
+        The batches have the layout of GridWorldMC.generate_episodes, so
+        learner.update_batch(*batch) replays them.
+        """
+        for data in self.iter_segments():
+            lengths = data['lengths']
+            bounds = np.r_[0, np.cumsum(lengths)]
+            for first in range(0, len(lengths), batch_episodes):
+                last = min(first + batch_episodes, len(lengths))
+                batch_lengths = lengths[first:last]
+                T = int(batch_lengths.max())
+                valid = np.arange(T) < batch_lengths[:, np.newaxis]
+                lo, hi = bounds[first], bounds[last]
+
+                states = np.zeros((last - first, T), dtype=np.intp)
+                actions = np.zeros((last - first, T), dtype=np.intp)
+                rewards = np.zeros((last - first, T))
+                states[valid] = data['states'][lo:hi]
+                actions[valid] = data['actions'][lo:hi]
+                rewards[valid] = data['rewards'][lo:hi]
+                yield states, actions, rewards, batch_lengths
+
+    def iter_transitions(self, chunk_records: int = 1 << 20) -> Iterator[Tuple[np.ndarray, ...]]:
+        """
+        Yield (states, actions, rewards, next_states, dones) chunks of at most chunk_records steps.
+
+        Chunks are views into the memory map, in the order the steps were written.
+        """
+        for segment in self.segments:
+            for lo in range(0, len(segment), chunk_records):
+                chunk = segment[lo:lo + chunk_records]
+                yield chunk['state'], chunk['action'], chunk['reward'], chunk['next_state'], chunk['done']
@@ -1,3 +1,4 @@
+import numpy as np
 from typing import List, Tuple, Optional
 
 
@@ -10,6 +11,10 @@ class GridWorld:
     based on the cells it visits.
     """
     
+    # Transitions are deterministic, so a repeated state under a fixed policy is a cycle
+    deterministic = True
+    ACTIONS = ['N', 'S', 'E', 'W']
+    
     def __init__(self, N: int, rewards: List[List[float]], policy: List[List[str]], 
                  start: Tuple[int, int], terminal: Tuple[int, int]):
         """
@@ -57,27 +62,71 @@ class GridWorld:
             col += 1
         return row, col
 
-    def action(self, move: str) -> Tuple[float, Tuple[int, int], bool]:
+    def step(self, state: Tuple[int, int], move: str, 
+             rng: Optional[np.random.Generator] = None) -> Tuple[float, Tuple[int, int], bool]:
         """
-        Execute an action and return the result.
+        Compute the result of an action without touching the agent's position.
+        
+        Pure and thread-safe, so one GridWorld can serve concurrent rollouts.
         
         Args:
+            state: Current position (row, col)
             move: Action to take ('N', 'S', 'E', 'W')
+            rng: Unused; accepted for API parity with StochasticGridWorld
             
         Returns:
-            Tuple of (reward, new_position, done)
+            Tuple of (reward, next_state, done)
         """
-        row, col = self.position
+        row, col = state
         new_row, new_col = self.move(move, row, col)
 
-        # Determine reward based on whether movement occurred
-        if (new_row, new_col) == (row, col):
-            reward = self.rewards[row][col]  # Hit boundary, stay in place
-        else:
-            reward = self.rewards[new_row][new_col]
-            self.position = (new_row, new_col)
+        # Hitting the boundary leaves the agent in place and pays that cell's reward
+        reward = self.rewards[new_row][new_col]
+        next_state = (new_row, new_col)
+        return reward, next_state, next_state == self.terminal
 
-        done = self.position == self.terminal
+    def transition_table(self) -> np.ndarray:
+        """
+        Return the immutable (N * N, 4) successor table over flat state indices.
+        """
+        if getattr(self, '_transition_table', None) is None:
+            rows, cols = np.divmod(np.arange(self.N * self.N), self.N)
+            next_rows = np.clip(rows[:, np.newaxis] + np.array([-1, 1, 0, 0]), 0, self.N - 1)
+            next_cols = np.clip(cols[:, np.newaxis] + np.array([0, 0, 1, -1]), 0, self.N - 1)
+            table = next_rows * self.N + next_cols
+            table.flags.writeable = False
+            self._transition_table = table
+        return self._transition_table
+
+    def step_many(self, states: np.ndarray, actions: np.ndarray, 
+                  rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized step for a batch of independent rollouts.
+        
+        Args:
+            states: Flat state indices (row * N + col)
+            actions: Action indices into ACTIONS (0=N, 1=S, 2=E, 3=W)
+            rng: Unused; accepted for API parity with StochasticGridWorld
+            
+        Returns:
+            Tuple of (rewards, next_states, done) arrays
+        """
+        next_states = self.transition_table()[states, actions]
+        rewards = np.asarray(self.rewards, dtype=float).ravel()[next_states]
+        done = next_states == self.terminal[0] * self.N + self.terminal[1]
+        return rewards, next_states, done
+
+    def action(self, move: str) -> Tuple[float, Tuple[int, int], bool]:
+        """
+        Execute an action and return the result.
+        
+        Args:
+            move: Action to take ('N', 'S', 'E', 'W')
+            
+        Returns:
+            Tuple of (reward, new_position, done)
+        """
+        reward, self.position, done = self.step(self.position, move)
         return reward, self.position, done
 
     def reset(self) -> None:
@@ -235,3 +284,32 @@ class GridWorld:
         print("\nOptimal Policy:")
         for row in self.policy:
             print(row)
+
+
+def policy_action_indices(grid_world) -> np.ndarray:
+    """
+    Return a grid world's policy as a flat array of action indices (row * N + col).
+
+    Indices follow GridWorld.ACTIONS (0=N, 1=S, 2=E, 3=W). The terminal cell
+    is absorbing, so whatever it holds (None, '' or 'G') maps to 0; every
+    other cell must hold an action.
+
+    Args:
+        grid_world: GridWorld or StochasticGridWorld instance
+
+    Returns:
+        Integer array of length N * N
+
+    Raises:
+        ValueError: If a non-terminal cell does not hold an action
+    """
+    N = grid_world.N
+    terminal = grid_world.terminal[0] * N + grid_world.terminal[1]
+    lookup = {action: index for index, action in enumerate(GridWorld.ACTIONS)}
+    indices = np.zeros(N * N, dtype=np.intp)
+    for s, action in enumerate(a for row in grid_world.policy for a in row):
+        if action in lookup:
+            indices[s] = lookup[action]
+        elif s != terminal:
+            raise ValueError(f"Policy has no valid action at {divmod(s, N)}: {action!r}")
+    return indices
@@ -1,29 +1,106 @@
+import os
+import sys
+
 import gymnasium as gym
 import numpy as np
-import random
-from collections import defaultdict
+
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import check_shapes, load_checkpoint, restore_rng, save_checkpoint
+from metrics import Metrics
+
+
+def print_progress(record):
+    """Print a metrics record as SARSA's progress line."""
+    print(f"Episode {record['episode']}: avg_reward={record['avg_return']:.3f}, epsilon={record['epsilon']:.3f}")
+
 
 class SARSALearner:
-    def __init__(self, env, gamma=0.99, alpha=0.1, epsilon=0.1):
+    def __init__(self, env, gamma=0.99, alpha=0.1, epsilon=0.1, rng=None):
         self.env = env
         self.gamma = gamma
         self.alpha = alpha
         self.epsilon = epsilon
         self.n_actions = env.action_space.n
+        self.rng = np.random.default_rng(rng)
 
-        # Q-table
-        self.Q = defaultdict(lambda: np.zeros(self.n_actions))
+        # Q-table over the discrete observation space; visited marks the
+        # states seen so far (the keys of the old defaultdict)
+        self.n_states = env.observation_space.n
+        self.Q = np.zeros((self.n_states, self.n_actions))
+        self.visited = np.zeros(self.n_states, dtype=bool)
+        # metrics.Metrics of the last train() call
+        self.metrics = None
 
     def epsilon_greedy(self, state):
-        if random.random() < self.epsilon:
-            return self.env.action_space.sample()
+        if self.rng.random() < self.epsilon:
+            return int(self.rng.integers(self.n_actions))
         return int(np.argmax(self.Q[state]))
 
-    def train(self, episodes=10000, max_steps=200, log_interval=1000):
-        rewards_per_ep = []
-
-        for ep in range(1, episodes + 1):
-            state, _ = self.env.reset()
+    def checkpoint(self, path, metrics):
+        """Atomically write the training state after metrics.episodes episodes to path."""
+        save_checkpoint(path, {
+            'q_values': self.Q,
+            'q_visited': self.visited,
+            **metrics.state_arrays(),
+        }, {
+            'learner': type(self).__name__,
+            'episode': metrics.episodes,
+            'epsilon': self.epsilon,
+            'rng': self.rng.bit_generator.state,
+            # The environment's own stream drives resets and any stochastic dynamics
+            'env_rng': self.env.unwrapped.np_random.bit_generator.state,
+        })
+
+    def restore(self, path, metrics):
+        """
+        Restore the training state, and metrics, from a checkpoint written by checkpoint().
+
+        Returns:
+            Number of episodes already trained
+        """
+        arrays, meta = load_checkpoint(path)
+        if meta['learner'] != type(self).__name__:
+            raise ValueError(f"Checkpoint was written by {meta['learner']}, not {type(self).__name__}")
+        check_shapes(arrays, {'q_values': self.Q.shape})
+        self.Q[:] = arrays['q_values']
+        self.visited[:] = arrays['q_visited']
+        self.epsilon = meta['epsilon']
+        self.rng = restore_rng(self.rng, meta['rng'])
+        self.env.unwrapped.np_random = restore_rng(self.env.unwrapped.np_random, meta['env_rng'])
+        metrics.load_state_arrays(arrays)
+        return meta['episode']
+
+    def train(self, episodes=10000, max_steps=200, log_interval=1000,
+              checkpoint_path=None, checkpoint_interval=None, resume_from=None, metrics=None):
+        """
+        Train with SARSA.
+
+        With checkpoint_path, the training state (including the environment's
+        random stream) is saved every checkpoint_interval episodes (default:
+        log_interval) and after the last one. Passing a checkpoint as
+        resume_from continues that run up to a total of `episodes`, exactly as
+        if it had never stopped.
+
+        Episode rewards go through a metrics.Metrics (by default one printing
+        the usual avg_reward line every log_interval episodes), kept as
+        self.metrics. Its ring buffer holds the most recent metrics.window
+        episode rewards, which are returned as a list; pass
+        metrics=Metrics(log_interval, window=episodes) to keep all of them.
+        """
+        if metrics is None:
+            metrics = Metrics(log_interval, callback=print_progress)
+        self.metrics = metrics
+        first_ep = 1
+        if resume_from is not None:
+            first_ep = self.restore(resume_from, metrics) + 1
+        checkpoint_interval = checkpoint_interval or metrics.log_interval
+
+        for ep in range(first_ep, episodes + 1):
+            # Seed the environment from our stream once so the whole run is reproducible
+            seed = int(self.rng.integers(2 ** 31)) if ep == 1 else None
+            state, _ = self.env.reset(seed=seed)
             action = self.epsilon_greedy(state)
             total_reward = 0
 
@@ -39,6 +116,9 @@ class SARSALearner:
 
                 td_error = td_target - self.Q[state][action]
                 self.Q[state][action] += self.alpha * td_error
+                self.visited[state] = True
+                if not done:
+                    self.visited[next_state] = True
 
                 total_reward += reward
                 state, action = next_state, (next_action if not done else None)
@@ -46,24 +126,24 @@ class SARSALearner:
                 if done:
                     break
 
-            rewards_per_ep.append(total_reward)
             self.epsilon = max(0.05, self.epsilon * 0.999)  # decay
+            metrics.record(total_reward, epsilon=self.epsilon)
 
-            if ep % log_interval == 0:
-                avg = np.mean(rewards_per_ep[-log_interval:])
-                print(f"Episode {ep}: avg_reward={avg:.3f}, epsilon={self.epsilon:.3f}")
+            if checkpoint_path is not None and (ep % checkpoint_interval == 0 or ep == episodes):
+                self.checkpoint(checkpoint_path, metrics)
 
-        return rewards_per_ep
+        return metrics.returns.values().tolist()
 
     def extract_policy(self):
-        return {s: int(np.argmax(self.Q[s])) for s in self.Q}
+        return {int(s): int(np.argmax(self.Q[s])) for s in np.flatnonzero(self.visited)}
 
 
-# --- Run with FrozenLake ---
-env = gym.make("Taxi-v3")
-agent = SARSALearner(env, alpha=0.1, epsilon=0.2)
+if __name__ == "__main__":
+    # --- Run with FrozenLake ---
+    env = gym.make("Taxi-v3")
+    agent = SARSALearner(env, alpha=0.1, epsilon=0.2)
 
-agent.train(episodes=5000, log_interval=500)
+    agent.train(episodes=5000, log_interval=500)
 
-print("\nLearned policy:")
-print(agent.extract_policy())
+    print("\nLearned policy:")
+    print(agent.extract_policy())
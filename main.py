@@ -38,17 +38,17 @@ def main(gw=None, policy_name="Current"):
     print(f"Total reward: {performance['total_reward']:.2f}")
     print(f"Efficiency: {performance['efficiency']:.2f} reward/step")
     
-    # Follow policy step by step
+    # Follow policy step by step, on the same episode that was analyzed
     print(f"\n👟 Following {policy_name.lower()} policy step by step...")
-    follow_policy(gw, verbose=True)
+    follow_policy(gw, verbose=True, performance=performance)
     
     # Visualize the path
     print(f"\n🗺️  Visualizing {policy_name.lower()} policy path...")
-    visualize_path(gw)
+    visualize_path(gw, path=performance['path'])
     
     # Show both visualizations side by side
     print(f"\n📊🎬 Showing both value matrix and {policy_name.lower()} policy path animation...")
-    show_both_visualizations(gw)
+    show_both_visualizations(gw, path=performance['path'])
     
     print(f"\n✅ {policy_name} policy demo completed!")
     return gw
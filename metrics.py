@@ -0,0 +1,331 @@
+"""
+Bounded-memory training metrics.
+
+Metrics replaces the per-episode returns lists the learners used to grow for
+the whole run. Every episode costs O(1): its return (and whether it reached
+the terminal) goes into fixed-size, preallocated ring buffers holding the
+last `window` episodes, and into online Welford statistics for the current
+log interval. Every log_interval episodes a structured record is built and
+passed to a callback:
+
+    {'episode': 5000, 'avg_return': -3.1, 'std_return': 4.2,
+     'return_p10': -9.0, 'return_p50': -2.0, 'return_p90': 2.0,
+     'success_rate': 0.97, 'epsilon': 0.95}
+
+Mean and standard deviation cover the log interval. The quantiles are exact
+over the ring buffer (the last `window` episodes): the window is already in
+memory, so a sketch would only add error, and with window <= log_interval
+their O(window) cost is O(1) per episode amortized. success_rate and epsilon
+appear only when the learner reports them.
+
+Callbacks are any callable taking the record: print_progress (the default,
+the learners' familiar progress line), CSVWriter, JSONLWriter, or e.g.
+list.append to keep the records in memory.
+"""
+
+import csv
+import json
+import numpy as np
+from typing import Callable, Dict, Optional, Sequence
+
+Record = Dict[str, float]
+
+# Record fields that appear only once the learner reports them
+OPTIONAL_FIELDS = ('success_rate', 'epsilon')
+
+
+class RingBuffer:
+    """
+    Fixed-capacity circular buffer over a preallocated NumPy array.
+    """
+
+    def __init__(self, capacity: int, dtype=float):
+        """
+        Initialize an empty buffer.
+
+        Args:
+            capacity: Number of most recent values kept
+            dtype: Element type
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=dtype)
+        # Values ever appended; the next write goes to count % capacity
+        self.count = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def append(self, value) -> None:
+        """Append one value, overwriting the oldest when full."""
+        self.data[self.count % self.capacity] = value
+        self.count += 1
+
+    def extend(self, values) -> None:
+        """Append many values; only the last `capacity` of them are written."""
+        values = np.asarray(values)
+        tail = values[-self.capacity:]
+        start = self.count + len(values) - len(tail)
+        self.data[(start + np.arange(len(tail))) % self.capacity] = tail
+        self.count += len(values)
+
+    def values(self) -> np.ndarray:
+        """Return the stored values, oldest first."""
+        if self.count <= self.capacity:
+            return self.data[:self.count].copy()
+        split = self.count % self.capacity
+        return np.r_[self.data[split:], self.data[:split]]
+
+
+class RunningStats:
+    """
+    Online count, mean and variance (Welford; Chan et al. for batches).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float) -> None:
+        """Fold one value in, in O(1)."""
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def add_many(self, xs) -> None:
+        """Fold a batch of values in with the pairwise merge."""
+        xs = np.asarray(xs, dtype=float)
+        if len(xs) == 0:
+            return
+        n, mean = len(xs), float(xs.mean())
+        m2 = float(((xs - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        """Population variance (nan when empty)."""
+        return self.m2 / self.count if self.count else float('nan')
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+
+def print_progress(record: Record) -> None:
+    """Print a record as the learners' progress line."""
+    line = f"Episode {record['episode']}: avg_return={record['avg_return']:.2f}"
+    if 'success_rate' in record:
+        line += f", success_rate={record['success_rate'] * 100:.1f}%"
+    if 'epsilon' in record:
+        line += f", epsilon={record['epsilon']:.3f}"
+    print(line)
+
+
+class _RecordWriter:
+    """Base for callbacks that append records to a file, one line each."""
+
+    def __init__(self, path: str, mode: str = 'w'):
+        self._file = open(path, mode, newline='')
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CSVWriter(_RecordWriter):
+    """
+    Callback writing records as CSV rows.
+
+    The columns are fieldnames (e.g. Metrics.fieldnames) or, by default, the
+    fields of the first record plus any OPTIONAL_FIELDS it lacks, so a record
+    that later reports success_rate or epsilon still fits; missing values
+    are left empty.
+    """
+
+    def __init__(self, path: str, mode: str = 'w', fieldnames: Optional[Sequence[str]] = None):
+        super().__init__(path, mode)
+        self._fieldnames = list(fieldnames) if fieldnames is not None else None
+        self._writer = None
+
+    def __call__(self, record: Record) -> None:
+        if self._writer is None:
+            fieldnames = self._fieldnames
+            if fieldnames is None:
+                fieldnames = list(record) + [field for field in OPTIONAL_FIELDS if field not in record]
+            self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, restval='')
+            if self._file.tell() == 0:
+                self._writer.writeheader()
+        self._writer.writerow(record)
+        self._file.flush()
+
+
+class JSONLWriter(_RecordWriter):
+    """
+    Callback writing one JSON object per record.
+    """
+
+    def __call__(self, record: Record) -> None:
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+
+class Metrics:
+    """
+    Per-episode training metrics with O(window) memory and O(1) cost per episode.
+    """
+
+    def __init__(self, log_interval: int = 5000, window: Optional[int] = None,
+                 quantiles: Sequence[float] = (0.1, 0.5, 0.9),
+                 callback: Optional[Callable[[Record], None]] = print_progress):
+        """
+        Initialize the metrics.
+
+        Args:
+            log_interval: Episodes between records
+            window: Episodes kept in the ring buffers; defaults to log_interval
+            quantiles: Return quantiles reported in every record
+            callback: Called with every record; None to only return them
+        """
+        self.log_interval = log_interval
+        self.window = window or log_interval
+        self.quantiles = tuple(quantiles)
+        self.callback = callback
+
+        self.returns = RingBuffer(self.window)
+        self.reached = RingBuffer(self.window, dtype=bool)
+        self.interval = RunningStats()
+        self.interval_reached = 0
+        self.track_reached = False
+        self.epsilon = None
+        self.episodes = 0
+
+    @property
+    def fieldnames(self) -> list:
+        """Every field a record of these metrics can have, in record order."""
+        return (['episode', 'avg_return', 'std_return']
+                + [f'return_p{q * 100:g}' for q in self.quantiles] + list(OPTIONAL_FIELDS))
+
+    def record(self, episode_return: float, reached: Optional[bool] = None,
+               epsilon: Optional[float] = None) -> Optional[Record]:
+        """
+        Record one episode.
+
+        Args:
+            episode_return: Total reward of the episode
+            reached: Whether it ended in the terminal, if the learner knows
+            epsilon: Exploration rate after the episode
+
+        Returns:
+            The record, if this episode completed a log interval
+        """
+        self.returns.append(episode_return)
+        self.interval.add(episode_return)
+        if reached is not None:
+            self.track_reached = True
+            self.reached.append(reached)
+            self.interval_reached += bool(reached)
+        if epsilon is not None:
+            self.epsilon = epsilon
+        self.episodes += 1
+        if self.episodes % self.log_interval == 0:
+            return self.emit()
+        return None
+
+    def record_batch(self, returns: np.ndarray, reached: Optional[np.ndarray] = None,
+                     epsilons: Optional[np.ndarray] = None) -> list:
+        """
+        Record a batch of consecutive episodes.
+
+        The batch is split at log-interval boundaries, so the records are the
+        same as recording the episodes one at a time.
+
+        Args:
+            returns: Total reward of each episode
+            reached: Whether each episode ended in the terminal, or None
+            epsilons: Exploration rate after each episode, or None
+
+        Returns:
+            The records emitted, in order
+        """
+        records = []
+        lo = 0
+        while lo < len(returns):
+            hi = min(len(returns), lo + self.log_interval - self.episodes % self.log_interval)
+            self.returns.extend(returns[lo:hi])
+            self.interval.add_many(returns[lo:hi])
+            if reached is not None:
+                self.track_reached = True
+                self.reached.extend(reached[lo:hi])
+                self.interval_reached += int(np.count_nonzero(reached[lo:hi]))
+            if epsilons is not None:
+                self.epsilon = float(epsilons[hi - 1])
+            self.episodes += hi - lo
+            if self.episodes % self.log_interval == 0:
+                records.append(self.emit())
+            lo = hi
+        return records
+
+    def summary(self) -> Record:
+        """Return the record for the episodes since the last one (without emitting it)."""
+        record = {
+            'episode': self.episodes,
+            'avg_return': self.interval.mean if self.interval.count else float('nan'),
+            'std_return': self.interval.std,
+        }
+        recent = self.returns.values()
+        if len(recent):
+            for q, value in zip(self.quantiles, np.quantile(recent, self.quantiles)):
+                record[f'return_p{q * 100:g}'] = float(value)
+        if self.track_reached:
+            record['success_rate'] = self.interval_reached / self.interval.count if self.interval.count else float('nan')
+        if self.epsilon is not None:
+            record['epsilon'] = self.epsilon
+        return record
+
+    def emit(self) -> Record:
+        """Build the record, pass it to the callback and start a new interval."""
+        record = self.summary()
+        if self.callback is not None:
+            self.callback(record)
+        self.interval.reset()
+        self.interval_reached = 0
+        return record
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the arrays needed to checkpoint the metrics (O(window))."""
+        return {
+            'metrics_returns': self.returns.data,
+            'metrics_reached': self.reached.data,
+            'metrics_counts': np.array([self.episodes, self.returns.count, self.reached.count,
+                                        self.interval.count, self.interval_reached, self.track_reached]),
+            'metrics_stats': np.array([self.interval.mean, self.interval.m2,
+                                       np.nan if self.epsilon is None else self.epsilon]),
+        }
+
+    def load_state_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the metrics from arrays saved by state_arrays."""
+        if arrays['metrics_returns'].shape != (self.window,):
+            raise ValueError(f"Checkpoint metrics window is {len(arrays['metrics_returns'])}, "
+                             f"expected {self.window}")
+        self.returns.data[:] = arrays['metrics_returns']
+        self.reached.data[:] = arrays['metrics_reached']
+        (self.episodes, self.returns.count, self.reached.count, self.interval.count,
+         self.interval_reached, track_reached) = arrays['metrics_counts'].tolist()
+        self.track_reached = bool(track_reached)
+        self.interval.mean, self.interval.m2, epsilon = arrays['metrics_stats'].tolist()
+        self.epsilon = None if np.isnan(epsilon) else epsilon
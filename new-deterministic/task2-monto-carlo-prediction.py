@@ -1,3 +1,14 @@
+import os
+import sys
+
+import numpy as np
+
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parallel_mc import parallel_evaluate
+
+
 class MonteCarloEvaluator:
     def __init__(self, rewards, policy, terminal, start, gamma=1.0):
         self.N = len(rewards)
@@ -34,7 +45,44 @@ class MonteCarloEvaluator:
         # Do NOT append the terminal state itself (no reward after terminal)
         return episode
 
-    def evaluate_policy(self, episodes=500, verbose=False):
+    def episode_statistics(self, episodes):
+        """
+        Run the evaluation sweeps without touching the estimates.
+
+        Returns:
+            Tuple of (counts, sums) (N, N) arrays of visits and returns per state
+        """
+        counts = np.zeros((self.N, self.N), dtype=np.int64)
+        sums = np.zeros((self.N, self.N))
+        for ep in range(episodes):
+            for row in range(self.N):
+                for col in range(self.N):
+                    if (row, col) == self.terminal:
+                        continue
+                    episode = self.generate_episode(start=(row, col))
+                    G = 0
+                    for (state, reward) in reversed(episode):
+                        r, c = state
+                        G = self.gamma * G + reward
+                        counts[r, c] += 1
+                        sums[r, c] += G
+        return counts, sums
+
+    def merge_statistics(self, counts, sums):
+        """Fold visit counts and return sums from episode_statistics into the estimates."""
+        for r in range(self.N):
+            for c in range(self.N):
+                if counts[r, c]:
+                    total = self.counts[r][c] + int(counts[r, c])
+                    self.value[r][c] += (sums[r, c] - counts[r, c] * self.value[r][c]) / total
+                    self.counts[r][c] = total
+
+    def evaluate_policy(self, episodes=500, verbose=False, n_workers=1):
+        if n_workers > 1:
+            # A single round; verbose output follows the shards as they are merged
+            parallel_evaluate(self, episodes, n_workers=n_workers, verbose=verbose)
+            return
+
         iteration = 0
         for ep in range(episodes):
             for row in range(self.N):
@@ -59,24 +107,24 @@ class MonteCarloEvaluator:
                     print(['{:.2f}'.format(v) for v in r])
 
 
+if __name__ == "__main__":
+    rewards = [
+        [-1, -1, -1, -1, -1, -1],
+        [-1, -1, -1, -2, -1, -1],
+        [-1, -1, -3, -3, -2, -1],
+        [-1, -2, -4, -4, -2, -1],
+        [-1, -3, -6, -6, -2, -1],
+        [-1, -4, -8, -6, -4, 10]
+    ]
 
-rewards = [
-    [-1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -2, -1, -1],
-    [-1, -1, -3, -3, -2, -1],
-    [-1, -2, -4, -4, -2, -1],
-    [-1, -3, -6, -6, -2, -1],
-    [-1, -4, -8, -6, -4, 10]
-]
-
-policy = [
-    ['E','E','E','E','E','S'],
-    ['E','E','E','S','E','S'],
-    ['E','E','S','S','S','S'],
-    ['E','S','S','S','S','S'],
-    ['E','S','S','S','S','S'],
-    ['E','E','E','E','E','E']
-]
+    policy = [
+        ['E','E','E','E','E','S'],
+        ['E','E','E','S','E','S'],
+        ['E','E','S','S','S','S'],
+        ['E','S','S','S','S','S'],
+        ['E','S','S','S','S','S'],
+        ['E','E','E','E','E','E']
+    ]
 
-mc = MonteCarloEvaluator(rewards=rewards, policy=policy, terminal=(5,5), start=(5,0))
-mc.evaluate_policy(episodes=500, verbose=True)
+    mc = MonteCarloEvaluator(rewards=rewards, policy=policy, terminal=(5,5), start=(5,0))
+    mc.evaluate_policy(episodes=500, verbose=True)
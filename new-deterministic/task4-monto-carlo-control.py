@@ -1,14 +1,22 @@
-import random
+import os
+import sys
+
 import numpy as np
 
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from off_policy import WeightedImportanceSampling
+
 class MonteCarloControl:
-    def __init__(self, rewards, terminal, start, gamma=1.0, epsilon=0.1):
+    def __init__(self, rewards, terminal, start, gamma=1.0, epsilon=0.1, rng=None):
         self.N = len(rewards)
         self.rewards = rewards
         self.terminal = terminal
         self.start = start
         self.gamma = gamma
         self.epsilon = epsilon
+        self.rng = np.random.default_rng(rng)
 
         self.actions = ['N', 'S', 'E', 'W']
         self.Q = {
@@ -21,7 +29,7 @@ class MonteCarloControl:
         }
 
         self.policy = {
-            (row, col): random.choice(self.actions)
+            (row, col): self.actions[self.rng.integers(len(self.actions))]
             for row in range(self.N) for col in range(self.N)
         }
 
@@ -37,29 +45,69 @@ class MonteCarloControl:
         return row, col  # no move if out of bounds
 
     def epsilon_greedy_action(self, state):
-        if random.random() < self.epsilon:
-            return random.choice(self.actions)
+        if self.rng.random() < self.epsilon:
+            return self.actions[self.rng.integers(len(self.actions))]
         q_values = self.Q[state]
         return max(q_values, key=q_values.get)
 
-    def generate_episode(self):
+    def action_probability(self, state, action):
+        """Probability that epsilon_greedy_action picks action in state."""
+        q_values = self.Q[state]
+        greedy = max(q_values, key=q_values.get)
+        return self.epsilon / len(self.actions) + (1 - self.epsilon) * (action == greedy)
+
+    def generate_episode(self, log=None):
+        """
+        Generate one epsilon-greedy episode.
+
+        If an off_policy.EpisodeLog or episode_store.EpisodeWriter is given,
+        the episode is also appended to it with the behaviour probability of
+        every action taken.
+        """
         episode = []
+        probs = []
         state = self.start
         steps = 0
         max_steps = 1000
 
         while state != self.terminal and steps < max_steps:
             action = self.epsilon_greedy_action(state)
+            if log is not None:
+                probs.append(self.action_probability(state, action))
             next_state = self.move(action, *state)
             reward = self.rewards[next_state[0]][next_state[1]]
             episode.append((state, action, reward))
             state = next_state
             steps += 1
 
+        if log is not None:
+            log.add([r * self.N + c for (r, c), _, _ in episode],
+                    [self.actions.index(a) for _, a, _ in episode],
+                    [reward for _, _, reward in episode], probs,
+                    next_states=[r * self.N + c for (r, c), _, _ in episode[1:]] + [state[0] * self.N + state[1]],
+                    reached=state == self.terminal)
         return episode
-    def update_q_and_policy(self, episodes):
+
+    def q_values(self):
+        """Return Q as an (N * N, 4) array over flat states (row * N + col) and action indices."""
+        return np.array([[self.Q[(row, col)][a] for a in self.actions]
+                         for row in range(self.N) for col in range(self.N)])
+
+    def policy_indices(self):
+        """Return the current policy as an (N * N,) array of action indices."""
+        return np.array([self.actions.index(self.policy[(row, col)])
+                         for row in range(self.N) for col in range(self.N)])
+
+    def update_q_and_policy(self, episodes, log=None, monitor=None):
+        """
+        Run first-visit Monte Carlo control for the given number of episodes.
+
+        A convergence.ConvergenceMonitor given as monitor is checked every
+        monitor.check_interval episodes with Q and the policy, and the loop
+        stops early once it is satisfied.
+        """
         for ep in range(1, episodes + 1):
-            episode = self.generate_episode()
+            episode = self.generate_episode(log)
             G = 0
             visited = set()
 
@@ -75,6 +123,23 @@ class MonteCarloControl:
                     # Improve policy greedily
                     self.policy[state] = max(self.Q[state], key=self.Q[state].get)
 
+            if (monitor is not None and ep % monitor.check_interval == 0
+                    and monitor.check(ep, self.q_values(), self.policy_indices())):
+                break
+
+    def improve_off_policy(self, log):
+        """
+        Learn Q and a greedy policy from logged episodes with weighted importance sampling.
+
+        States and actions the log gives no weight keep their current values.
+        """
+        estimator = WeightedImportanceSampling(self.N * self.N, len(self.actions), self.gamma)
+        estimator.control(log)
+        for s, a in zip(*np.nonzero(estimator.C > 0)):
+            self.Q[divmod(int(s), self.N)][self.actions[a]] = float(estimator.Q[s, a])
+        for state in self.policy:
+            self.policy[state] = max(self.Q[state], key=self.Q[state].get)
+
     def print_results(self):
         print("\n📌 Learned Policy:")
         for row in range(self.N):
@@ -1,7 +1,14 @@
-import random
+import os
+import sys
+
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eligibility_traces import SparseTraces
 
 class TDPredictor:
-    def __init__(self, rewards, policy, terminal, start, gamma=1.0, alpha=0.1):
+    def __init__(self, rewards, policy, terminal, start, gamma=1.0, alpha=0.1,
+                 lam=0.0, traces='replacing', trace_cutoff=1e-4):
         self.N = len(rewards)
         self.rewards = rewards
         self.policy = policy
@@ -10,6 +17,13 @@ class TDPredictor:
         self.gamma = gamma
         self.alpha = alpha
 
+        # TD(lambda) with sparse eligibility traces over (row, col) when lam > 0
+        # Traces must decay (gamma * lam < 1) to expire, so lam = 1 needs gamma < 1
+        if not 0 <= lam <= 1 or gamma * lam >= 1:
+            raise ValueError(f"lam must be in [0, 1] with gamma * lam < 1, got lam={lam}, gamma={gamma}")
+        self.lam = lam
+        self.traces = SparseTraces(gamma * lam, traces, trace_cutoff) if lam > 0 else None
+
         self.value = [[0.0 for _ in range(self.N)] for _ in range(self.N)]
 
     def move(self, action, row, col):
@@ -30,23 +44,39 @@ class TDPredictor:
             row, col = start
         steps = 0
         max_steps = 1000
+        if self.traces is not None:
+            self.traces.clear()
 
         while (row, col) != self.terminal and steps < max_steps:
             action = self.policy[row][col]
             next_row, next_col = self.move(action, row, col)
             reward = self.rewards[next_row][next_col]
 
-            # TD(0) update
+            # TD error of the one-step target
             v_current = self.value[row][col]
             v_next = self.value[next_row][next_col]
             td_target = reward + self.gamma * v_next
             td_error = td_target - v_current
-            self.value[row][col] += self.alpha * td_error
+            if self.traces is None:
+                self.value[row][col] += self.alpha * td_error
+            else:
+                # TD(lambda): the error also updates the recently visited states
+                self.traces.visit((row, col))
+                for (r, c), e in self.traces.items():
+                    self.value[r][c] += self.alpha * td_error * e
+                self.traces.decay()
 
             row, col = next_row, next_col
             steps += 1
 
-    def train(self, episodes=10, verbose=False):
+    def train(self, episodes=10, verbose=False, monitor=None):
+        """
+        Run TD(0), or TD(lambda) with lam > 0, sweeps over every non-terminal start state.
+
+        A convergence.ConvergenceMonitor (e.g. with ValueTolerance) given as
+        monitor is checked every monitor.check_interval sweeps with the value
+        grid, and training stops early once it is satisfied.
+        """
         for ep in range(1, episodes + 1):
             for row in range(self.N):
                 for col in range(self.N):
@@ -54,6 +84,8 @@ class TDPredictor:
                         self.run_episode(start=(row, col))
             if verbose:
                 print(f"Iteration {ep} complete.")
+            if monitor is not None and ep % monitor.check_interval == 0 and monitor.check(ep, self.value):
+                break
 
     def print_value(self):
         print("\n📊 State Value Function (TD Prediction):")
@@ -1,5 +1,3 @@
-import random
-
 class TDnPredictor:
     def __init__(self, rewards, policy, terminal, gamma=1.0, alpha=0.1):
         self.N = len(rewards)
@@ -39,7 +37,14 @@ class TDnPredictor:
         episode.append(((row, col), 0))  # terminal step
         return episode
 
-    def train(self, n=3, episodes=20, verbose=True):
+    def train(self, n=3, episodes=20, verbose=True, monitor=None):
+        """
+        Run n-step TD sweeps over every non-terminal start state.
+
+        A convergence.ConvergenceMonitor (e.g. with ValueTolerance) given as
+        monitor is checked every monitor.check_interval sweeps with the value
+        grid, and training stops early once it is satisfied.
+        """
         for ep in range(1, episodes + 1):
             for row in range(self.N):
                 for col in range(self.N):
@@ -66,6 +71,9 @@ class TDnPredictor:
             #     for r in self.value:
             #         print(['{:.2f}'.format(v) for v in r])
 
+            if monitor is not None and ep % monitor.check_interval == 0 and monitor.check(ep, self.value):
+                break
+
     def print_value(self):
         print("\n📊 State Value Function (TD Prediction):")
         for r in self.value:
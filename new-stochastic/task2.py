@@ -1,7 +1,15 @@
-import random
+import os
+import sys
+
+import numpy as np
+
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parallel_mc import parallel_evaluate
 
 class WindyMonteCarloEvaluator:
-    def __init__(self, rewards, policy, terminal, start, gamma=1.0):
+    def __init__(self, rewards, policy, terminal, start, gamma=1.0, rng=None):
         self.N = len(rewards)
         self.rewards = rewards
         self.policy = policy
@@ -10,6 +18,7 @@ class WindyMonteCarloEvaluator:
         self.gamma = gamma
         self.value = [[0.0 for _ in range(self.N)] for _ in range(self.N)]
         self.counts = [[0 for _ in range(self.N)] for _ in range(self.N)]
+        self.rng = np.random.default_rng(rng)
 
     def move(self, row, col, d_row, d_col):
         new_row = row + d_row
@@ -45,7 +54,7 @@ class WindyMonteCarloEvaluator:
             ]
         }
 
-        rand = random.random()
+        rand = self.rng.random()
         cum_prob = 0.0
         for prob, (d_row, d_col) in choices[action]:
             cum_prob += prob
@@ -70,7 +79,48 @@ class WindyMonteCarloEvaluator:
 
         return episode
 
-    def evaluate_policy(self, episodes=1000, verbose=True):
+    def episode_statistics(self, episodes):
+        """
+        Run the evaluation sweeps without touching the estimates.
+
+        Returns:
+            Tuple of (counts, sums) (N, N) arrays of visits and returns per state
+        """
+        counts = np.zeros((self.N, self.N), dtype=np.int64)
+        sums = np.zeros((self.N, self.N))
+        for ep in range(episodes):
+            for row in range(self.N):
+                for col in range(self.N):
+                    if (row, col) == self.terminal:
+                        continue
+
+                    episode = self.generate_episode((row, col))
+                    G = 0
+                    for (state, reward) in reversed(episode):
+                        r, c = state
+                        G = self.gamma * G + reward
+                        counts[r, c] += 1
+                        sums[r, c] += G
+        return counts, sums
+
+    def merge_statistics(self, counts, sums):
+        """Fold visit counts and return sums from episode_statistics into the estimates."""
+        for r in range(self.N):
+            for c in range(self.N):
+                if counts[r, c]:
+                    total = self.counts[r][c] + int(counts[r, c])
+                    self.value[r][c] += (sums[r, c] - counts[r, c] * self.value[r][c]) / total
+                    self.counts[r][c] = total
+
+    def evaluate_policy(self, episodes=1000, verbose=True, n_workers=1, seed=None):
+        if n_workers > 1:
+            parallel_evaluate(self, episodes, n_workers=n_workers, seed=seed)
+            if verbose:
+                print(f"\n📊 Final Value Estimates (Monte Carlo with Wind, {n_workers} workers):")
+                for r in self.value:
+                    print(['{:.2f}'.format(v) for v in r])
+            return
+
         for ep in range(episodes):
             for row in range(self.N):
                 for col in range(self.N):
@@ -92,31 +142,31 @@ class WindyMonteCarloEvaluator:
                 print(['{:.2f}'.format(v) for v in r])
 
 
-
-rewards = [
-    [-1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -2, -1, -1],
-    [-1, -1, -3, -3, -2, -1],
-    [-1, -2, -4, -4, -2, -1],
-    [-1, -3, -6, -6, -2, -1],
-    [-1, -4, -8, -6, -4, 10]
-]
-
-policy = [
-    ['E','E','E','E','E','S'],
-    ['E','E','E','S','E','S'],
-    ['E','E','S','S','S','S'],
-    ['E','S','S','S','S','S'],
-    ['E','S','S','S','S','S'],
-    ['E','E','E','E','E','E']
-]
-
-mc = WindyMonteCarloEvaluator(
-    rewards=rewards,
-    policy=policy,
-    terminal=(5, 5),
-    start=(5, 0),
-    gamma=1.0
-)
-
-mc.evaluate_policy(episodes=1000)
+if __name__ == "__main__":
+    rewards = [
+        [-1, -1, -1, -1, -1, -1],
+        [-1, -1, -1, -2, -1, -1],
+        [-1, -1, -3, -3, -2, -1],
+        [-1, -2, -4, -4, -2, -1],
+        [-1, -3, -6, -6, -2, -1],
+        [-1, -4, -8, -6, -4, 10]
+    ]
+
+    policy = [
+        ['E','E','E','E','E','S'],
+        ['E','E','E','S','E','S'],
+        ['E','E','S','S','S','S'],
+        ['E','S','S','S','S','S'],
+        ['E','S','S','S','S','S'],
+        ['E','E','E','E','E','E']
+    ]
+
+    mc = WindyMonteCarloEvaluator(
+        rewards=rewards,
+        policy=policy,
+        terminal=(5, 5),
+        start=(5, 0),
+        gamma=1.0
+    )
+
+    mc.evaluate_policy(episodes=1000)
@@ -1,5 +1,24 @@
+import os
+import sys
+
+import numpy as np
+
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transition_model import TransitionModel, compile_rows, make_absorbing
+
+WIND_MAP = {
+    'N': [(-1, 0), (-1, -1), (-1, 1), (0, -1), (0, 1), (0, 0)],
+    'S': [(1, 0), (1, -1), (1, 1), (0, -1), (0, 1), (0, 0)],
+    'E': [(0, 1), (-1, 1), (1, 1), (-1, 0), (1, 0), (0, 0)],
+    'W': [(0, -1), (-1, -1), (1, -1), (-1, 0), (1, 0), (0, 0)],
+}
+WIND_PROBS = [0.72, 0.08, 0.08, 0.04, 0.04, 0.04]
+
+
 class WindyValueIterationSolver:
-    def __init__(self, rewards, terminal, gamma=1.0):
+    def __init__(self, rewards, terminal, gamma=1.0, transition_cache=None):
         self.N = len(rewards)
         self.rewards = rewards
         self.terminal = terminal
@@ -7,6 +26,35 @@ class WindyValueIterationSolver:
         self.value = [[0.0 for _ in range(self.N)] for _ in range(self.N)]
         self.policy = [['' for _ in range(self.N)] for _ in range(self.N)]
         self.actions = ['N', 'S', 'E', 'W']
+        self.transition_cache = transition_cache
+
+    def transition_fingerprint(self):
+        return {
+            'model': 'windy_value_iteration',
+            'boundary': 'stay',
+            'N': self.N,
+            'wind_map': WIND_MAP,
+            'probs': WIND_PROBS,
+            'terminal': list(self.terminal),
+        }
+
+    def compile_transitions(self):
+        """Build the (S, A, K) transition arrays for every cell at once."""
+        rows, cols = np.divmod(np.arange(self.N * self.N), self.N)
+        table = {a: list(zip(WIND_MAP[a], WIND_PROBS)) for a in self.actions}
+        next_states, probs = compile_rows(self.N, rows, cols, table, len(WIND_PROBS), boundary='stay')
+        make_absorbing(next_states, probs, self.terminal[0] * self.N + self.terminal[1])
+        return TransitionModel(self.N, next_states, probs, self.terminal)
+
+    @property
+    def transitions(self):
+        if getattr(self, '_transitions', None) is None:
+            if self.transition_cache is None:
+                self._transitions = self.compile_transitions()
+            else:
+                self._transitions = self.transition_cache.get_or_compile(
+                    self.transition_fingerprint(), self.compile_transitions)
+        return self._transitions
 
     def move(self, row, col, d_row, d_col):
         new_row = row + d_row
@@ -19,52 +67,36 @@ class WindyValueIterationSolver:
         if (row, col) == self.terminal:
             return [(1.0, (row, col))]
 
-        wind_map = {
-            'N': [(-1, 0), (-1, -1), (-1, 1), (0, -1), (0, 1), (0, 0)],
-            'S': [(1, 0), (1, -1), (1, 1), (0, -1), (0, 1), (0, 0)],
-            'E': [(0, 1), (-1, 1), (1, 1), (-1, 0), (1, 0), (0, 0)],
-            'W': [(0, -1), (-1, -1), (1, -1), (-1, 0), (1, 0), (0, 0)],
-        }
-
-        probs = [0.72, 0.08, 0.08, 0.04, 0.04, 0.04]
-        directions = wind_map[action]
+        probs = WIND_PROBS
+        directions = WIND_MAP[action]
 
         return [(probs[i], self.move(row, col, *directions[i])) for i in range(len(probs))]
 
     def run_value_iteration(self, theta=1e-4, verbose=True):
+        model = self.transitions
+        rewards = np.asarray(self.rewards, dtype=float).ravel()
+        terminal = self.terminal[0] * self.N + self.terminal[1]
+        value = np.array(self.value, dtype=float).ravel()
         iteration = 0
         while True:
-            delta = 0
-            new_value = [[0.0 for _ in range(self.N)] for _ in range(self.N)]
-
+            # Absorbing terminal: no γ · V(terminal)
+            bootstrap = value.copy()
+            bootstrap[terminal] = 0.0
+            q = model.action_values(bootstrap, rewards, self.gamma)
+
+            best = np.argmax(q, axis=1)
+            new_value = q[np.arange(len(value)), best]
+            new_value[terminal] = rewards[terminal]
+            change = np.abs(value - new_value)
+            change[terminal] = 0.0
+            delta = np.max(change)
+
+            value = new_value
+            self.value = value.reshape(self.N, self.N).tolist()
             for row in range(self.N):
                 for col in range(self.N):
-                    if (row, col) == self.terminal:
-                        new_value[row][col] = self.rewards[row][col]
-                        continue
-
-                    best_value = float('-inf')
-                    best_action = None
-
-                    for action in self.actions:
-                        expected = 0.0
-                        for prob, (next_row, next_col) in self.get_windy_transitions(action, row, col):
-                            reward = self.rewards[next_row][next_col]
-                            # Absorbing terminal: no γ · V(terminal)
-                            if (next_row, next_col) == self.terminal:
-                                expected += prob * reward
-                            else:
-                                expected += prob * (reward + self.gamma * self.value[next_row][next_col])
-
-                        if expected > best_value:
-                            best_value = expected
-                            best_action = action
-
-                    new_value[row][col] = best_value
-                    self.policy[row][col] = best_action
-                    delta = max(delta, abs(self.value[row][col] - best_value))
-
-            self.value = new_value
+                    if (row, col) != self.terminal:
+                        self.policy[row][col] = self.actions[best[row * self.N + col]]
             iteration += 1
 
             if verbose:
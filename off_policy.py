@@ -0,0 +1,235 @@
+"""
+Off-policy Monte Carlo evaluation and control from stored behaviour episodes.
+
+An EpisodeLog keeps every step of the episodes a learner generated, together
+with the probability the behaviour policy gave the action it took. From that
+data, weighted importance sampling estimates the action values of any target
+policy, or learns a greedy policy, without new simulation.
+
+Both estimators use cumulative weights as in Sutton & Barto (sections 5.6-5.7):
+every visit's return G is weighted by the product W of target/behaviour
+probability ratios of the later actions in its episode, and
+
+    C(s, a) += W,    Q(s, a) += W / C(s, a) * (G - Q(s, a)).
+
+For a fixed target policy this is the ratio sum(W G) / sum(W), so evaluation
+is vectorized over chunks of episodes; control changes the target (greedy)
+policy after every update and runs episode by episode.
+"""
+
+import numpy as np
+from typing import Dict, Iterator, Sequence, Tuple, Union
+
+ACTIONS = ['N', 'S', 'E', 'W']
+
+
+class EpisodeLog:
+    """
+    Append-only in-memory log of behaviour episodes over flat states and action indices.
+    """
+
+    def __init__(self):
+        self._states = []
+        self._actions = []
+        self._rewards = []
+        self._probs = []
+        self._lengths = []
+        self._arrays = None
+
+    def add(self, states: Sequence[int], actions: Sequence[int], rewards: Sequence[float],
+            behavior_probs: Sequence[float], next_states=None, reached: bool = False) -> None:
+        """
+        Append one episode.
+
+        Args:
+            states: Flat state index (row * n + col) of every step
+            actions: Action index taken at every step
+            rewards: Reward received after every step
+            behavior_probs: Probability the behaviour policy gave each action taken
+            next_states: Ignored; accepted for compatibility with episode_store.EpisodeWriter
+            reached: Ignored; accepted for compatibility with episode_store.EpisodeWriter
+        """
+        self._states.append(np.asarray(states, dtype=np.intp))
+        self._actions.append(np.asarray(actions, dtype=np.intp))
+        self._rewards.append(np.asarray(rewards, dtype=float))
+        self._probs.append(np.asarray(behavior_probs, dtype=float))
+        self._lengths.append(np.array([len(self._states[-1])], dtype=np.intp))
+        self._arrays = None
+
+    def add_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                  behavior_probs: np.ndarray, lengths: np.ndarray, next_states=None, reached=None) -> None:
+        """
+        Append a batch of episodes stored as zero-padded (B, T) arrays.
+
+        next_states and reached are ignored; they are accepted for
+        compatibility with episode_store.EpisodeWriter.
+        """
+        valid = np.arange(states.shape[1]) < lengths[:, np.newaxis]
+        self._states.append(states[valid].astype(np.intp))
+        self._actions.append(actions[valid].astype(np.intp))
+        self._rewards.append(rewards[valid].astype(float))
+        self._probs.append(behavior_probs[valid].astype(float))
+        self._lengths.append(np.asarray(lengths, dtype=np.intp))
+        self._arrays = None
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Return the log as flat arrays.
+
+        Returns:
+            Dictionary with 'states', 'actions', 'rewards' and 'behavior_probs'
+            (one entry per step, episodes back to back) and 'lengths' (one entry
+            per episode)
+        """
+        if self._arrays is None:
+            def flat(parts, dtype):
+                return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+            self._arrays = {
+                'states': flat(self._states, np.intp),
+                'actions': flat(self._actions, np.intp),
+                'rewards': flat(self._rewards, float),
+                'behavior_probs': flat(self._probs, float),
+                'lengths': flat(self._lengths, np.intp),
+            }
+        return self._arrays
+
+    def __len__(self) -> int:
+        return len(self.arrays()['lengths'])
+
+    def episodes(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield (states, actions, rewards, behavior_probs) for every episode."""
+        return _episodes(self.arrays())
+
+
+def _as_arrays(log) -> Dict[str, np.ndarray]:
+    """Accept an EpisodeLog or a dictionary shaped like EpisodeLog.arrays()."""
+    return log if isinstance(log, dict) else log.arrays()
+
+
+def _episodes(data: Dict[str, np.ndarray]) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    bounds = np.r_[0, np.cumsum(data['lengths'])]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        yield (data['states'][lo:hi], data['actions'][lo:hi],
+               data['rewards'][lo:hi], data['behavior_probs'][lo:hi])
+
+
+def policy_matrix(policy: Union[Dict[Tuple[int, int], str], np.ndarray], n: int,
+                  actions: Sequence[str] = ACTIONS) -> np.ndarray:
+    """
+    Turn a target policy into an (S, A) matrix of action probabilities.
+
+    Args:
+        policy: Dictionary mapping (row, col) to an action string (as returned
+            by extract_policy), or an (S, A) probability matrix; states missing
+            from the dictionary act uniformly at random
+        n: Size of the grid (n x n)
+        actions: Action strings, in index order
+    """
+    if isinstance(policy, np.ndarray):
+        return policy
+    probs = np.full((n * n, len(actions)), 1.0 / len(actions))
+    for (r, c), action in policy.items():
+        probs[r * n + c] = 0.0
+        probs[r * n + c, actions.index(action)] = 1.0
+    return probs
+
+
+class WeightedImportanceSampling:
+    """
+    Every-visit weighted importance sampling estimates of Q from an EpisodeLog.
+    """
+
+    def __init__(self, n_states: int, n_actions: int, gamma: float = 1.0):
+        """
+        Initialize the estimator.
+
+        Args:
+            n_states: Number of flat states
+            n_actions: Number of actions
+            gamma: Discount factor
+        """
+        self.gamma = gamma
+        self.Q = np.zeros((n_states, n_actions))
+        self.C = np.zeros((n_states, n_actions))
+
+    def evaluate(self, log, target_probs: np.ndarray, chunk: int = 4096) -> np.ndarray:
+        """
+        Estimate the action values of a fixed target policy.
+
+        Args:
+            log: EpisodeLog, or a dictionary shaped like EpisodeLog.arrays()
+            target_probs: (S, A) action probabilities of the target policy
+            chunk: Episodes processed together (bounds the padded work arrays)
+
+        Returns:
+            The updated (S, A) Q estimate; pairs with zero cumulative weight keep their value
+        """
+        data = _as_arrays(log)
+        n_actions = self.Q.shape[1]
+        lengths = data['lengths']
+        bounds = np.r_[0, np.cumsum(lengths)]
+
+        for first in range(0, len(lengths), chunk):
+            last = min(first + chunk, len(lengths))
+            lo, hi = bounds[first], bounds[last]
+            chunk_lengths = lengths[first:last]
+            E, T = last - first, int(chunk_lengths.max())
+            valid = np.arange(T) < chunk_lengths[:, np.newaxis]
+
+            states = np.zeros((E, T), dtype=np.intp)
+            actions = np.zeros((E, T), dtype=np.intp)
+            rewards = np.zeros((E, T))
+            ratios = np.ones((E, T))
+            states[valid] = data['states'][lo:hi]
+            actions[valid] = data['actions'][lo:hi]
+            rewards[valid] = data['rewards'][lo:hi]
+            ratios[valid] = target_probs[data['states'][lo:hi], data['actions'][lo:hi]] / data['behavior_probs'][lo:hi]
+
+            # Returns-to-go and the weight of each step: product of later ratios
+            G = np.empty((E, T))
+            W = np.empty((E, T))
+            g = np.zeros(E)
+            w = np.ones(E)
+            for t in range(T - 1, -1, -1):
+                g = rewards[:, t] + self.gamma * g
+                G[:, t] = g
+                W[:, t] = w
+                w = w * ratios[:, t]
+
+            pair = (states * n_actions + actions)[valid]
+            weight = W[valid]
+            added = np.bincount(pair, weights=weight, minlength=self.Q.size).reshape(self.Q.shape)
+            weighted = np.bincount(pair, weights=weight * G[valid], minlength=self.Q.size).reshape(self.Q.shape)
+
+            C_new = self.C + added
+            hit = added > 0
+            self.Q[hit] = (self.Q[hit] * self.C[hit] + weighted[hit]) / C_new[hit]
+            self.C = C_new
+        return self.Q
+
+    def control(self, log) -> np.ndarray:
+        """
+        Learn a greedy target policy from the behaviour episodes.
+
+        Args:
+            log: EpisodeLog, or a dictionary shaped like EpisodeLog.arrays()
+
+        Returns:
+            (S,) array of greedy action indices (argmax of Q; first on ties)
+        """
+        Q, C = self.Q, self.C
+        policy = Q.argmax(axis=1)
+        for states, actions, rewards, probs in _episodes(_as_arrays(log)):
+            G = 0.0
+            W = 1.0
+            for s, a, r, b in zip(states[::-1].tolist(), actions[::-1].tolist(),
+                                  rewards[::-1].tolist(), probs[::-1].tolist()):
+                G = self.gamma * G + r
+                C[s, a] += W
+                Q[s, a] += W / C[s, a] * (G - Q[s, a])
+                policy[s] = Q[s].argmax()
+                # The greedy target gives probability 0 to any other action
+                if a != policy[s]:
+                    break
+                W /= b
+        return policy
@@ -0,0 +1,221 @@
+"""
+Offline (batch) learning of Q from logged transitions.
+
+Transitions are read in (states, actions, rewards, next_states, dones) chunks,
+the flat form GridWorldTD consumes one step at a time, from an
+episode_store.EpisodeStore, a tuple of arrays or any callable returning an
+iterator of chunks. Two tabular solvers are provided:
+
+    EmpiricalModel.value_iteration - build empirical counts of every observed
+        (s, a, s', done) in one streaming pass, then run certainty-equivalence
+        value iteration on the estimated model. Memory grows with the number of
+        distinct observed transitions, not with the size of the log.
+    fitted_q_iteration - re-stream the raw transitions on every sweep and
+        regress each (s, a) onto the mean of r + gamma * max_a' Q(s', a').
+        Memory is O(S * A) plus one chunk, whatever the log contains.
+
+With a tabular Q both converge to the same fixed point. Actions never observed
+in a state have no estimate (nan) and are never chosen by the greedy policy;
+successors without any observed action bootstrap with a value of 0.
+"""
+
+import numpy as np
+from typing import Dict, Iterator, Sequence, Tuple
+
+ACTIONS = ['N', 'S', 'E', 'W']
+
+DEFAULT_CHUNK_RECORDS = 1 << 20
+
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def iter_chunks(source, chunk_records: int = DEFAULT_CHUNK_RECORDS) -> Iterator[Chunk]:
+    """
+    Yield (states, actions, rewards, next_states, dones) chunks from a source.
+
+    Args:
+        source: Object with iter_transitions(chunk_records) (an EpisodeStore),
+            a callable returning an iterator of chunks, or a single tuple of arrays
+        chunk_records: Records per chunk for sources that support it
+    """
+    if hasattr(source, 'iter_transitions'):
+        yield from source.iter_transitions(chunk_records)
+    elif callable(source):
+        yield from source()
+    else:
+        states, actions, rewards, next_states, dones = map(np.asarray, source)
+        for lo in range(0, len(states), chunk_records):
+            hi = lo + chunk_records
+            yield states[lo:hi], actions[lo:hi], rewards[lo:hi], next_states[lo:hi], dones[lo:hi]
+
+
+def _usable(chunk: Chunk) -> Chunk:
+    """Drop transitions whose successor is unknown (-1) unless they ended the episode."""
+    states, actions, rewards, next_states, dones = chunk
+    keep = dones | (next_states >= 0)
+    if keep.all():
+        return states, actions, rewards, next_states, dones
+    return states[keep], actions[keep], rewards[keep], next_states[keep], dones[keep]
+
+
+def _greedy_values(Q: np.ndarray) -> np.ndarray:
+    """max_a Q(s, a) over observed actions; 0 for states with none."""
+    observed = ~np.isnan(Q)
+    return np.where(observed.any(axis=1), np.where(observed, Q, -np.inf).max(axis=1), 0.0)
+
+
+def greedy_policy(Q: np.ndarray, n: int, actions: Sequence[str] = ACTIONS) -> Dict[Tuple[int, int], str]:
+    """
+    Return the greedy action of every state with an observed action.
+
+    Returns:
+        Dictionary mapping (row, col) to an action string, like extract_policy
+    """
+    observed = ~np.isnan(Q)
+    states = np.flatnonzero(observed.any(axis=1))
+    best = np.where(observed[states], Q[states], -np.inf).argmax(axis=1)
+    return {divmod(int(s), n): actions[a] for s, a in zip(states, best)}
+
+
+class EmpiricalModel:
+    """
+    Streaming empirical estimate of rewards and transitions from logged data.
+    """
+
+    def __init__(self, n_states: int, n_actions: int = len(ACTIONS)):
+        """
+        Initialize an empty model.
+
+        Args:
+            n_states: Number of flat states
+            n_actions: Number of actions
+        """
+        self.n_states = n_states
+        self.n_actions = n_actions
+        self.counts = np.zeros((n_states, n_actions), dtype=np.int64)
+        self.reward_sums = np.zeros((n_states, n_actions))
+        # Distinct observed (s, a, s', done) codes and how often each was seen
+        self.codes = np.zeros(0, dtype=np.int64)
+        self.code_counts = np.zeros(0, dtype=np.int64)
+
+    def _encode(self, states, actions, next_states, dones) -> np.ndarray:
+        sa = states.astype(np.int64) * self.n_actions + actions
+        return (sa * self.n_states + np.maximum(next_states, 0)) * 2 + dones
+
+    def update(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+               next_states: np.ndarray, dones: np.ndarray) -> None:
+        """Fold one chunk of transitions into the counts."""
+        states, actions, rewards, next_states, dones = _usable((states, actions, rewards, next_states, dones))
+        sa = states.astype(np.intp) * self.n_actions + actions
+        size = self.counts.size
+        self.counts += np.bincount(sa, minlength=size).reshape(self.counts.shape)
+        self.reward_sums += np.bincount(sa, weights=rewards, minlength=size).reshape(self.counts.shape)
+
+        codes, counts = np.unique(self._encode(states, actions, next_states, dones), return_counts=True)
+        merged, inverse = np.unique(np.r_[self.codes, codes], return_inverse=True)
+        self.code_counts = np.bincount(inverse, weights=np.r_[self.code_counts, counts]).astype(np.int64)
+        self.codes = merged
+
+    @classmethod
+    def from_transitions(cls, source, n_states: int, n_actions: int = len(ACTIONS),
+                         chunk_records: int = DEFAULT_CHUNK_RECORDS) -> 'EmpiricalModel':
+        """Build a model in one streaming pass over a transition source (see iter_chunks)."""
+        model = cls(n_states, n_actions)
+        for chunk in iter_chunks(source, chunk_records):
+            model.update(*chunk)
+        return model
+
+    def value_iteration(self, gamma: float = 0.9, tolerance: float = 1e-8,
+                        max_iterations: int = 10000) -> np.ndarray:
+        """
+        Certainty-equivalence value iteration on the estimated model.
+
+        Returns:
+            (S, A) Q with nan for unobserved (state, action) pairs
+        """
+        dones = self.codes % 2
+        next_states = (self.codes // 2) % self.n_states
+        sa = self.codes // 2 // self.n_states
+        observed = self.counts > 0
+        # Probability of each observed non-terminal successor
+        probs = np.where(dones == 0, self.code_counts / np.maximum(self.counts.reshape(-1)[sa], 1), 0.0)
+        mean_reward = np.where(observed, self.reward_sums / np.maximum(self.counts, 1), np.nan)
+
+        Q = mean_reward.copy()
+        for _ in range(max_iterations):
+            V = _greedy_values(Q)
+            future = np.bincount(sa, weights=probs * V[next_states], minlength=self.counts.size)
+            new = np.where(observed, mean_reward + gamma * future.reshape(self.counts.shape), np.nan)
+            delta = np.nanmax(np.abs(new - Q)) if observed.any() else 0.0
+            Q = new
+            if delta < tolerance:
+                break
+        return Q
+
+
+def fitted_q_iteration(source, n_states: int, n_actions: int = len(ACTIONS), gamma: float = 0.9,
+                       iterations: int = 1000, tolerance: float = 1e-8,
+                       chunk_records: int = DEFAULT_CHUNK_RECORDS) -> np.ndarray:
+    """
+    Tabular fitted-Q iteration, streaming the transitions on every sweep.
+
+    Args:
+        source: Transition source (see iter_chunks); must be re-iterable
+        n_states: Number of flat states
+        n_actions: Number of actions
+        gamma: Discount factor
+        iterations: Maximum number of sweeps
+        tolerance: Stop when no Q value changes by more than this
+        chunk_records: Records per chunk
+
+    Returns:
+        (S, A) Q with nan for unobserved (state, action) pairs
+    """
+    size = n_states * n_actions
+    Q = np.full((n_states, n_actions), np.nan)
+    for _ in range(iterations):
+        V = _greedy_values(Q)
+        counts = np.zeros(size)
+        targets = np.zeros(size)
+        for chunk in iter_chunks(source, chunk_records):
+            states, actions, rewards, next_states, dones = _usable(chunk)
+            sa = states.astype(np.intp) * n_actions + actions
+            target = rewards + gamma * np.where(dones, 0.0, V[np.maximum(next_states, 0)])
+            counts += np.bincount(sa, minlength=size)
+            targets += np.bincount(sa, weights=target, minlength=size)
+
+        observed = (counts > 0).reshape(Q.shape)
+        new = np.where(observed, (targets / np.maximum(counts, 1)).reshape(Q.shape), np.nan)
+        delta = np.nanmax(np.abs(np.nan_to_num(new) - np.nan_to_num(Q))) if observed.any() else 0.0
+        Q = new
+        if delta < tolerance:
+            break
+    return Q
+
+
+def learn_offline(source, n: int, gamma: float = 0.9, method: str = 'value_iteration',
+                  actions: Sequence[str] = ACTIONS, **kwargs) -> Tuple[np.ndarray, Dict[Tuple[int, int], str]]:
+    """
+    Learn Q and a greedy policy for an n x n grid from logged transitions.
+
+    Args:
+        source: Transition source (see iter_chunks)
+        n: Size of the grid (n x n)
+        gamma: Discount factor
+        method: 'value_iteration' (certainty equivalence) or 'fitted_q'
+        actions: Action strings, in index order
+        **kwargs: Passed to the solver (tolerance, chunk_records, ...)
+
+    Returns:
+        Tuple of (Q, policy): the (n * n, A) Q array and a dictionary mapping
+        (row, col) to an action string, like extract_policy
+    """
+    if method == 'value_iteration':
+        chunk_records = kwargs.pop('chunk_records', DEFAULT_CHUNK_RECORDS)
+        model = EmpiricalModel.from_transitions(source, n * n, len(actions), chunk_records)
+        Q = model.value_iteration(gamma, **kwargs)
+    elif method == 'fitted_q':
+        Q = fitted_q_iteration(source, n * n, len(actions), gamma, **kwargs)
+    else:
+        raise ValueError(f"Unknown method {method!r}; use 'value_iteration' or 'fitted_q'")
+    return Q, greedy_policy(Q, n, actions)
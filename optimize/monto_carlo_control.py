@@ -1,9 +1,20 @@
+import os
+import sys
+
 import numpy as np
-from collections import defaultdict
-import random
+
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import check_shapes, load_checkpoint, restore_rng, save_checkpoint
+from metrics import Metrics
+from off_policy import WeightedImportanceSampling, policy_matrix
+from parallel_mc import parallel_train
+from tabular_q import QTable, tabulate_step
 
 class GridWorldMC:
-    def __init__(self, rewards, terminal=(5, 5), start=(0, 0), gamma=0.9, epsilon=0.1):
+    def __init__(self, rewards, terminal=(5, 5), start=(0, 0), gamma=0.9, epsilon=0.1,
+                 step_size=None, track_variance=False, rng=None):
         self.n = rewards.shape[0]
         self.rewards = rewards
         self.terminal = terminal
@@ -11,9 +22,19 @@ class GridWorldMC:
         self.gamma = gamma
         self.epsilon = epsilon
         self.actions = ['N', 'S', 'E', 'W']
+        self.rng = np.random.default_rng(rng)
+
+        self.Q = QTable(self.n, self.actions, rng=self.rng)
+        self.next_states, self.step_rewards, self.step_done = tabulate_step(self.step, self.n, self.actions)
 
-        self.Q = defaultdict(lambda: {a: 0.0 for a in self.actions})
-        self.returns = defaultdict(list)
+        # Running first-visit return statistics per (state, action). The
+        # sample mean (step_size=None) or a constant-step-size average for
+        # non-stationary runs; memory does not grow with training length.
+        self.step_size = step_size
+        shape = (self.Q.n_states, self.Q.n_actions)
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.return_mean = np.zeros(shape)
+        self.return_m2 = np.zeros(shape) if track_variance else None
 
     def step(self, state, action):
         if state == self.terminal:
@@ -30,105 +51,378 @@ class GridWorldMC:
         done = (next_state == self.terminal)
         return next_state, reward, done
 
+    def return_variance(self):
+        """Per (state, action) variance of the observed returns (nan where undefined)."""
+        if self.return_m2 is None:
+            raise ValueError("Return variance is only tracked with track_variance=True")
+        if self.step_size is not None:
+            return np.where(self.counts > 0, self.return_m2, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.counts > 1, self.return_m2 / (self.counts - 1), np.nan)
+
     def epsilon_greedy(self, state):
-        if random.random() < self.epsilon:
-            return random.choice(self.actions)
-        q_values = self.Q[state]
-        return max(q_values, key=q_values.get)
+        return self.actions[self.Q.epsilon_greedy(self.Q.index(state), self.epsilon)]
 
     def generate_episode(self, max_steps=1000, random_start=False):
+        """Roll out one episode as a list of (flat state, action index, reward)."""
         episode = []
         if random_start:
-            state = (np.random.randint(self.n), np.random.randint(self.n))
+            s = self.Q.index((int(self.rng.integers(self.n)), int(self.rng.integers(self.n))))
         else:
-            state = self.start
+            s = self.Q.index(self.start)
+        next_states = self.next_states.tolist()
+        step_rewards = self.step_rewards.tolist()
+        step_done = self.step_done.tolist()
         done = False
         steps = 0
         while not done and steps < max_steps:
-            action = self.epsilon_greedy(state)
-            next_state, reward, done = self.step(state, action)
-            episode.append((state, action, reward))
-            state = next_state
+            self.Q.visited[s] = True
+            a = self.Q.epsilon_greedy(s, self.epsilon)
+            episode.append((s, a, step_rewards[s][a]))
+            done = step_done[s][a]
+            s = next_states[s][a]
             steps += 1
         return episode, done
 
-    def train(self, episodes=50000, log_interval=5000):
-        goal_reached = 0
-        returns_log = []
+    def generate_episodes(self, n_episodes, max_steps=1000, random_start=False, epsilon=None, log=None):
+        """
+        Roll out a batch of episodes in lockstep under the current Q.
+
+        Args:
+            n_episodes: Number of episodes in the batch
+            max_steps: Step limit per episode
+            random_start: Whether to start each episode in a uniformly random cell
+            epsilon: Exploration rate, scalar or one per episode; defaults to self.epsilon
+            log: Optional off_policy.EpisodeLog or episode_store.EpisodeWriter
+                that receives the episodes with the behaviour probability of
+                every action taken
+
+        Returns:
+            Tuple of (states, actions, rewards, lengths, reached): (B, T) arrays
+            padded with zero rewards past each episode's length, the length of
+            every episode and whether it reached the terminal
+        """
+        B = n_episodes
+        epsilon = self.epsilon if epsilon is None else np.asarray(epsilon)
+        if random_start:
+            s = self.rng.integers(self.n, size=B) * self.n + self.rng.integers(self.n, size=B)
+        else:
+            s = np.full(B, self.Q.index(self.start))
+
+        states = np.zeros((B, max_steps), dtype=np.intp)
+        actions = np.zeros((B, max_steps), dtype=np.intp)
+        rewards = np.zeros((B, max_steps))
+        lengths = np.zeros(B, dtype=np.intp)
+        reached = np.zeros(B, dtype=bool)
+        probs = np.zeros((B, max_steps)) if log is not None else None
+        successors = np.zeros((B, max_steps), dtype=np.intp) if log is not None else None
+
+        active = np.arange(B)
+        T = 0
+        while len(active) and T < max_steps:
+            cur = s[active]
+            self.Q.visited[cur] = True
+            eps = epsilon if np.ndim(epsilon) == 0 else epsilon[active]
+            a = self.Q.epsilon_greedy_many(cur, eps)
+            if log is not None:
+                probs[active, T] = self.Q.action_probabilities(cur, eps)[np.arange(len(cur)), a]
+            states[active, T] = cur
+            actions[active, T] = a
+            rewards[active, T] = self.step_rewards[cur, a]
+            done = self.step_done[cur, a]
+            s[active] = self.next_states[cur, a]
+            if log is not None:
+                successors[active, T] = s[active]
+            lengths[active] += 1
+            reached[active] = done
+            active = active[~done]
+            T += 1
+
+        if log is not None:
+            log.add_batch(states[:, :T], actions[:, :T], rewards[:, :T], probs[:, :T], lengths,
+                          next_states=successors[:, :T], reached=reached)
+        return states[:, :T], actions[:, :T], rewards[:, :T], lengths, reached
+
+    def discounted_returns(self, rewards):
+        """Reverse scan of a (B, T) zero-padded reward array into returns-to-go."""
+        G = np.empty_like(rewards)
+        g = np.zeros(rewards.shape[0])
+        for t in range(rewards.shape[1] - 1, -1, -1):
+            g = rewards[:, t] + self.gamma * g
+            G[:, t] = g
+        return G
+
+    def reset_statistics(self):
+        """Clear the running return statistics (Q is left untouched)."""
+        self.counts[:] = 0
+        self.return_mean[:] = 0.0
+        if self.return_m2 is not None:
+            self.return_m2[:] = 0.0
+
+    def merge_statistics(self, counts, mean, m2=None):
+        """
+        Merge another accumulator's (count, mean, M2) arrays into the running statistics.
+
+        Uses the pairwise update of Chan et al., so sample averages computed
+        on separate shards of episodes combine exactly.
+
+        Returns:
+            Boolean (S, A) mask of the pairs that received new returns
+        """
+        hit = counts > 0
+        n_old = self.counts[hit]
+        n_new = n_old + counts[hit]
+        delta = mean[hit] - self.return_mean[hit]
+        self.return_mean[hit] += delta * counts[hit] / n_new
+        if self.return_m2 is not None:
+            self.return_m2[hit] += m2[hit] + delta * delta * n_old * counts[hit] / n_new
+        self.counts[hit] = n_new
+        return hit
+
+    def first_visits(self, states, actions, rewards, lengths):
+        """
+        Return the flat (state, action) codes and returns of a batch's first visits.
+
+        First visits are found with np.unique on (episode, state, action)
+        codes and are returned in (episode, time) order.
+        """
+        B, T = states.shape
+        SA = self.Q.n_states * self.Q.n_actions
+        G = self.discounted_returns(rewards)
+        valid = np.arange(T) < lengths[:, np.newaxis]
+
+        pair = (states * self.Q.n_actions + actions)[valid]
+        episode = np.broadcast_to(np.arange(B)[:, np.newaxis], (B, T))[valid]
+        # Entries are in (episode, time) order, so np.unique keeps first visits
+        _, first = np.unique(episode * SA + pair, return_index=True)
+        first.sort()
+        return pair[first], G[valid][first]
+
+    def merge_returns(self, pair, G):
+        """
+        Fold a batch of returns into the running statistics.
+
+        With the sample average, each pair's batch count, mean and sum of
+        squared deviations are scatter-added and merged in one step. The
+        constant-step-size average is order dependent, so its updates are
+        applied one occurrence rank at a time.
+
+        Returns:
+            Boolean (S, A) mask of the pairs that received new returns
+        """
+        shape = self.counts.shape
+        SA = self.counts.size
+
+        if self.step_size is None:
+            k = np.bincount(pair, minlength=SA)
+            batch_mean = np.bincount(pair, weights=G, minlength=SA) / np.maximum(k, 1)
+            batch_m2 = None
+            if self.return_m2 is not None:
+                deviation = G - batch_mean[pair]
+                batch_m2 = np.bincount(pair, weights=deviation * deviation, minlength=SA).reshape(shape)
+            return self.merge_statistics(k.reshape(shape), batch_mean.reshape(shape), batch_m2)
+
+        count = self.counts.reshape(-1)
+        mean = self.return_mean.reshape(-1)
+        m2 = self.return_m2.reshape(-1) if self.return_m2 is not None else None
 
-        for ep in range(1, episodes+1):
-            episode, reached = self.generate_episode(max_steps=1000, random_start=True)
-            G = 0
-            visited = set()
+        # Rank of each visit among the batch's visits to the same pair
+        order = np.argsort(pair, kind='stable')
+        sorted_pair = pair[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_pair[1:] != sorted_pair[:-1]])
+        group_size = np.diff(np.r_[group_start, len(pair)])
+        rank = np.empty(len(pair), dtype=np.intp)
+        rank[order] = np.arange(len(pair)) - np.repeat(group_start, group_size)
+        for r in range(group_size.max() if len(pair) else 0):
+            sel = rank == r
+            p, g = pair[sel], G[sel]
+            count[p] += 1
+            delta = g - mean[p]
+            mean[p] += self.step_size * delta
+            if m2 is not None:
+                m2[p] = (1 - self.step_size) * (m2[p] + self.step_size * delta * delta)
 
-            if reached:
-                goal_reached += 1
+        hit = np.zeros(SA, dtype=bool)
+        hit[pair] = True
+        return hit.reshape(shape)
 
-            # Compute returns backward
-            for state, action, reward in reversed(episode):
-                G = self.gamma * G + reward
-                if (state, action) not in visited:
-                    self.returns[(state, action)].append(G)
-                    self.Q[state][action] = np.mean(self.returns[(state, action)])
-                    visited.add((state, action))
+    def update_batch(self, states, actions, rewards, lengths):
+        """Apply the first-visit Monte Carlo updates of a batch of episodes to the statistics and Q."""
+        hit = self.merge_returns(*self.first_visits(states, actions, rewards, lengths))
+        self.Q.values[hit] = self.return_mean[hit]
 
-            # Track episode return
-            total_return = sum([r for (_,_,r) in episode])
-            returns_log.append(total_return)
+    def epsilon_schedule(self, n_episodes):
+        """
+        Return the epsilon used by, and the epsilon after, each of the next n_episodes.
 
-            # Decay epsilon
-            self.epsilon = max(0.05, self.epsilon * 0.99999)
+        Epsilon decays by 0.99999 per episode down to a floor of 0.05.
+        """
+        decayed = np.maximum(0.05, self.epsilon * 0.99999 ** np.arange(1, n_episodes + 1))
+        return np.r_[self.epsilon, decayed[:-1]], decayed
 
-            # Logging
-            if ep % log_interval == 0:
-                avg_return = np.mean(returns_log[-log_interval:])
-                success_rate = goal_reached / log_interval * 100
-                print(f"Episode {ep}: avg_return={avg_return:.2f}, success_rate={success_rate:.1f}%, epsilon={self.epsilon:.3f}")
-                goal_reached = 0  # reset counter
+    def checkpoint(self, path, metrics):
+        """Atomically write the training state after metrics.episodes episodes to path."""
+        arrays = self.Q.state_arrays()
+        arrays.update(metrics.state_arrays(), counts=self.counts, return_mean=self.return_mean)
+        if self.return_m2 is not None:
+            arrays['return_m2'] = self.return_m2
+        save_checkpoint(path, arrays, {
+            'learner': type(self).__name__,
+            'episode': metrics.episodes,
+            'epsilon': self.epsilon,
+            'rng': self.rng.bit_generator.state,
+        })
+
+    def restore(self, path, metrics):
+        """
+        Restore the training state, and metrics, from a checkpoint written by checkpoint().
+
+        Returns:
+            Number of episodes already trained
+        """
+        arrays, meta = load_checkpoint(path)
+        if meta['learner'] != type(self).__name__:
+            raise ValueError(f"Checkpoint was written by {meta['learner']}, not {type(self).__name__}")
+        shape = self.Q.values.shape
+        expected = {'q_values': shape, 'counts': shape, 'return_mean': shape}
+        if self.return_m2 is not None:
+            expected['return_m2'] = shape
+        check_shapes(arrays, expected)
+
+        self.Q.load_state_arrays(arrays)
+        self.counts[:] = arrays['counts']
+        self.return_mean[:] = arrays['return_mean']
+        if self.return_m2 is not None:
+            self.return_m2[:] = arrays['return_m2']
+        self.rng = restore_rng(self.rng, meta['rng'])
+        self.Q.rng = self.rng
+        self.epsilon = meta['epsilon']
+        metrics.load_state_arrays(arrays)
+        return meta['episode']
+
+    def train(self, episodes=50000, log_interval=5000, batch_size=100, max_steps=1000, n_workers=1, log=None,
+              checkpoint_path=None, checkpoint_interval=None, resume_from=None, metrics=None, monitor=None):
+        """
+        Train with first-visit Monte Carlo control on batches of episodes.
+
+        Each batch is generated under the Q of the previous batch, and epsilon
+        decays per episode exactly as in the one-episode-at-a-time loop. With
+        n_workers > 1 the episodes are sharded across a process pool (see
+        parallel_mc.parallel_train). Pass an off_policy.EpisodeLog or an
+        episode_store.EpisodeWriter as log to keep the episodes (serial runs only).
+
+        With checkpoint_path, the training state is saved after the first batch
+        that completes each checkpoint_interval episodes (default: log_interval)
+        and after the last one. Passing a checkpoint as resume_from continues
+        that run up to a total of `episodes`; with the same batch_size the
+        result is identical to an uninterrupted run (serial runs only).
+
+        Progress goes through a metrics.Metrics (by default one printing every
+        log_interval episodes), which is returned.
+
+        A convergence.ConvergenceMonitor given as monitor is checked after
+        every batch (or parallel round) that completes monitor.check_interval
+        episodes, with Q and its greedy policy, and training stops early once
+        it is satisfied (its own state is not checkpointed).
+        """
+        if metrics is None:
+            metrics = Metrics(log_interval)
+        if n_workers > 1:
+            if log is not None:
+                raise ValueError("Episode logging is only supported with n_workers=1")
+            if checkpoint_path is not None or resume_from is not None:
+                raise ValueError("Checkpointing is only supported with n_workers=1")
+            return parallel_train(self, episodes, n_workers=n_workers, batch_size=batch_size,
+                                  max_steps=max_steps, metrics=metrics, monitor=monitor)
+
+        ep = 0
+        if resume_from is not None:
+            ep = self.restore(resume_from, metrics)
+        checkpoint_interval = checkpoint_interval or metrics.log_interval
+
+        while ep < episodes:
+            B = min(batch_size, episodes - ep)
+            epsilons, decayed = self.epsilon_schedule(B)
+
+            states, actions, rewards, lengths, reached = self.generate_episodes(
+                B, max_steps=max_steps, random_start=True, epsilon=epsilons, log=log)
+            self.update_batch(states, actions, rewards, lengths)
+
+            metrics.record_batch(rewards.sum(axis=1), reached, decayed)
+            self.epsilon = float(decayed[-1])
+            ep += B
+
+            stop = (monitor is not None and monitor.due(ep - B, ep)
+                    and monitor.check(ep, self.Q.values, self.Q.values.argmax(axis=1)))
+            if checkpoint_path is not None and (ep % checkpoint_interval < B or ep == episodes or stop):
+                self.checkpoint(checkpoint_path, metrics)
+            if stop:
+                break
+
+        return metrics
+
+    def evaluate_off_policy(self, log, policy):
+        """
+        Estimate the action values of a target policy from logged episodes.
+
+        Args:
+            log: off_policy.EpisodeLog of behaviour episodes
+            policy: Dictionary mapping (row, col) to an action (as returned by
+                extract_policy) or an (S, A) matrix of action probabilities
+
+        Returns:
+            off_policy.WeightedImportanceSampling estimator holding Q and the cumulative weights C
+        """
+        estimator = WeightedImportanceSampling(self.Q.n_states, self.Q.n_actions, self.gamma)
+        estimator.evaluate(log, policy_matrix(policy, self.n, self.actions))
+        return estimator
+
+    def improve_off_policy(self, log):
+        """
+        Learn a greedy policy from logged episodes with weighted importance sampling.
+
+        Q is replaced by the off-policy estimate wherever the log carries weight.
+
+        Returns:
+            The new greedy policy, as returned by extract_policy
+        """
+        estimator = WeightedImportanceSampling(self.Q.n_states, self.Q.n_actions, self.gamma)
+        estimator.control(log)
+        seen = estimator.C > 0
+        self.Q.values[seen] = estimator.Q[seen]
+        self.Q.visited |= seen.any(axis=1)
+        return self.extract_policy()
 
     def extract_policy(self):
-        policy = {}
-        for state in self.Q:
-            best_action = max(self.Q[state], key=self.Q[state].get)
-            policy[state] = best_action
-        return policy
+        return self.Q.extract_policy()
 
     def extract_values(self):
-        V = np.zeros((self.n, self.n))
-        for r in range(self.n):
-            for c in range(self.n):
-                state = (r, c)
-                if state == self.terminal:
-                    V[r, c] = 0
-                elif state in self.Q:
-                    V[r, c] = max(self.Q[state].values())
-                else:
-                    V[r, c] = np.nan
-        return V
-
-
-rewards = np.array([
-    [-1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -2, -1, -1],
-    [-1, -1, -3, -3, -2, -1],
-    [-1, -2, -4, -4, -2, -1],
-    [-1, -3, -6, -6, -2, -1],
-    [-1, -4, -8, -6, -4, 10]
-])
-
-env = GridWorldMC(rewards, terminal=(5,5), start=(5,0))
-env.train(episodes=100000, log_interval=5000)
-
-policy = env.extract_policy()
-print("\nFinal policy:")
-for r in range(env.n):
-    row = []
-    for c in range(env.n):
-        if (r,c) == env.terminal:
-            row.append("G")
-        else:
-            row.append(policy.get((r,c), "?"))
-    print(row)
+        return self.Q.extract_values(self.terminal)
+
+
+if __name__ == "__main__":
+    rewards = np.array([
+        [-1, -1, -1, -1, -1, -1],
+        [-1, -1, -1, -2, -1, -1],
+        [-1, -1, -3, -3, -2, -1],
+        [-1, -2, -4, -4, -2, -1],
+        [-1, -3, -6, -6, -2, -1],
+        [-1, -4, -8, -6, -4, 10]
+    ])
+
+    env = GridWorldMC(rewards, terminal=(5,5), start=(5,0))
+    env.train(episodes=100000, log_interval=5000)
+
+    policy = env.extract_policy()
+    print("\nFinal policy:")
+    for r in range(env.n):
+        row = []
+        for c in range(env.n):
+            if (r,c) == env.terminal:
+                row.append("G")
+            else:
+                row.append(policy.get((r,c), "?"))
+        print(row)
 
-print("\nValue function:")
-print(np.round(env.extract_values(), 1))
+    print("\nValue function:")
+    print(np.round(env.extract_values(), 1))
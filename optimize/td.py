@@ -1,9 +1,20 @@
+import os
+import sys
+
 import numpy as np
-from collections import defaultdict
-import random
+
+# Make the top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import check_shapes, load_checkpoint, restore_rng, save_checkpoint
+from dyna import DynaModel
+from eligibility_traces import SparseTraces
+from metrics import Metrics
+from tabular_q import QTable, tabulate_step
 
 class GridWorldTD:
-    def __init__(self, rewards, terminal=(5, 5), start=(0, 0), gamma=0.9, epsilon=0.1, alpha=0.1):
+    def __init__(self, rewards, terminal=(5, 5), start=(0, 0), gamma=0.9, epsilon=0.1, alpha=0.1, rng=None,
+                 lam=0.0, traces='replacing', trace_cutoff=1e-4):
         self.n = rewards.shape[0]
         self.rewards = rewards
         self.terminal = terminal
@@ -12,8 +23,23 @@ class GridWorldTD:
         self.epsilon = epsilon
         self.alpha = alpha
         self.actions = ['N', 'S', 'E', 'W']
+        self.rng = np.random.default_rng(rng)
+
+        # Watkins's Q(lambda) with sparse eligibility traces when lam > 0
+        # Traces must decay (gamma * lam < 1) to expire, so lam = 1 needs gamma < 1
+        if not 0 <= lam <= 1 or gamma * lam >= 1:
+            raise ValueError(f"lam must be in [0, 1] with gamma * lam < 1, got lam={lam}, gamma={gamma}")
+        self.lam = lam
+        self.traces = SparseTraces(gamma * lam, traces, trace_cutoff) if lam > 0 else None
 
-        self.Q = defaultdict(lambda: {a: 0.0 for a in self.actions})
+        self.Q = QTable(self.n, self.actions, rng=self.rng)
+        self.next_states, self.step_rewards, self.step_done = tabulate_step(self.step, self.n, self.actions)
+
+        # Dyna-Q model of the observed transitions, created by the first
+        # train() call with planning_steps > 0
+        self.model = None
+        # Real environment steps taken by train()
+        self.env_steps = 0
 
     def step(self, state, action):
         if state == self.terminal:
@@ -31,92 +57,231 @@ class GridWorldTD:
         return next_state, reward, done
 
     def epsilon_greedy(self, state):
-        if random.random() < self.epsilon:
-            return random.choice(self.actions)
-        q_values = self.Q[state]
-        return max(q_values, key=q_values.get)
+        return self.actions[self.Q.epsilon_greedy(self.Q.index(state), self.epsilon)]
+
+    def optimal_q(self, tolerance=1e-10, max_iterations=10000):
+        """
+        Return the exact (S, A) Q* of the grid by value iteration on the tabulated dynamics.
+
+        Use it as the reference of convergence checks, e.g. through
+        convergence.optimal_actions.
+        """
+        Q = np.zeros(self.step_rewards.shape)
+        for _ in range(max_iterations):
+            new = self.step_rewards + self.gamma * np.where(self.step_done, 0.0, Q.max(axis=1)[self.next_states])
+            delta = np.abs(new - Q).max()
+            Q = new
+            if delta < tolerance:
+                break
+        return Q
+
+    def checkpoint(self, path, metrics, replay=None):
+        """Atomically write the training state (and replay buffer) after metrics.episodes episodes to path."""
+        arrays = self.Q.state_arrays()
+        arrays.update(metrics.state_arrays())
+        if self.model is not None:
+            arrays.update(self.model.state_arrays())
+        if replay is not None:
+            arrays.update(replay.state_arrays())
+        save_checkpoint(path, arrays, {
+            'learner': type(self).__name__,
+            'episode': metrics.episodes,
+            'epsilon': self.epsilon,
+            'env_steps': self.env_steps,
+            'rng': self.rng.bit_generator.state,
+        })
+
+    def restore(self, path, metrics, replay=None):
+        """
+        Restore the training state, metrics and replay buffer from a checkpoint written by checkpoint().
+
+        Returns:
+            Number of episodes already trained
+        """
+        arrays, meta = load_checkpoint(path)
+        if meta['learner'] != type(self).__name__:
+            raise ValueError(f"Checkpoint was written by {meta['learner']}, not {type(self).__name__}")
+        check_shapes(arrays, {'q_values': self.Q.values.shape})
+        self.Q.load_state_arrays(arrays)
+        self.rng = restore_rng(self.rng, meta['rng'])
+        self.Q.rng = self.rng
+        self.epsilon = meta['epsilon']
+        self.env_steps = meta.get('env_steps', 0)
+        metrics.load_state_arrays(arrays)
+        if 'model_pairs' in arrays:
+            self.model = DynaModel(self.Q.n_states, self.Q.n_actions)
+            self.model.load_state_arrays(arrays)
+        if replay is not None:
+            if 'replay_states' not in arrays:
+                raise ValueError("Checkpoint has no replay buffer")
+            replay.load_state_arrays(arrays)
+        return meta['episode']
+
+    def train(self, episodes=50000, max_steps=1000, log_interval=5000, log=None,
+              checkpoint_path=None, checkpoint_interval=None, resume_from=None, metrics=None, monitor=None,
+              planning_steps=0, prioritized=False, replay=None, replay_batch_size=32, replay_every=4):
+        """
+        Train with Q-learning, or Watkins's Q(lambda) when the learner was
+        created with lam > 0: eligibility traces (see eligibility_traces) carry
+        every TD error back along the recent state-action pairs and are cut
+        after an exploratory action.
+
+        With planning_steps > 0 this is Dyna-Q: every real step is recorded in
+        a dyna.DynaModel and followed by planning_steps simulated updates,
+        sampled uniformly or, with prioritized=True, chosen by prioritized
+        sweeping. Planning spends computation to need fewer real steps
+        (counted in self.env_steps); see dyna.episodes_to_optimal.
+
+        With a replay.ReplayBuffer or replay.PrioritizedReplayBuffer as replay,
+        every real transition is also stored, and every replay_every real
+        steps a minibatch of replay_batch_size stored transitions is applied
+        to Q in one vectorized update. The buffer is included in checkpoints.
+
+        Pass an off_policy.EpisodeLog or episode_store.EpisodeWriter as log to
+        keep every episode, with the behaviour probability of each action taken.
 
-    def train(self, episodes=50000, max_steps=1000, log_interval=5000):
-        goal_reached = 0
-        returns_log = []
+        With checkpoint_path, the training state is saved every
+        checkpoint_interval episodes (default: log_interval) and after the
+        last one. Passing a checkpoint as resume_from continues that run up to
+        a total of `episodes`, exactly as if it had never stopped.
 
-        for ep in range(1, episodes + 1):
-            state = self.start
+        Progress goes through a metrics.Metrics (by default one printing every
+        log_interval episodes), which is returned.
+
+        A convergence.ConvergenceMonitor given as monitor is checked every
+        monitor.check_interval episodes with Q and its greedy policy, and
+        training stops early once it is satisfied (its own state is not
+        checkpointed).
+        """
+        if metrics is None:
+            metrics = Metrics(log_interval)
+        first_ep = 1
+        if resume_from is not None:
+            first_ep = self.restore(resume_from, metrics, replay) + 1
+        checkpoint_interval = checkpoint_interval or metrics.log_interval
+        if planning_steps and self.model is None:
+            self.model = DynaModel(self.Q.n_states, self.Q.n_actions)
+        model = self.model if planning_steps else None
+
+        Q = self.Q.values
+        # Plain lists make the scalar lookups in the inner loop cheap
+        next_states = self.next_states.tolist()
+        step_rewards = self.step_rewards.tolist()
+        step_done = self.step_done.tolist()
+        visited = self.Q.visited
+        traces = self.traces
+        Q_flat = Q.reshape(-1)
+        n_actions = self.Q.n_actions
+
+        for ep in range(first_ep, episodes + 1):
+            s = self.Q.index(self.start)
             done = False
             total_return = 0
             steps = 0
+            if log is not None:
+                trace = ([], [], [], [], [])
+            if traces is not None:
+                traces.clear()
 
             while not done and steps < max_steps:
-                action = self.epsilon_greedy(state)
-                next_state, reward, done = self.step(state, action)
+                visited[s] = True
+                # Q(lambda) picks the next action, and logs its probability,
+                # before the update that precedes it
+                if traces is None or steps == 0:
+                    a = self.Q.epsilon_greedy(s, self.epsilon)
+                    prob = self.Q.action_probabilities(s, self.epsilon)[a] if log is not None else None
+                else:
+                    a, prob = next_a, next_prob
+                if log is not None:
+                    for values, value in zip(trace, (s, a, step_rewards[s][a], next_states[s][a], prob)):
+                        values.append(value)
+                next_s = next_states[s][a]
+                reward = step_rewards[s][a]
+                done = step_done[s][a]
+                visited[next_s] = True
+
+                if traces is None:
+                    # TD(0) update
+                    td_target = reward + self.gamma * self.Q.max_value(next_s)
+                    td_error = td_target - Q[s, a]
+                    Q[s, a] += self.alpha * td_error
+                else:
+                    greedy_value = self.Q.max_value(next_s)
+                    next_a = self.Q.epsilon_greedy(next_s, self.epsilon) if not done else None
+                    next_prob = (self.Q.action_probabilities(next_s, self.epsilon)[next_a]
+                                 if next_a is not None and log is not None else None)
+                    exploratory = next_a is not None and Q[next_s, next_a] < greedy_value
+
+                    td_error = reward + self.gamma * greedy_value - Q[s, a]
+                    traces.visit(s * n_actions + a)
+                    scaled_error = self.alpha * td_error
+                    for pair, e in traces.items():
+                        Q_flat[pair] += scaled_error * e
+                    if exploratory:
+                        traces.clear()
+                    else:
+                        traces.decay()
 
-                # TD(0) update
-                best_next_action = max(self.Q[next_state], key=self.Q[next_state].get)
-                td_target = reward + self.gamma * self.Q[next_state][best_next_action]
-                td_error = td_target - self.Q[state][action]
-                self.Q[state][action] += self.alpha * td_error
+                if model is not None:
+                    model.update(s, a, reward, next_s, done)
+                    model.plan(Q, planning_steps, self.alpha, self.gamma, self.rng, prioritized)
+                if replay is not None:
+                    replay.add(s, a, reward, next_s, done)
+                    if (self.env_steps + steps + 1) % replay_every == 0 and len(replay) >= replay_batch_size:
+                        replay.replay(Q, replay_batch_size, self.alpha, self.gamma, self.rng)
 
                 total_return += reward
-                state = next_state
+                s = next_s
                 steps += 1
 
-            if done:
-                goal_reached += 1
-            returns_log.append(total_return)
+            self.env_steps += steps
+            if log is not None:
+                states, actions, rewards, successors, probs = trace
+                log.add(states, actions, rewards, probs, next_states=successors, reached=done)
 
             # Decay epsilon
             self.epsilon = max(0.05, self.epsilon * 0.99999)
+            metrics.record(total_return, done, self.epsilon)
 
-            # Logging
-            if ep % log_interval == 0:
-                avg_return = np.mean(returns_log[-log_interval:])
-                success_rate = goal_reached / log_interval * 100
-                print(f"Episode {ep}: avg_return={avg_return:.2f}, success_rate={success_rate:.1f}%, epsilon={self.epsilon:.3f}")
-                goal_reached = 0
+            stop = (monitor is not None and ep % monitor.check_interval == 0
+                    and monitor.check(ep, Q, Q.argmax(axis=1)))
+            if checkpoint_path is not None and (ep % checkpoint_interval == 0 or ep == episodes or stop):
+                self.checkpoint(checkpoint_path, metrics, replay)
+            if stop:
+                break
+
+        return metrics
 
     def extract_policy(self):
-        policy = {}
-        for state in self.Q:
-            best_action = max(self.Q[state], key=self.Q[state].get)
-            policy[state] = best_action
-        return policy
+        return self.Q.extract_policy()
 
     def extract_values(self):
-        V = np.zeros((self.n, self.n))
-        for r in range(self.n):
-            for c in range(self.n):
-                state = (r, c)
-                if state == self.terminal:
-                    V[r, c] = 0
-                elif state in self.Q:
-                    V[r, c] = max(self.Q[state].values())
-                else:
-                    V[r, c] = np.nan
-        return V
-
-
-rewards = np.array([
-    [-1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -2, -1, -1],
-    [-1, -1, -3, -3, -2, -1],
-    [-1, -2, -4, -4, -2, -1],
-    [-1, -3, -6, -6, -2, -1],
-    [-1, -4, -8, -6, -4, 10]
-])
-
-env = GridWorldTD(rewards, terminal=(5,5), start=(5,0), alpha=0.1)
-env.train(episodes=100000, log_interval=5000)
-
-policy = env.extract_policy()
-print("\nFinal policy:")
-for r in range(env.n):
-    row = []
-    for c in range(env.n):
-        if (r,c) == env.terminal:
-            row.append("G")
-        else:
-            row.append(policy.get((r,c), "?"))
-    print(row)
-
-print("\nValue function:")
-print(np.round(env.extract_values(), 1))
+        return self.Q.extract_values(self.terminal)
+
+
+if __name__ == "__main__":
+    rewards = np.array([
+        [-1, -1, -1, -1, -1, -1],
+        [-1, -1, -1, -2, -1, -1],
+        [-1, -1, -3, -3, -2, -1],
+        [-1, -2, -4, -4, -2, -1],
+        [-1, -3, -6, -6, -2, -1],
+        [-1, -4, -8, -6, -4, 10]
+    ])
+
+    env = GridWorldTD(rewards, terminal=(5,5), start=(5,0), alpha=0.1)
+    env.train(episodes=100000, log_interval=5000)
+
+    policy = env.extract_policy()
+    print("\nFinal policy:")
+    for r in range(env.n):
+        row = []
+        for c in range(env.n):
+            if (r,c) == env.terminal:
+                row.append("G")
+            else:
+                row.append(policy.get((r,c), "?"))
+        print(row)
+
+    print("\nValue function:")
+    print(np.round(env.extract_values(), 1))
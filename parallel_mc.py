@@ -0,0 +1,154 @@
+"""
+Process-pool drivers for the Monte Carlo learners.
+
+Monte Carlo estimates are sums and counts, which merge trivially, so episodes
+are sharded across worker processes that each accumulate local statistics and
+the driver reduces them at the end of every round. For control, the learner,
+and with it the current Q, is sent to the workers at the start of each round,
+so every round is generated under the greedy policy of the previous reduction.
+
+Every (round, shard) pair gets its own child SeedSequence of one root seed, so
+a run is reproducible for a given seed, worker count and round size regardless
+of how the pool schedules the shards.
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from metrics import Metrics
+from random_streams import spawn_seed_sequences
+
+
+def _shard_sizes(total: int, n: int) -> List[int]:
+    """Split total into n nearly equal parts."""
+    base, extra = divmod(total, n)
+    return [base + (i < extra) for i in range(n)]
+
+
+def _evaluate_shard(evaluator, episodes: int, seed: np.random.SeedSequence):
+    if hasattr(evaluator, 'rng'):
+        evaluator.rng = np.random.default_rng(seed)
+    return evaluator.episode_statistics(episodes)
+
+
+def parallel_evaluate(evaluator, episodes: int, n_workers: Optional[int] = None, rounds: int = 1,
+                      seed=None, verbose: bool = False) -> None:
+    """
+    Monte Carlo policy evaluation with episodes sharded across processes.
+
+    Args:
+        evaluator: MonteCarloEvaluator or WindyMonteCarloEvaluator; anything with
+            episode_statistics(episodes) -> (counts, sums) and
+            merge_statistics(counts, sums)
+        episodes: Number of sweeps over all start states, as in evaluate_policy
+        n_workers: Number of worker processes; defaults to os.cpu_count()
+        rounds: Number of reductions; the value estimate is updated after each
+        seed: Root seed for the workers' random streams
+        verbose: Whether to print the value estimates as each shard is merged
+    """
+    n_workers = n_workers or os.cpu_count()
+    round_seeds = spawn_seed_sequences(seed, rounds)
+
+    done = 0
+    with ProcessPoolExecutor(n_workers) as pool:
+        for r, (size, round_seed) in enumerate(zip(_shard_sizes(episodes, rounds), round_seeds), 1):
+            shards = [(n, s) for n, s in zip(_shard_sizes(size, n_workers), round_seed.spawn(n_workers)) if n]
+            futures = [pool.submit(_evaluate_shard, evaluator, n, s) for n, s in shards]
+            # Merge in shard order so the result does not depend on scheduling
+            for k, ((n, _), future) in enumerate(zip(shards, futures), 1):
+                evaluator.merge_statistics(*future.result())
+                done += n
+
+                if verbose:
+                    print(f"\n📊 Round {r}, shard {k}/{len(shards)} Value Estimates "
+                          f"(parallel Monte Carlo, {done}/{episodes} episodes):")
+                    for row in evaluator.value:
+                        print(['{:.2f}'.format(v) for v in row])
+
+
+def _control_shard(learner, epsilons: np.ndarray, batch_size: int, max_steps: int,
+                   seed: np.random.SeedSequence):
+    learner.rng = np.random.default_rng(seed)
+    learner.Q.reseed(learner.rng)
+    learner.reset_statistics()
+
+    returns, reached = [], []
+    for start in range(0, len(epsilons), batch_size):
+        eps = epsilons[start:start + batch_size]
+        states, actions, rewards, lengths, done = learner.generate_episodes(
+            len(eps), max_steps=max_steps, random_start=True, epsilon=eps)
+        # Only the local statistics change; Q stays the broadcast one all round
+        learner.merge_returns(*learner.first_visits(states, actions, rewards, lengths))
+        returns.append(rewards.sum(axis=1))
+        reached.append(done)
+
+    return (learner.counts, learner.return_mean, learner.return_m2, learner.Q.visited,
+            np.concatenate(returns), np.concatenate(reached))
+
+
+def parallel_train(learner, episodes: int, n_workers: Optional[int] = None,
+                   episodes_per_round: Optional[int] = None, batch_size: int = 100,
+                   max_steps: int = 1000, log_interval: int = 5000, seed=None,
+                   metrics: Optional[Metrics] = None, monitor=None) -> Metrics:
+    """
+    First-visit Monte Carlo control for GridWorldMC with episodes sharded across processes.
+
+    Args:
+        learner: GridWorldMC instance, updated in place
+        episodes: Total number of episodes
+        n_workers: Number of worker processes; defaults to os.cpu_count()
+        episodes_per_round: Episodes generated under one broadcast policy
+            before the driver reduces; defaults to one batch per worker.
+            Larger rounds cut communication but act on a staler policy, which
+            slows early learning when the greedy policy still has cycles
+        batch_size: Episodes each worker generates in lockstep
+        max_steps: Step limit per episode
+        log_interval: Episodes per progress line, unless metrics is given
+        seed: Root seed for the workers' random streams
+        metrics: metrics.Metrics receiving the episode returns, in shard order
+        monitor: convergence.ConvergenceMonitor checked after every round that
+            completes monitor.check_interval episodes; stops training early
+
+    Returns:
+        The metrics
+    """
+    if learner.step_size is not None:
+        raise ValueError("The constant-step-size average depends on update order and cannot be "
+                         "reduced across workers; use step_size=None")
+
+    n_workers = n_workers or os.cpu_count()
+    episodes_per_round = episodes_per_round or batch_size * n_workers
+    n_rounds = -(-episodes // episodes_per_round)
+    round_seeds = spawn_seed_sequences(seed, n_rounds)
+
+    if metrics is None:
+        metrics = Metrics(log_interval)
+    ep = 0
+    with ProcessPoolExecutor(n_workers) as pool:
+        for round_seed in round_seeds:
+            B = min(episodes_per_round, episodes - ep)
+            epsilons, decayed = learner.epsilon_schedule(B)
+
+            bounds = np.cumsum([0] + _shard_sizes(B, n_workers))
+            shards = [(lo, hi, s) for lo, hi, s in zip(bounds[:-1], bounds[1:], round_seed.spawn(n_workers)) if hi > lo]
+            futures = [pool.submit(_control_shard, learner, epsilons[lo:hi], batch_size, max_steps, s)
+                       for lo, hi, s in shards]
+
+            # Reduce in shard order so the result does not depend on scheduling
+            for (lo, hi, _), future in zip(shards, futures):
+                counts, mean, m2, visited, returns, reached = future.result()
+                hit = learner.merge_statistics(counts, mean, m2)
+                learner.Q.values[hit] = learner.return_mean[hit]
+                learner.Q.visited |= visited
+                metrics.record_batch(returns, reached, decayed[lo:hi])
+
+            learner.epsilon = float(decayed[-1])
+            ep += B
+
+            if (monitor is not None and monitor.due(ep - B, ep)
+                    and monitor.check(ep, learner.Q.values, learner.Q.values.argmax(axis=1))):
+                break
+
+    return metrics
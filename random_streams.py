@@ -0,0 +1,31 @@
+"""
+Reproducible random number streams for simulators and learners.
+
+Every environment and learner in this project takes an ``rng`` argument that is
+passed through np.random.default_rng, so it accepts None (fresh OS entropy), an
+int seed, a SeedSequence or an existing Generator. For parallel work, spawn one
+independent child stream per worker from a single root seed: the streams are
+statistically independent, and the whole run is reproducible from that seed.
+
+Example:
+    seeds = spawn_seed_sequences(1234, n_workers)
+    # In worker i:
+    rng = np.random.default_rng(seeds[i])
+"""
+
+import numpy as np
+from typing import List, Optional, Union
+
+SeedLike = Optional[Union[int, np.random.SeedSequence]]
+
+
+def spawn_seed_sequences(seed: SeedLike, n: int) -> List[np.random.SeedSequence]:
+    """
+    Spawn n independent child SeedSequences from a root seed.
+
+    SeedSequences are small and picklable, which makes them the cheapest thing
+    to send to worker processes.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return root.spawn(n)
+
@@ -0,0 +1,263 @@
+"""
+Experience replay for the tabular Q-learners.
+
+ReplayBuffer keeps the last `capacity` transitions (s, a, r, s', done) in
+preallocated ring-buffer arrays and samples minibatches uniformly.
+PrioritizedReplayBuffer samples in proportion to (|TD error| + eps) ** alpha
+through a sum-tree (Schaul et al., 2016), with importance-sampling weights
+corrected by beta. New transitions get the largest priority seen so far; their
+leaves are written in O(1) and the tree is brought up to date in one
+vectorized pass before the next sample.
+
+replay_update applies a sampled minibatch to Q in one NumPy step. Samples of
+the same (state, action) pair, whether duplicate indices or equal
+transitions stored more than once, are averaged into a single update from
+the pre-batch Q instead of compounding.
+"""
+
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+Batch = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def replay_update(Q: np.ndarray, batch: Batch, alpha: float, gamma: float,
+                  weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Apply one minibatch of Q-learning updates to Q in place.
+
+    Args:
+        Q: (S, A) C-contiguous action values
+        batch: (states, actions, rewards, next_states, dones) arrays
+        alpha: Step size
+        gamma: Discount factor
+        weights: Importance-sampling weight of each sample, or None
+
+    Returns:
+        The TD error of every sample, computed from the pre-batch Q
+    """
+    states, actions, rewards, next_states, dones = batch
+    bootstrap = np.where(dones, 0.0, Q[next_states].max(axis=1))
+    td_errors = rewards + gamma * bootstrap - Q[states, actions]
+
+    pair = states * Q.shape[1] + actions
+    pairs, inverse = np.unique(pair, return_inverse=True)
+    weighted = td_errors if weights is None else weights * td_errors
+    mean_error = np.bincount(inverse, weights=weighted) / np.bincount(inverse)
+    Q.reshape(-1)[pairs] += alpha * mean_error
+    return td_errors
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions with uniform sampling.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Preallocate the buffer.
+
+        Args:
+            capacity: Number of most recent transitions kept
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.intp)
+        self.actions = np.zeros(capacity, dtype=np.intp)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros(capacity, dtype=np.intp)
+        self.dones = np.zeros(capacity, dtype=bool)
+        # Transitions ever added; the next one goes to count % capacity
+        self.count = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def add(self, s: int, a: int, reward: float, next_state: int, done: bool) -> int:
+        """Store one transition, overwriting the oldest when full; returns its slot."""
+        i = self.count % self.capacity
+        self.states[i] = s
+        self.actions[i] = a
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.count += 1
+        return i
+
+    def transitions(self, indices: np.ndarray) -> Batch:
+        """Return the (states, actions, rewards, next_states, dones) stored at the given slots."""
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices])
+
+    def sample(self, batch_size: int, rng: np.random.Generator) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Sample slots uniformly with replacement.
+
+        Returns:
+            Tuple of (indices, weights); weights is None for uniform sampling
+        """
+        return rng.integers(len(self), size=batch_size), None
+
+    def replay(self, Q: np.ndarray, batch_size: int, alpha: float, gamma: float,
+               rng: np.random.Generator) -> np.ndarray:
+        """
+        Sample a minibatch and apply it to Q (see replay_update).
+
+        Returns:
+            The TD error of every sample
+        """
+        indices, weights = self.sample(batch_size, rng)
+        return replay_update(Q, self.transitions(indices), alpha, gamma, weights)
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the arrays needed to checkpoint the buffer."""
+        return {
+            'replay_states': self.states,
+            'replay_actions': self.actions,
+            'replay_rewards': self.rewards,
+            'replay_next_states': self.next_states,
+            'replay_dones': self.dones,
+            'replay_count': np.array(self.count),
+        }
+
+    def load_state_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the buffer from arrays saved by state_arrays."""
+        if arrays['replay_states'].shape != (self.capacity,):
+            raise ValueError(f"Checkpoint replay capacity is {len(arrays['replay_states'])}, "
+                             f"expected {self.capacity}")
+        self.states[:] = arrays['replay_states']
+        self.actions[:] = arrays['replay_actions']
+        self.rewards[:] = arrays['replay_rewards']
+        self.next_states[:] = arrays['replay_next_states']
+        self.dones[:] = arrays['replay_dones']
+        self.count = int(arrays['replay_count'])
+
+
+class SumTree:
+    """
+    Array-backed binary tree of priorities whose internal nodes hold the sums of their children.
+    """
+
+    def __init__(self, capacity: int):
+        # Leaves live at [size, 2 * size); node i has children 2i and 2i + 1
+        self.size = 1 << max(capacity - 1, 0).bit_length()
+        self.depth = self.size.bit_length() - 1
+        self.tree = np.zeros(2 * self.size)
+
+    @property
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    def leaves(self, indices: np.ndarray) -> np.ndarray:
+        return self.tree[self.size + indices]
+
+    def set_leaves(self, indices: np.ndarray, priorities: np.ndarray) -> None:
+        """Write leaf priorities without updating the sums (see refresh)."""
+        self.tree[self.size + indices] = priorities
+
+    def refresh(self, indices: np.ndarray) -> None:
+        """Recompute the sums above the given leaves, one level at a time."""
+        nodes = np.unique((np.asarray(indices) + self.size) // 2)
+        for _ in range(self.depth):
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray) -> None:
+        """Set leaf priorities and propagate the sums (duplicate indices: last wins)."""
+        self.set_leaves(indices, priorities)
+        self.refresh(indices)
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """Return the leaf index holding each cumulative value in [0, total)."""
+        values = np.array(values, dtype=float)
+        node = np.ones(len(values), dtype=np.intp)
+        for _ in range(self.depth):
+            left = 2 * node
+            left_sum = self.tree[left]
+            # Never descend into an empty subtree on rounding at the edge
+            go_right = (values >= left_sum) & (self.tree[left + 1] > 0)
+            values -= np.where(go_right, left_sum, 0.0)
+            node = left + go_right
+        return node - self.size
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Ring buffer of transitions with proportional prioritized sampling.
+    """
+
+    def __init__(self, capacity: int, alpha: float = 0.6, beta: float = 0.4, eps: float = 1e-3):
+        """
+        Preallocate the buffer.
+
+        Args:
+            capacity: Number of most recent transitions kept
+            alpha: Priority exponent (0 is uniform)
+            beta: Importance-sampling correction exponent (1 is full correction)
+            eps: Added to |TD error| so no transition becomes unreachable
+        """
+        super().__init__(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+        self._pending = []
+
+    def add(self, s: int, a: int, reward: float, next_state: int, done: bool) -> int:
+        i = super().add(s, a, reward, next_state, done)
+        self.tree.set_leaves(i, self.max_priority)
+        self._pending.append(i)
+        return i
+
+    def _flush(self) -> None:
+        if self._pending:
+            self.tree.refresh(np.array(self._pending))
+            self._pending = []
+
+    def sample(self, batch_size: int, rng: np.random.Generator) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Sample slots in proportion to priority, one per equal slice of the total (stratified).
+
+        Returns:
+            Tuple of (indices, importance-sampling weights normalized to a maximum of 1)
+        """
+        self._flush()
+        total = self.tree.total
+        values = (np.arange(batch_size) + rng.random(batch_size)) * (total / batch_size)
+        indices = np.minimum(self.tree.find(values), len(self) - 1)
+        probs = self.tree.leaves(indices) / total
+        weights = (len(self) * probs) ** -self.beta
+        return indices, weights / weights.max()
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        """Set the priorities of sampled slots from their TD errors."""
+        priorities = (np.abs(td_errors) + self.eps) ** self.alpha
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities)
+
+    def replay(self, Q: np.ndarray, batch_size: int, alpha: float, gamma: float,
+               rng: np.random.Generator) -> np.ndarray:
+        """
+        Sample a minibatch, apply it to Q and update the sampled priorities.
+
+        Returns:
+            The TD error of every sample
+        """
+        indices, weights = self.sample(batch_size, rng)
+        td_errors = replay_update(Q, self.transitions(indices), alpha, gamma, weights)
+        self.update_priorities(indices, td_errors)
+        return td_errors
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        self._flush()
+        arrays = super().state_arrays()
+        arrays.update(replay_tree=self.tree.tree, replay_max_priority=np.array(self.max_priority))
+        return arrays
+
+    def load_state_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        super().load_state_arrays(arrays)
+        self.tree.tree[:] = arrays['replay_tree']
+        self.max_priority = float(arrays['replay_max_priority'])
+        self._pending = []
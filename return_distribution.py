@@ -0,0 +1,186 @@
+"""
+Distributional policy evaluation for StochasticGridWorld.
+
+Each state's return distribution is represented on a fixed support of evenly
+spaced atoms (a categorical distribution). One distributional Bellman backup
+shifts every successor's distribution by the reward of entering it, scales it by
+gamma, projects the result back onto the support and mixes the successors by
+their transition probabilities. The backup is vectorized across all states.
+
+With integer rewards, gamma = 1 and an integer support (the default in that
+case) every shifted atom lands exactly on another atom, so the projection is
+exact and the only approximation is truncating returns outside [v_min, v_max].
+
+As in chain_analysis, a return counts the reward of every cell entered,
+including the terminal one, and nothing after absorption.
+"""
+
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+from chain_analysis import absorbing_chain_statistics
+from gridworld import policy_action_indices
+
+
+class CategoricalReturnEvaluator:
+    """
+    Evaluate the full return distribution of a fixed policy.
+    """
+
+    def __init__(self, grid_world, gamma: float = 1.0, v_min: Optional[float] = None,
+                 v_max: Optional[float] = None, n_atoms: Optional[int] = None,
+                 tail_std: float = 8.0):
+        """
+        Initialize the evaluator.
+
+        Args:
+            grid_world: StochasticGridWorld instance (its policy is evaluated)
+            gamma: Discount factor
+            v_min: Lowest atom; defaults to a bound derived from the exact
+                expected episode length plus tail_std standard deviations
+            v_max: Highest atom; same default as v_min
+            n_atoms: Number of atoms; defaults to one per integer when rewards
+                are integers and gamma is 1, otherwise 201
+            tail_std: Standard deviations of episode length covered by the default bounds
+        """
+        self.grid_world = grid_world
+        self.gamma = gamma
+        self.N = grid_world.N
+        self.rewards = np.asarray(grid_world.rewards, dtype=float).ravel()
+        self.terminal = grid_world.terminal[0] * self.N + grid_world.terminal[1]
+
+        model = grid_world.transitions
+        actions = policy_action_indices(grid_world)
+        states = np.arange(model.n_states)
+        self.next_states = np.asarray(model.next_states[states, actions])
+        self.probs = np.asarray(model.probs[states, actions])
+
+        integer_rewards = np.all(self.rewards == np.round(self.rewards))
+        if v_min is None or v_max is None:
+            stats = absorbing_chain_statistics(grid_world, gamma)
+            steps = stats['expected_steps'] + tail_std * stats['steps_std']
+            horizon = np.max(steps[np.isfinite(steps)]) + 1
+            low = min(0.0, self.rewards.min()) * horizon
+            high = max(0.0, self.rewards.max()) * horizon
+            v_min = np.floor(low) if v_min is None else v_min
+            v_max = np.ceil(high) if v_max is None else v_max
+        if n_atoms is None:
+            if integer_rewards and gamma == 1.0 and float(v_min).is_integer() and float(v_max).is_integer():
+                n_atoms = int(v_max - v_min) + 1
+            else:
+                n_atoms = 201
+
+        self.v_min = float(v_min)
+        self.v_max = float(v_max)
+        self.n_atoms = n_atoms
+        self.atoms = np.linspace(self.v_min, self.v_max, n_atoms)
+        self.delta_z = (self.v_max - self.v_min) / (n_atoms - 1)
+        self.exact = bool(integer_rewards and gamma == 1.0 and self.delta_z == 1.0
+                          and float(self.v_min).is_integer())
+
+        # Every state starts with all mass on a return of zero
+        self.dist = np.zeros((model.n_states, n_atoms))
+        self.dist[:, self._zero_atom()] = 1.0
+        self._build_projection()
+
+    def _zero_atom(self) -> int:
+        return int(np.clip(np.round(-self.v_min / self.delta_z), 0, self.n_atoms - 1))
+
+    def _build_projection(self) -> None:
+        """
+        Precompute where each (state, successor, atom) lands after the shift.
+
+        The target r(s') + gamma * z_j depends only on the successor and atom,
+        so the lower/upper atom indices and weights are computed once.
+        """
+        shifted = self.rewards[:, np.newaxis] + self.gamma * self.atoms[np.newaxis, :]
+        # Entering the terminal ends the episode: its successor return is zero
+        shifted[self.terminal] = self.rewards[self.terminal]
+        b = np.clip((shifted - self.v_min) / self.delta_z, 0, self.n_atoms - 1)
+        lower = np.floor(b).astype(np.intp)
+        upper = np.ceil(b).astype(np.intp)
+        upper_weight = b - lower
+        self._lower = lower
+        self._upper = upper
+        self._lower_weight = 1.0 - upper_weight
+        self._upper_weight = upper_weight
+
+    def backup(self) -> np.ndarray:
+        """
+        Apply one distributional Bellman backup to every state.
+
+        Returns:
+            The new (S, n_atoms) array of probabilities
+        """
+        S, M = self.dist.shape
+        K = self.next_states.shape[1]
+
+        # Successor distributions; the terminal contributes a point mass
+        succ = self.dist[self.next_states]
+        succ[self.next_states == self.terminal] = 0.0
+        succ[self.next_states == self.terminal, self._zero_atom()] = 1.0
+        mass = succ * self.probs[:, :, np.newaxis]
+
+        rows = np.repeat(np.arange(S), K * M)
+        lower = self._lower[self.next_states].ravel()
+        upper = self._upper[self.next_states].ravel()
+        w_lower = (mass * self._lower_weight[self.next_states]).ravel()
+        w_upper = (mass * self._upper_weight[self.next_states]).ravel()
+
+        new = np.bincount(rows * M + lower, weights=w_lower, minlength=S * M)
+        new += np.bincount(rows * M + upper, weights=w_upper, minlength=S * M)
+        new = new.reshape(S, M)
+
+        # The terminal itself has no future return
+        new[self.terminal] = 0.0
+        new[self.terminal, self._zero_atom()] = 1.0
+        return new
+
+    def evaluate(self, tolerance: float = 1e-8, max_iterations: int = 10000,
+                 verbose: bool = False) -> int:
+        """
+        Iterate distributional backups until the CDFs stop changing.
+
+        Args:
+            tolerance: Convergence threshold on the largest CDF change
+            max_iterations: Upper bound on the number of backups
+            verbose: Whether to print iteration details
+
+        Returns:
+            Number of iterations until convergence
+        """
+        for iteration in range(1, max_iterations + 1):
+            new = self.backup()
+            delta = np.max(np.abs(np.cumsum(new - self.dist, axis=1)))
+            self.dist = new
+            if verbose:
+                print(f"Iteration {iteration} - Max CDF Delta: {delta:.8f}")
+            if delta < tolerance:
+                if verbose:
+                    print(f"\n✅ Converged in {iteration} iterations.")
+                return iteration
+        return max_iterations
+
+    def cdf(self, position=None) -> np.ndarray:
+        """
+        Return the CDF over self.atoms for one state, or (N, N, n_atoms) for all.
+        """
+        cdf = np.cumsum(self.dist, axis=1)
+        if position is None:
+            return cdf.reshape(self.N, self.N, self.n_atoms)
+        return cdf[position[0] * self.N + position[1]]
+
+    def quantiles(self, qs: Sequence[float] = (0.05, 0.5, 0.95)) -> Dict[float, np.ndarray]:
+        """
+        Return per-state return quantiles as (N, N) arrays keyed by quantile level.
+        """
+        cdf = np.cumsum(self.dist, axis=1)
+        result = {}
+        for q in qs:
+            idx = np.argmax(cdf >= q - 1e-12, axis=1)
+            result[q] = self.atoms[idx].reshape(self.N, self.N)
+        return result
+
+    def mean(self) -> np.ndarray:
+        """Return the mean of each state's return distribution as an (N, N) array."""
+        return (self.dist @ self.atoms).reshape(self.N, self.N)
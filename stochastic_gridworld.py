@@ -1,6 +1,9 @@
+import threading
 import numpy as np
-from typing import List, Tuple, Dict, Any
-import random
+from typing import List, Tuple, Dict, Any, Optional
+
+from gridworld import policy_action_indices
+from wind_field import WindField, compile_wind_field, transition_fingerprint
 
 
 class StochasticGridWorld:
@@ -12,8 +15,12 @@ class StochasticGridWorld:
     due to wind effects.
     """
     
+    deterministic = False
+    ACTIONS = ['N', 'S', 'E', 'W']
+    
     def __init__(self, N: int, rewards: List[List[float]], policy: List[List[str]], 
-                 start: Tuple[int, int], terminal: Tuple[int, int]):
+                 start: Tuple[int, int], terminal: Tuple[int, int],
+                 wind_field: Optional[WindField] = None, transition_cache=None, rng=None):
         """
         Initialize the StochasticGridWorld environment.
         
@@ -23,6 +30,11 @@ class StochasticGridWorld:
             policy: 2D list of actions for each cell ('N', 'S', 'E', 'W')
             start: Starting position (row, col)
             terminal: Terminal position (row, col)
+            wind_field: Optional per-region wind specification; defaults to the
+                uniform 0.9/0.1 success and 0.8/0.1/0.1 drift model
+            transition_cache: Optional TransitionCache used to load the compiled
+                transition model from disk instead of rebuilding it
+            rng: np.random.Generator or seed for the wind simulation
         """
         self.N = N
         self.rewards = rewards
@@ -37,8 +49,21 @@ class StochasticGridWorld:
         # Set initial position
         self.position = start
         
+        self.transition_cache = transition_cache
+        # (wind field, its version, terminal) and the model compiled for them
+        self._transitions = None
+        self._transitions_lock = threading.Lock()
+        self.rng = np.random.default_rng(rng)
+
         # Wind probabilities for each action
-        self.wind_probs = self._initialize_wind_probabilities()
+        if wind_field is None:
+            self.wind_field = WindField(N)
+            self.wind_probs = self._initialize_wind_probabilities()
+        else:
+            if wind_field.N != N:
+                raise ValueError(f"Wind field is {wind_field.N}x{wind_field.N}, but the grid is {N}x{N}")
+            self.wind_field = wind_field
+            self.wind_probs = wind_field.default_outcomes()
     
     def _initialize_wind_probabilities(self) -> Dict[str, List[Tuple[Tuple[int, int], float]]]:
         """
@@ -173,22 +198,56 @@ class StochasticGridWorld:
         
         return wind_probs
     
-    def get_wind_outcome(self, action: str) -> Tuple[int, int]:
+    @property
+    def transitions(self):
+        """
+        Compiled sparse transition model of the wind field.
+
+        Memoized on the instance and recompiled (through the content-hash
+        caches) only when the wind field, its version or the terminal changes.
+        The memo is filled under a lock, so concurrent first calls compile
+        and load the model once.
+        """
+        key = (self.wind_field, self.wind_field.version, self.terminal)
+        cached = self._transitions
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with self._transitions_lock:
+            cached = self._transitions
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            if self.transition_cache is None:
+                model = compile_wind_field(self.wind_field, self.terminal)
+            else:
+                model = self.transition_cache.get_or_compile(
+                    transition_fingerprint(self.wind_field, self.terminal),
+                    lambda: compile_wind_field(self.wind_field, self.terminal))
+            self._transitions = (key, model)
+        return model
+
+    def _wind_probs_at(self, position: Optional[Tuple[int, int]]) -> Dict[str, List[Tuple[Tuple[int, int], float]]]:
+        """Return the wind probability table in effect at a position."""
+        if position is None or not self.wind_field.regions:
+            return self.wind_probs
+        return self.wind_field.outcomes_at(*position)
+
+    def get_wind_outcome(self, action: str, position: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
         """
         Simulate wind effect for a given action.
         
         Args:
             action: Action to take ('N', 'S', 'E', 'W')
+            position: Cell the action is taken from, for spatially varying wind
             
         Returns:
             Tuple of (row_change, col_change) due to wind
         """
-        outcomes = self.wind_probs[action]
+        outcomes = self._wind_probs_at(position)[action]
         probabilities = [prob for _, prob in outcomes]
         changes = [change for change, _ in outcomes]
         
         # Choose outcome based on probabilities
-        chosen_idx = np.random.choice(len(outcomes), p=probabilities)
+        chosen_idx = self.rng.choice(len(outcomes), p=probabilities)
         return changes[chosen_idx]
     
     def move(self, direction: str, row: int, col: int) -> Tuple[int, int]:
@@ -204,7 +263,7 @@ class StochasticGridWorld:
             New position (row, col) after movement with wind effects
         """
         # Get wind effect
-        row_change, col_change = self.get_wind_outcome(direction)
+        row_change, col_change = self.get_wind_outcome(direction, (row, col))
         
         # Apply changes
         new_row = row + row_change
@@ -228,7 +287,7 @@ class StochasticGridWorld:
             List of (next_state, probability) tuples
         """
         row, col = state
-        outcomes = self.wind_probs[action]
+        outcomes = self._wind_probs_at(state)[action]
         transitions = []
         
         for (row_change, col_change), prob in outcomes:
@@ -244,6 +303,64 @@ class StochasticGridWorld:
         
         return transitions
     
+    def step(self, state: Tuple[int, int], move: str, 
+             rng: Optional[np.random.Generator] = None) -> Tuple[float, Tuple[int, int], bool]:
+        """
+        Sample the result of an action without touching the agent's position.
+        
+        Reads only the immutable compiled transition model (compiled once,
+        under the instance's lock, on first use), so one environment can serve concurrent rollouts
+        as long as each thread passes its own Generator and the wind field is
+        not edited meanwhile.
+        
+        Args:
+            state: Current position (row, col)
+            move: Action to take ('N', 'S', 'E', 'W')
+            rng: Random generator to sample the wind from; defaults to self.rng
+            
+        Returns:
+            Tuple of (reward, next_state, done)
+        """
+        rng = self.rng if rng is None else rng
+        model = self.transitions
+        s = state[0] * self.N + state[1]
+        a = self.ACTIONS.index(move)
+        
+        cumulative = np.cumsum(model.probs[s, a])
+        k = min(int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side='right')),
+                len(cumulative) - 1)
+        next_state = divmod(int(model.next_states[s, a, k]), self.N)
+        
+        reward = self.rewards[next_state[0]][next_state[1]]
+        return reward, next_state, next_state == self.terminal
+    
+    def step_many(self, states: np.ndarray, actions: np.ndarray, 
+                  rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized step for a batch of independent rollouts.
+        
+        Args:
+            states: Flat state indices (row * N + col)
+            actions: Action indices into ACTIONS (0=N, 1=S, 2=E, 3=W)
+            rng: Random generator to sample the wind from; defaults to self.rng
+            
+        Returns:
+            Tuple of (rewards, next_states, done) arrays
+        """
+        rng = self.rng if rng is None else rng
+        model = self.transitions
+        states = np.asarray(states)
+        actions = np.asarray(actions)
+        
+        cumulative = np.cumsum(model.probs[states, actions], axis=-1)
+        u = rng.random(states.shape)[..., np.newaxis] * cumulative[..., -1:]
+        k = np.minimum((cumulative <= u).sum(axis=-1), cumulative.shape[-1] - 1)
+        next_states = np.take_along_axis(model.next_states[states, actions], k[..., np.newaxis], axis=-1)[..., 0]
+        
+        rewards = np.asarray(self.rewards, dtype=float).ravel()[next_states]
+        done = next_states == self.terminal[0] * self.N + self.terminal[1]
+        return rewards, next_states, done
+    
     def action(self, move: str) -> Tuple[float, Tuple[int, int], bool]:
         """
         Execute an action and return the result with wind effects.
@@ -254,22 +371,50 @@ class StochasticGridWorld:
         Returns:
             Tuple of (reward, new_position, done)
         """
-        row, col = self.position
-        new_row, new_col = self.move(move, row, col)
-        
-        # Get reward for the new position
-        reward = self.rewards[new_row][new_col]
-        self.position = (new_row, new_col)
-        
-        done = self.position == self.terminal
+        reward, self.position, done = self.step(self.position, move)
         return reward, self.position, done
     
     def reset(self) -> None:
         """Reset the agent to the starting position."""
         self.position = self.start
     
+    def _get_stencil_backup(self):
+        """Return the (lazily built) stencil backup kernel for the wind model."""
+        if not self.wind_field.is_uniform():
+            raise ValueError("The stencil backend requires a uniform wind field; use backend='sparse'")
+        if getattr(self, '_stencil_backup', None) is None:
+            from wind_kernels import StencilBackup
+            self._stencil_backup = StencilBackup(self.rewards, self.wind_probs)
+        return self._stencil_backup
+
+    def _vector_backup(self, value: np.ndarray, gamma: float, backend: str,
+                       actions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Vectorized Bellman backup over the whole grid.
+
+        Returns an (N, N) array of policy values when actions (an (N, N) array
+        of action indices) is given, otherwise a (4, N, N) array of action values.
+        """
+        if backend == 'stencil':
+            q = self._get_stencil_backup().backup(value, gamma)
+            if actions is None:
+                return q
+            return np.take_along_axis(q, actions[np.newaxis], axis=0)[0]
+
+        model = self.transitions
+        rewards = np.asarray(self.rewards, dtype=float).ravel()
+        if actions is None:
+            q = model.action_values(value.ravel(), rewards, gamma)
+            return q.T.reshape(4, self.N, self.N)
+        return model.policy_values(value.ravel(), rewards, actions.ravel(), gamma).reshape(self.N, self.N)
+
+    def _policy_indices(self) -> np.ndarray:
+        """Return the policy as an (N, N) array of action indices (0=N, 1=S, 2=E, 3=W)."""
+        return policy_action_indices(self).reshape(self.N, self.N)
+
     def evaluate_policy(self, gamma: float = 1.0, threshold: float = 1e-4, 
-                       verbose: bool = True, visualize: bool = False) -> int:
+                       verbose: bool = True, visualize: bool = False,
+                       backend: str = 'loop') -> int:
         """
         Evaluate the current policy using iterative policy evaluation for stochastic environment.
         
@@ -278,10 +423,16 @@ class StochasticGridWorld:
             threshold: Convergence threshold
             verbose: Whether to print iteration details
             visualize: Whether to show value matrix visualization each iteration
+            backend: 'loop' for the per-cell sweep, 'stencil' for the vectorized
+                convolution backup from wind_kernels (uniform wind only), or
+                'sparse' for the compiled transition model of the wind field
             
         Returns:
             Number of iterations until convergence
         """
+        if backend not in ('loop', 'stencil', 'sparse'):
+            raise ValueError(f"Unknown backend: {backend}")
+
         # Import visualization function if needed
         if visualize:
             try:
@@ -291,32 +442,43 @@ class StochasticGridWorld:
                 visualize = False
         
         iteration = 0
+        if backend != 'loop':
+            action_idx = self._policy_indices()
+            terminal_reward = self.rewards[self.terminal[0]][self.terminal[1]]
+            value = np.array(self.value, dtype=float)
         
         while True:
-            delta = 0.0
-            new_value = [[0.0 for _ in range(self.N)] for _ in range(self.N)]
-            new_value[self.terminal[0]][self.terminal[1]] = self.rewards[self.terminal[0]][self.terminal[1]]
+            if backend != 'loop':
+                new = self._vector_backup(value, gamma, backend, action_idx)
+                new[self.terminal] = terminal_reward
+                delta = float(np.max(np.abs(new - value)))
+                value = new
+                self.value = new.tolist()
+            else:
+                delta = 0.0
+                new_value = [[0.0 for _ in range(self.N)] for _ in range(self.N)]
+                new_value[self.terminal[0]][self.terminal[1]] = self.rewards[self.terminal[0]][self.terminal[1]]
 
-            # Update value function for all states
-            for row in range(self.N):
-                for col in range(self.N):
-                    if (row, col) == self.terminal:
-                        continue
+                # Update value function for all states
+                for row in range(self.N):
+                    for col in range(self.N):
+                        if (row, col) == self.terminal:
+                            continue
 
-                    action = self.policy[row][col]
-                    
-                    # Calculate expected value over all possible outcomes
-                    expected_value = 0.0
-                    transitions = self.get_transition_probabilities((row, col), action)
-                    
-                    for (next_row, next_col), prob in transitions:
-                        reward = self.rewards[next_row][next_col]
-                        expected_value += prob * (reward + gamma * self.value[next_row][next_col])
-                    
-                    new_value[row][col] = expected_value
-                    delta = max(delta, abs(self.value[row][col] - expected_value))
+                        action = self.policy[row][col]
+                        
+                        # Calculate expected value over all possible outcomes
+                        expected_value = 0.0
+                        transitions = self.get_transition_probabilities((row, col), action)
+                        
+                        for (next_row, next_col), prob in transitions:
+                            reward = self.rewards[next_row][next_col]
+                            expected_value += prob * (reward + gamma * self.value[next_row][next_col])
+                        
+                        new_value[row][col] = expected_value
+                        delta = max(delta, abs(self.value[row][col] - expected_value))
 
-            self.value = new_value
+                self.value = new_value
             iteration += 1
 
             if verbose:
@@ -334,47 +496,69 @@ class StochasticGridWorld:
         
         return iteration
     
-    def calculate_new_policy(self, gamma=1.0, threshold=1e-4, verbose=True):
+    def calculate_new_policy(self, gamma=1.0, threshold=1e-4, verbose=True, backend='loop'):
         """
         Calculate optimal policy using policy iteration for stochastic environment.
+
+        The 'stencil' backend computes all action values with the convolution
+        kernel from wind_kernels and 'sparse' with the compiled transition model;
+        ties are broken in N, S, E, W order like the loop.
         """
+        if backend not in ('loop', 'stencil', 'sparse'):
+            raise ValueError(f"Unknown backend: {backend}")
+
         actions = ['N', 'S', 'E', 'W']
         new_policy = [[None for _ in range(self.N)] for _ in range(self.N)]
         iteration = 0
+        if backend != 'loop':
+            terminal_reward = self.rewards[self.terminal[0]][self.terminal[1]]
+            value = np.array(self.value, dtype=float)
 
         while True:
-            delta = 0
-            new_value = [[0 for _ in range(self.N)] for _ in range(self.N)]
-            new_value[self.terminal[0]][self.terminal[1]] = self.rewards[self.terminal[0]][self.terminal[1]]
+            if backend != 'loop':
+                q = self._vector_backup(value, gamma, backend)
+                best = np.argmax(q, axis=0)
+                new = np.max(q, axis=0)
+                new[self.terminal] = terminal_reward
+                delta = float(np.max(np.abs(new - value)))
+                value = new
+                self.value = new.tolist()
+                new_policy = [[actions[a] for a in row] for row in best]
+                new_policy[self.terminal[0]][self.terminal[1]] = None
+                self.policy = new_policy
+            else:
+                delta = 0
+                new_value = [[0 for _ in range(self.N)] for _ in range(self.N)]
+                new_value[self.terminal[0]][self.terminal[1]] = self.rewards[self.terminal[0]][self.terminal[1]]
 
-            for row in range(self.N):
-                for col in range(self.N):
-                    if (row, col) == self.terminal:
-                        continue
+                for row in range(self.N):
+                    for col in range(self.N):
+                        if (row, col) == self.terminal:
+                            continue
 
-                    best_value = float('-inf')
-                    best_action = None
+                        best_value = float('-inf')
+                        best_action = None
 
-                    # Try all actions
-                    for action in actions:
-                        # Calculate expected value for this action
-                        expected_value = 0.0
-                        transitions = self.get_transition_probabilities((row, col), action)
-                        
-                        for (next_row, next_col), prob in transitions:
-                            reward = self.rewards[next_row][next_col]
-                            expected_value += prob * (reward + gamma * self.value[next_row][next_col])
-                        
-                        if expected_value > best_value:
-                            best_value = expected_value
-                            best_action = action
+                        # Try all actions
+                        for action in actions:
+                            # Calculate expected value for this action
+                            expected_value = 0.0
+                            transitions = self.get_transition_probabilities((row, col), action)
+                            
+                            for (next_row, next_col), prob in transitions:
+                                reward = self.rewards[next_row][next_col]
+                                expected_value += prob * (reward + gamma * self.value[next_row][next_col])
+                            
+                            if expected_value > best_value:
+                                best_value = expected_value
+                                best_action = action
 
-                    new_value[row][col] = best_value
-                    new_policy[row][col] = best_action
-                    delta = max(delta, abs(self.value[row][col] - best_value))
+                        new_value[row][col] = best_value
+                        new_policy[row][col] = best_action
+                        delta = max(delta, abs(self.value[row][col] - best_value))
 
-            self.value = new_value
-            self.policy = new_policy
+                self.value = new_value
+                self.policy = new_policy
             iteration += 1
 
             if verbose:
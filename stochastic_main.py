@@ -8,6 +8,8 @@ grid world environment where actions have probabilistic outcomes.
 
 from stochastic_examples import create_stochastic_gridworld
 from agent import follow_policy, analyze_policy_performance
+from chain_analysis import start_state_statistics
+from return_distribution import CategoricalReturnEvaluator
 from visualization import (
     print_value_matrix, plot_value_matrix, animate_agent_path, 
     visualize_path, show_both_visualizations
@@ -38,17 +40,29 @@ def main(gw=None, policy_name="Current"):
     print(f"Total reward: {performance['total_reward']:.2f}")
     print(f"Efficiency: {performance['efficiency']:.2f} reward/step")
     
-    # Follow policy step by step
+    exact = start_state_statistics(gw)
+    print(f"Expected path length (exact): {exact['expected_path_length']:.2f} "
+          f"± {exact['path_length_std']:.2f} steps")
+    print(f"Expected total reward (exact): {exact['expected_total_reward']:.2f}")
+    
+    returns = CategoricalReturnEvaluator(gw)
+    returns.evaluate()
+    quantiles = returns.quantiles((0.05, 0.5, 0.95))
+    row, col = gw.start
+    print(f"Total reward quantiles (P5/P50/P95): {quantiles[0.05][row, col]:.0f} / "
+          f"{quantiles[0.5][row, col]:.0f} / {quantiles[0.95][row, col]:.0f}")
+    
+    # Follow policy step by step, on the same episode that was analyzed
     print(f"\n👟 Following {policy_name.lower()} policy step by step...")
-    follow_policy(gw, verbose=True)
+    follow_policy(gw, verbose=True, performance=performance)
     
     # Visualize the path
     print(f"\n🗺️  Visualizing {policy_name.lower()} policy path...")
-    visualize_path(gw)
+    visualize_path(gw, path=performance['path'])
     
     # Show both visualizations side by side
     print(f"\n📊🎬 Showing both value matrix and {policy_name.lower()} policy path animation...")
-    show_both_visualizations(gw)
+    show_both_visualizations(gw, path=performance['path'])
     
     print(f"\n✅ {policy_name} policy demo completed!")
     return gw
@@ -137,10 +151,16 @@ def compare_deterministic_vs_stochastic():
     
     stoch_gw = create_stochastic_gridworld()
     stoch_gw.evaluate_policy(verbose=False)
-    stoch_performance = analyze_policy_performance(stoch_gw)
-    
-    print(f"Stochastic - Path length: {stoch_performance['path_length']} steps")
-    print(f"Stochastic - Total reward: {stoch_performance['total_reward']:.2f}")
+    exact = start_state_statistics(stoch_gw)
+    stoch_performance = {
+        'path_length': exact['expected_path_length'],
+        'total_reward': exact['expected_total_reward'],
+        'efficiency': exact['efficiency'],
+    }
+    
+    print(f"Stochastic - Expected path length: {stoch_performance['path_length']:.2f} "
+          f"± {exact['path_length_std']:.2f} steps")
+    print(f"Stochastic - Expected total reward: {stoch_performance['total_reward']:.2f}")
     print(f"Stochastic - Efficiency: {stoch_performance['efficiency']:.2f} reward/step")
     
     # Comparison
@@ -152,7 +172,7 @@ def compare_deterministic_vs_stochastic():
     reward_diff = stoch_performance['total_reward'] - det_performance['total_reward']
     efficiency_diff = stoch_performance['efficiency'] - det_performance['efficiency']
     
-    print(f"Path length difference: {path_diff:+d} steps")
+    print(f"Path length difference: {path_diff:+.2f} steps")
     print(f"Total reward difference: {reward_diff:+.2f}")
     print(f"Efficiency difference: {efficiency_diff:+.2f} reward/step")
     
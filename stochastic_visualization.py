@@ -6,48 +6,47 @@ Visualization functions for Stochastic GridWorld with windy conditions.
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from typing import List, Tuple
-import random
-import numpy as np
 
+from chain_analysis import (
+    start_state_statistics, propagate_occupancy, path_length_quantiles, default_horizon
+)
 
-def visualize_wind_effects(stochastic_gw, num_simulations=100):
+
+def visualize_wind_effects(stochastic_gw, horizon=None):
     """
-    Visualize wind effects by showing multiple paths from the same starting point.
+    Visualize wind effects with the exact distribution of where the agent goes.
+    
+    The start state is propagated through the policy-induced Markov chain, so
+    the heatmap shows expected visits per cell and the bar chart the exact
+    probability of reaching the goal at each step (no sampled paths).
     
     Args:
         stochastic_gw: StochasticGridWorld instance
-        num_simulations: Number of paths to simulate
+        horizon: Number of steps to propagate; defaults to the expected path
+            length plus six standard deviations
     """
     print("🌪️ Visualizing Wind Effects")
     print("=" * 40)
     
-    # Simulate multiple paths from start to goal
-    all_paths = []
-    
-    for i in range(num_simulations):
-        stochastic_gw.reset()
-        path = [stochastic_gw.position]
-        
-        while True:
-            row, col = stochastic_gw.position
-            move = stochastic_gw.policy[row][col]
-            _, state, done = stochastic_gw.action(move)
-            path.append(state)
-            
-            if done:
-                break
-        
-        all_paths.append(path)
+    if horizon is None:
+        horizon = default_horizon(stochastic_gw)
+    occupancy = propagate_occupancy(stochastic_gw, horizon, store_steps=False)
+    stats = start_state_statistics(stochastic_gw)
+    quantiles = path_length_quantiles(occupancy['absorbed'])
     
     # Create visualization
-    fig, ax = plt.subplots(figsize=(10, 8))
+    fig, (ax, ax_steps) = plt.subplots(1, 2, figsize=(16, 7))
+    
+    # Left: expected visits per cell
+    im = ax.imshow(occupancy['visits'], cmap='viridis', aspect='equal')
+    cbar = plt.colorbar(im, ax=ax)
+    cbar.set_label("Expected visits", fontsize=12)
     
     # Draw grid
     ax.set_xticks(range(stochastic_gw.N))
     ax.set_yticks(range(stochastic_gw.N))
     ax.set_xlim(-0.5, stochastic_gw.N - 0.5)
     ax.set_ylim(stochastic_gw.N - 0.5, -0.5)
-    ax.grid(True, alpha=0.3)
     
     # Draw start and goal
     ax.text(stochastic_gw.start[1], stochastic_gw.start[0], 'S', 
@@ -57,25 +56,22 @@ def visualize_wind_effects(stochastic_gw, num_simulations=100):
             ha='center', va='center', fontsize=16, color='blue', 
             fontweight='bold', bbox=dict(boxstyle="circle,pad=0.3", facecolor='lightblue'))
     
-    # Draw all paths with different colors and transparency
-    colors = plt.cm.viridis(np.linspace(0, 1, len(all_paths)))
-    
-    for i, path in enumerate(all_paths):
-        path_x = [pos[1] for pos in path]
-        path_y = [pos[0] for pos in path]
-        ax.plot(path_x, path_y, color=colors[i], alpha=0.3, linewidth=1)
-    
-    # Calculate and display statistics
-    path_lengths = [len(path) - 1 for path in all_paths]
-    avg_length = sum(path_lengths) / len(path_lengths)
-    min_length = min(path_lengths)
-    max_length = max(path_lengths)
-    
     ax.set_title(f"Wind Effects on Agent Paths\n"
-                f"Average Path Length: {avg_length:.1f} steps\n"
-                f"Range: {min_length}-{max_length} steps", 
+                f"Expected Path Length: {stats['expected_path_length']:.1f} "
+                f"± {stats['path_length_std']:.1f} steps\n"
+                f"90% of episodes: {quantiles[0.05]:.0f}-{quantiles[0.95]:.0f} steps", 
                 fontsize=14, fontweight='bold')
     
+    # Right: probability of reaching the goal at each step
+    ax_steps.bar(range(len(occupancy['absorbed'])), occupancy['absorbed'], 
+                 color='skyblue', edgecolor='navy')
+    ax_steps.set_xlabel("Step", fontsize=12)
+    ax_steps.set_ylabel("P(reach goal at step)", fontsize=12)
+    ax_steps.set_title(f"Path Length Distribution\n"
+                       f"Not reached after {horizon} steps: {occupancy['remaining']:.2e}",
+                       fontsize=14, fontweight='bold')
+    ax_steps.grid(True, alpha=0.3)
+    
     plt.tight_layout()
     plt.show()
 
@@ -108,7 +104,8 @@ def compare_deterministic_vs_stochastic_visualization():
         return path
     
     det_path = get_path(det_gw)
-    stoch_path = get_path(stoch_gw)
+    stoch_stats = start_state_statistics(stoch_gw)
+    stoch_visits = propagate_occupancy(stoch_gw, default_horizon(stoch_gw), store_steps=False)['visits']
     
     # Create side-by-side visualization
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
@@ -136,7 +133,10 @@ def compare_deterministic_vs_stochastic_visualization():
     ax1.set_title(f"Deterministic Environment\nPath Length: {len(det_path)-1} steps", 
                   fontsize=14, fontweight='bold')
     
-    # Right: Stochastic
+    # Right: Stochastic (expected visits per cell instead of one sampled path)
+    im2 = ax2.imshow(stoch_visits, cmap='viridis', aspect='equal')
+    cbar2 = plt.colorbar(im2, ax=ax2)
+    cbar2.set_label("Expected visits", fontsize=12)
     ax2.set_xticks(range(stoch_gw.N))
     ax2.set_yticks(range(stoch_gw.N))
     ax2.set_xlim(-0.5, stoch_gw.N - 0.5)
@@ -151,12 +151,8 @@ def compare_deterministic_vs_stochastic_visualization():
              ha='center', va='center', fontsize=16, color='blue', 
              fontweight='bold', bbox=dict(boxstyle="circle,pad=0.3", facecolor='lightblue'))
     
-    # Draw stochastic path
-    stoch_x = [pos[1] for pos in stoch_path]
-    stoch_y = [pos[0] for pos in stoch_path]
-    ax2.plot(stoch_x, stoch_y, 'b-', linewidth=3, markersize=8, marker='o')
-    
-    ax2.set_title(f"Stochastic Environment (Windy)\nPath Length: {len(stoch_path)-1} steps", 
+    ax2.set_title(f"Stochastic Environment (Windy)\n"
+                  f"Expected Path Length: {stoch_stats['expected_path_length']:.1f} steps", 
                   fontsize=14, fontweight='bold')
     
     plt.tight_layout()
@@ -0,0 +1,191 @@
+"""
+Dense tabular action-value storage shared by the tabular learners.
+
+Q is a preallocated (S, A) float array indexed by flat state (row * n + col)
+and integer action, instead of a dict of per-state dicts keyed by tuples and
+action strings. Greedy selection breaks ties uniformly at random, and policy
+and value extraction are vectorized over all states.
+"""
+
+import numpy as np
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+ACTIONS = ['N', 'S', 'E', 'W']
+
+# Uniform draws are taken from the generator in blocks; per-call Generator
+# methods dominate the cost of scalar action selection
+RANDOM_BLOCK = 4096
+
+
+def tabulate_step(step: Callable, n: int, actions: Sequence[str] = ACTIONS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Tabulate a deterministic step(state, action) -> (next_state, reward, done) function.
+
+    Args:
+        step: Environment step over (row, col) tuples and action strings
+        n: Size of the grid (n x n)
+        actions: Action strings, in index order
+
+    Returns:
+        Tuple of (next_states, rewards, done) arrays of shape (S, A)
+    """
+    S, A = n * n, len(actions)
+    next_states = np.empty((S, A), dtype=np.intp)
+    rewards = np.empty((S, A))
+    done = np.empty((S, A), dtype=bool)
+    for s in range(S):
+        state = divmod(s, n)
+        for a, action in enumerate(actions):
+            (r, c), reward, finished = step(state, action)
+            next_states[s, a] = r * n + c
+            rewards[s, a] = reward
+            done[s, a] = finished
+    return next_states, rewards, done
+
+
+class QTable:
+    """
+    Preallocated (S, A) action-value table with vectorized action selection.
+    """
+
+    def __init__(self, n: int, actions: Sequence[str] = ACTIONS, rng=None):
+        """
+        Initialize the QTable.
+
+        Args:
+            n: Size of the grid (n x n)
+            actions: Action strings, in index order
+            rng: Seed or np.random.Generator used for exploration and tie-breaking
+        """
+        self.n = n
+        self.actions = list(actions)
+        self.n_states = n * n
+        self.n_actions = len(self.actions)
+        self.rng = np.random.default_rng(rng)
+
+        self.values = np.zeros((self.n_states, self.n_actions))
+        # States the learner has seen; the others are reported as unknown
+        self.visited = np.zeros(self.n_states, dtype=bool)
+
+        self._uniforms = []
+        self._cursor = 0
+
+    def reseed(self, rng) -> None:
+        """Replace the random generator and drop any buffered draws."""
+        self.rng = np.random.default_rng(rng)
+        self._uniforms = []
+        self._cursor = 0
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Return the arrays needed to checkpoint the table.
+
+        Together with the generator state they fix all future behaviour:
+        the buffered uniform draws not yet consumed are included.
+        """
+        return {
+            'q_values': self.values,
+            'q_visited': self.visited,
+            'q_uniforms': np.asarray(self._uniforms[self._cursor:], dtype=float),
+        }
+
+    def load_state_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore the table from arrays saved by state_arrays (the generator is restored separately)."""
+        self.values[:] = arrays['q_values']
+        self.visited[:] = arrays['q_visited']
+        self._uniforms = arrays['q_uniforms'].tolist()
+        self._cursor = 0
+
+    def index(self, state: Tuple[int, int]) -> int:
+        """Return the flat index of a (row, col) state."""
+        return state[0] * self.n + state[1]
+
+    def uniform(self) -> float:
+        """Return one uniform [0, 1) draw from the buffered block."""
+        if self._cursor == len(self._uniforms):
+            self._uniforms = self.rng.random(RANDOM_BLOCK).tolist()
+            self._cursor = 0
+        u = self._uniforms[self._cursor]
+        self._cursor += 1
+        return u
+
+    def greedy(self, s: int) -> int:
+        """Return a greedy action index for state s, breaking ties at random."""
+        q = self.values[s].tolist()
+        best = max(q)
+        if q.count(best) == 1:
+            return q.index(best)
+        ties = [a for a, v in enumerate(q) if v == best]
+        return ties[int(self.uniform() * len(ties))]
+
+    def epsilon_greedy(self, s: int, epsilon: float) -> int:
+        """Return an epsilon-greedy action index for state s."""
+        if self.uniform() < epsilon:
+            return int(self.uniform() * self.n_actions)
+        return self.greedy(s)
+
+    def max_value(self, s: int) -> float:
+        """Return max_a Q(s, a) for a single state."""
+        return max(self.values[s].tolist())
+
+    def greedy_many(self, states: np.ndarray) -> np.ndarray:
+        """Vectorized greedy selection with random tie-breaking."""
+        q = self.values[states]
+        ties = q == q.max(axis=-1, keepdims=True)
+        # Each tied action gets a random key; non-maximal actions never win
+        keys = np.where(ties, self.rng.random(q.shape), -1.0)
+        return keys.argmax(axis=-1)
+
+    def epsilon_greedy_many(self, states: np.ndarray, epsilon: float) -> np.ndarray:
+        """Vectorized epsilon-greedy selection."""
+        states = np.asarray(states)
+        actions = self.greedy_many(states)
+        explore = self.rng.random(states.shape) < epsilon
+        actions[explore] = self.rng.integers(self.n_actions, size=int(explore.sum()))
+        return actions
+
+    def action_probabilities(self, states: np.ndarray, epsilon) -> np.ndarray:
+        """
+        Return the epsilon-greedy action probabilities of the given states.
+
+        Tied greedy actions share the greedy mass, matching the random
+        tie-breaking of greedy and greedy_many.
+
+        Args:
+            states: Flat state indices
+            epsilon: Exploration rate, scalar or one per state
+
+        Returns:
+            Array of shape states.shape + (A,)
+        """
+        q = self.values[states]
+        ties = q == q.max(axis=-1, keepdims=True)
+        epsilon = np.asarray(epsilon, dtype=float)[..., np.newaxis]
+        return epsilon / self.n_actions + (1 - epsilon) * ties / ties.sum(axis=-1, keepdims=True)
+
+    def state_values(self) -> np.ndarray:
+        """Return max_a Q(s, a) for every state as a flat array."""
+        return self.values.max(axis=1)
+
+    def extract_policy(self) -> Dict[Tuple[int, int], str]:
+        """
+        Return the greedy action of every visited state.
+
+        Returns:
+            Dictionary mapping (row, col) to an action string
+        """
+        states = np.flatnonzero(self.visited)
+        best = self.values[states].argmax(axis=1)
+        rows, cols = np.divmod(states, self.n)
+        return {(int(r), int(c)): self.actions[a] for r, c, a in zip(rows, cols, best)}
+
+    def extract_values(self, terminal: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Return the (n, n) greedy state values.
+
+        Unvisited states are nan and the terminal, if given, is 0.
+        """
+        V = np.where(self.visited, self.state_values(), np.nan)
+        if terminal is not None:
+            V[self.index(terminal)] = 0.0
+        return V.reshape(self.n, self.n)
@@ -0,0 +1,162 @@
+"""
+On-disk cache of compiled transition models.
+
+Each entry is a directory named by the SHA-256 of an environment fingerprint
+(grid shape, wind parameters, boundary mode and terminal) holding the raw
+next_states.npy and probs.npy arrays. Entries are written to a temporary
+directory and renamed into place, so readers never see a partial entry, and
+are reloaded with np.load(mmap_mode='r'), so a warm start only maps the files.
+The directory is kept under a byte budget by evicting least-recently-used
+entries (recency is the entry's modification time, refreshed on every hit).
+The open memory maps are kept in a small in-process LRU of their own.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from transition_model import TransitionModel
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'gridworld', 'transitions')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Memory-mapped models kept open per cache
+DEFAULT_MAX_LOADED = 16
+
+_ARRAYS = ('next_states', 'probs')
+
+
+class TransitionCache:
+    """
+    Size-bounded LRU directory of compiled TransitionModels.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_loaded: int = DEFAULT_MAX_LOADED):
+        """
+        Initialize the TransitionCache.
+
+        Args:
+            directory: Cache directory; defaults to $GRIDWORLD_CACHE_DIR or
+                ~/.cache/gridworld/transitions
+            max_bytes: Upper bound on the total size of cached entries
+            max_loaded: Number of memory-mapped models kept open; the least
+                recently used map is dropped beyond it
+        """
+        self.directory = directory or os.environ.get('GRIDWORLD_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.max_loaded = max_loaded
+        self._loaded: 'OrderedDict[str, TransitionModel]' = OrderedDict()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(fingerprint: Dict[str, Any]) -> str:
+        """Return the cache key of an environment fingerprint."""
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str) -> Optional[TransitionModel]:
+        """
+        Memory-map a cached model, or return None on a miss.
+        """
+        if key in self._loaded:
+            self._loaded.move_to_end(key)
+            return self._loaded[key]
+
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') for name in _ARRAYS}
+            os.utime(entry)
+        except (OSError, ValueError):
+            # Missing, or evicted by another process while we were reading
+            return None
+
+        terminal = tuple(meta['terminal']) if meta['terminal'] is not None else None
+        model = TransitionModel(meta['N'], arrays['next_states'], arrays['probs'], terminal)
+        self._loaded[key] = model
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+        return model
+
+    def store(self, key: str, model: TransitionModel) -> None:
+        """
+        Atomically write a model into the cache, then evict old entries.
+        """
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        try:
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(getattr(model, name)))
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump({'N': model.N, 'terminal': list(model.terminal) if model.terminal else None}, f)
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(self._entry(key)):
+                raise
+        self.evict(keep=key)
+
+    def get_or_compile(self, fingerprint: Dict[str, Any], compile_fn: Callable[[], TransitionModel]) -> TransitionModel:
+        """
+        Return the cached model for a fingerprint, compiling and storing it on a miss.
+        """
+        key = self.key(fingerprint)
+        model = self.load(key)
+        if model is None:
+            self.store(key, compile_fn())
+            model = self.load(key)
+        return model
+
+    def _entry_sizes(self) -> Dict[str, int]:
+        sizes = {}
+        for name in os.listdir(self.directory):
+            entry = self._entry(name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                sizes[name] = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            except OSError:
+                continue
+        return sizes
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Remove least-recently-used entries until the cache fits in max_bytes.
+
+        Args:
+            keep: Key that must not be evicted (the entry just stored)
+        """
+        sizes = self._entry_sizes()
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(name):
+            try:
+                return os.path.getmtime(self._entry(name))
+            except OSError:
+                return 0.0
+
+        for name in sorted(sizes, key=last_used):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(self._entry(name), ignore_errors=True)
+            self._loaded.pop(name, None)
+            total -= sizes[name]
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        for name in self._entry_sizes():
+            shutil.rmtree(self._entry(name), ignore_errors=True)
+        self._loaded.clear()
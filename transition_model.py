@@ -0,0 +1,138 @@
+"""
+Compiled sparse transition structure for windy grid worlds.
+
+A TransitionModel stores, for every state s and action a, the K possible
+successor states and their probabilities as two dense (S, A, K) arrays
+(an ELL-style sparse layout: every row has the same small number of entries,
+padded with zero-probability self-loops). States are flat indices row * N + col
+and actions are indexed like ACTIONS.
+"""
+
+import numpy as np
+from typing import Dict, List, Tuple, Optional
+
+
+ACTIONS = ['N', 'S', 'E', 'W']
+
+
+class TransitionModel:
+    """
+    Immutable, array-backed transition model P(s' | s, a).
+    """
+
+    def __init__(self, N: int, next_states: np.ndarray, probs: np.ndarray,
+                 terminal: Optional[Tuple[int, int]] = None):
+        """
+        Initialize the TransitionModel.
+
+        Args:
+            N: Size of the grid (N x N)
+            next_states: (S, A, K) integer array of successor flat indices
+            probs: (S, A, K) float array of successor probabilities
+            terminal: Terminal position (row, col); its rows are absorbing
+        """
+        self.N = N
+        self.next_states = next_states
+        self.probs = probs
+        self.terminal = terminal
+
+    @property
+    def n_states(self) -> int:
+        return self.next_states.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.next_states.nbytes + self.probs.nbytes
+
+    def action_values(self, value: np.ndarray, rewards: np.ndarray, gamma: float = 1.0) -> np.ndarray:
+        """
+        Compute E[r + gamma * V(s')] for every state and action.
+
+        Args:
+            value: Flat value function of length S
+            rewards: Flat rewards of length S (reward for entering a cell)
+            gamma: Discount factor
+
+        Returns:
+            Array of shape (S, A)
+        """
+        target = rewards + gamma * value
+        return np.einsum('sak,sak->sa', self.probs, target[self.next_states])
+
+    def policy_values(self, value: np.ndarray, rewards: np.ndarray, actions: np.ndarray,
+                      gamma: float = 1.0) -> np.ndarray:
+        """
+        Compute E[r + gamma * V(s')] for every state under a fixed policy.
+
+        Args:
+            value: Flat value function of length S
+            rewards: Flat rewards of length S
+            actions: Flat array of action indices of length S
+            gamma: Discount factor
+
+        Returns:
+            Array of shape (S,)
+        """
+        rows = np.arange(self.n_states)
+        target = rewards + gamma * value
+        next_states = self.next_states[rows, actions]
+        return np.einsum('sk,sk->s', self.probs[rows, actions], target[next_states])
+
+    def outcomes(self, state: Tuple[int, int], action: str) -> List[Tuple[Tuple[int, int], float]]:
+        """
+        Return the non-zero (next_state, probability) pairs for a state-action pair.
+        """
+        s = state[0] * self.N + state[1]
+        a = ACTIONS.index(action)
+        return [((int(n) // self.N, int(n) % self.N), float(p))
+                for n, p in zip(self.next_states[s, a], self.probs[s, a]) if p > 0.0]
+
+
+def compile_rows(N: int, rows: np.ndarray, cols: np.ndarray,
+                 wind_probs: Dict[str, List[Tuple[Tuple[int, int], float]]],
+                 width: int, boundary: str = 'clip') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compile the transition rows of a set of cells sharing one wind table.
+
+    With boundary='clip', offsets that leave the grid are clipped to the
+    boundary, matching StochasticGridWorld.move. With boundary='stay', the
+    agent stays in place instead, matching the new-stochastic solvers.
+
+    Args:
+        N: Size of the grid
+        rows: Row coordinates of the cells
+        cols: Column coordinates of the cells
+        wind_probs: Mapping of action to list of ((row_change, col_change), probability)
+        width: Number of outcome slots K per row (extra slots are zero-probability self-loops)
+        boundary: 'clip' or 'stay'
+
+    Returns:
+        Tuple of (next_states, probs) with shapes (len(rows), A, K)
+    """
+    if boundary not in ('clip', 'stay'):
+        raise ValueError(f"Unknown boundary mode: {boundary}")
+
+    own = rows * N + cols
+    next_states = np.repeat(own[:, np.newaxis, np.newaxis], len(ACTIONS), axis=1)
+    next_states = np.repeat(next_states, width, axis=2).astype(np.int32)
+    probs = np.zeros((len(rows), len(ACTIONS), width))
+
+    for a, action in enumerate(ACTIONS):
+        for k, ((row_change, col_change), prob) in enumerate(wind_probs[action]):
+            new_rows = rows + row_change
+            new_cols = cols + col_change
+            if boundary == 'clip':
+                next_states[:, a, k] = np.clip(new_rows, 0, N - 1) * N + np.clip(new_cols, 0, N - 1)
+            else:
+                inside = (new_rows >= 0) & (new_rows < N) & (new_cols >= 0) & (new_cols < N)
+                next_states[:, a, k] = np.where(inside, new_rows * N + new_cols, own)
+            probs[:, a, k] = prob
+
+    return next_states, probs
+
+
+def make_absorbing(next_states: np.ndarray, probs: np.ndarray, state: int) -> None:
+    """Turn a state's rows into a probability-one self-loop, in place."""
+    next_states[state] = state
+    probs[state] = 0.0
+    probs[state, :, 0] = 1.0
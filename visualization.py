@@ -1,27 +1,39 @@
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from typing import List, Tuple
+import numpy as np
+from typing import List, Tuple, Optional, Union
 
+from agent import rollout
 
-def visualize_path(grid_world) -> None:
+# A path is either a list of (row, col) tuples or an int32 array of flat
+# state indices (row * N + col), as recorded by agent.PathBuffer
+Path = Union[List[Tuple[int, int]], np.ndarray]
+
+
+def _path_coordinates(grid_world, path: Optional[Path]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the rows and columns of a path, rolling out the policy if none is given.
+    """
+    if path is None:
+        path = rollout(grid_world, compact=True)['path']
+    if isinstance(path, np.ndarray):
+        return np.divmod(path, grid_world.N)
+    coords = np.asarray(path, dtype=int).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+
+def visualize_path(grid_world, path: Optional[Path] = None) -> None:
     """
     Visualize the agent's path through the grid world.
     
     Args:
         grid_world: GridWorld instance
+        path: Optional precomputed path (list of positions or compact array of
+            flat indices); by default the policy is rolled out
     """
-    grid_world.reset()
-    visited = [[False for _ in range(grid_world.N)] for _ in range(grid_world.N)]
-    visited[grid_world.position[0]][grid_world.position[1]] = True
-
-    # Follow policy and mark visited cells
-    while True:
-        row, col = grid_world.position
-        move = grid_world.policy[row][col]
-        _, state, done = grid_world.action(move)
-        visited[state[0]][state[1]] = True
-        if done:
-            break
+    rows, cols = _path_coordinates(grid_world, path)
+    visited = np.zeros((grid_world.N, grid_world.N), dtype=bool)
+    visited[rows, cols] = True
 
     # Create path grid representation
     path_grid = [['.' for _ in range(grid_world.N)] for _ in range(grid_world.N)]
@@ -39,24 +51,16 @@ def visualize_path(grid_world) -> None:
         print(' '.join(row))
 
 
-def animate_agent_path(grid_world) -> None:
+def animate_agent_path(grid_world, path: Optional[Path] = None) -> None:
     """
     Create an animated visualization of the agent's path.
     
     Args:
         grid_world: GridWorld instance
+        path: Optional precomputed path (list of positions or compact array of
+            flat indices); by default the policy is rolled out
     """
-    grid_world.reset()
-    path = [grid_world.position]
-
-    # Follow policy and collect path
-    while True:
-        row, col = grid_world.position
-        move = grid_world.policy[row][col]
-        _, state, done = grid_world.action(move)
-        path.append(state)
-        if done:
-            break
+    rows, cols = _path_coordinates(grid_world, path)
 
     # Setup the plot
     fig, ax = plt.subplots(figsize=(8, 8))
@@ -82,12 +86,11 @@ def animate_agent_path(grid_world) -> None:
 
     def update(frame):
         """Update function for animation."""
-        row, col = path[frame]
-        agent_marker.set_data(col, row)
+        agent_marker.set_data([cols[frame]], [rows[frame]])
         return agent_marker,
 
     # Create and show animation
-    ani = animation.FuncAnimation(fig, update, frames=len(path), 
+    ani = animation.FuncAnimation(fig, update, frames=len(rows), 
                                  interval=800, repeat=False, blit=True)
     plt.title("Agent Path Animation", fontsize=14, fontweight='bold')
     plt.tight_layout()
@@ -140,12 +143,14 @@ def print_value_matrix(grid_world) -> None:
         print(['{:.2f}'.format(v) for v in row])
 
 
-def show_both_visualizations(grid_world) -> None:
+def show_both_visualizations(grid_world, path: Optional[Path] = None) -> None:
     """
     Show both value matrix heatmap and agent path animation side by side.
     
     Args:
         grid_world: GridWorld instance
+        path: Optional precomputed path (list of positions or compact array of
+            flat indices); by default the policy is rolled out
     """
     # Create figure with two subplots side by side
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
@@ -170,17 +175,7 @@ def show_both_visualizations(grid_world) -> None:
     cbar1.set_label("Value", fontsize=12)
     
     # Right subplot: Agent path animation
-    grid_world.reset()
-    path = [grid_world.position]
-    
-    # Follow policy and collect path
-    while True:
-        row, col = grid_world.position
-        move = grid_world.policy[row][col]
-        _, state, done = grid_world.action(move)
-        path.append(state)
-        if done:
-            break
+    rows, cols = _path_coordinates(grid_world, path)
     
     # Setup animation subplot
     ax2.set_xticks(range(grid_world.N))
@@ -205,14 +200,13 @@ def show_both_visualizations(grid_world) -> None:
     
     def update(frame):
         """Update function for animation."""
-        row, col = path[frame]
-        agent_marker.set_data(col, row)
+        agent_marker.set_data([cols[frame]], [rows[frame]])
         return agent_marker,
     
     ax2.set_title("Agent Path Animation", fontsize=14, fontweight='bold')
     
     # Create animation
-    ani = animation.FuncAnimation(fig, update, frames=len(path), 
+    ani = animation.FuncAnimation(fig, update, frames=len(rows), 
                                  interval=800, repeat=False, blit=True)
     
     plt.tight_layout()
@@ -0,0 +1,248 @@
+"""
+Declarative, spatially varying wind specification for StochasticGridWorld.
+
+A WindField is a default set of wind parameters plus an ordered list of
+rectangular regions that override them (a single cell is a 1x1 region; later
+regions win where they overlap). Each parameter set follows the model of
+StochasticGridWorld._initialize_wind_probabilities:
+
+    success  - probability that the primary direction succeeds
+    straight - probability of no lateral drift
+    left     - probability of drifting left (west for N/S, north for E/W)
+    right    - probability of drifting right (east for N/S, south for E/W)
+
+compile_wind_field turns a field into a TransitionModel. Compiled models are
+memoized by the field's content hash, and the rows of each region are cached
+separately, so editing one region only recompiles that region's rows. Edit a
+field through its methods: they bump WindField.version, which lets holders of
+a compiled model (e.g. StochasticGridWorld.transitions) notice the change.
+"""
+
+import hashlib
+import json
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional, Any
+
+from transition_model import TransitionModel, compile_rows, make_absorbing
+
+
+DEFAULT_WIND = {'success': 0.9, 'straight': 0.8, 'left': 0.1, 'right': 0.1}
+
+# Number of outcome slots per (state, action); every wind table has six outcomes
+OUTCOMES_PER_ACTION = 6
+
+_MODEL_CACHE_SIZE = 16
+_BLOCK_CACHE_SIZE = 256
+_model_cache: 'OrderedDict[str, TransitionModel]' = OrderedDict()
+_block_cache: 'OrderedDict[str, Tuple[np.ndarray, np.ndarray]]' = OrderedDict()
+# Guards both caches, so models can be compiled from several threads
+_cache_lock = threading.Lock()
+
+
+def wind_outcomes(success: float = 0.9, straight: float = 0.8, left: float = 0.1,
+                  right: float = 0.1) -> Dict[str, List[Tuple[Tuple[int, int], float]]]:
+    """
+    Build a wind probability table from success and drift probabilities.
+
+    With the default arguments this reproduces
+    StochasticGridWorld._initialize_wind_probabilities exactly.
+
+    Returns:
+        Dictionary mapping actions to list of (outcome, probability) tuples
+    """
+    failure = 1.0 - success
+    return {
+        'N': [((-1, 0), success * straight), ((-1, 1), success * right), ((-1, -1), success * left),
+              ((0, 1), failure * right), ((0, -1), failure * left), ((0, 0), failure * straight)],
+        'S': [((1, 0), success * straight), ((1, 1), success * right), ((1, -1), success * left),
+              ((0, 1), failure * right), ((0, -1), failure * left), ((0, 0), failure * straight)],
+        'E': [((0, 1), success * straight), ((-1, 1), success * left), ((1, 1), success * right),
+              ((-1, 0), failure * left), ((1, 0), failure * right), ((0, 0), failure * straight)],
+        'W': [((0, -1), success * straight), ((-1, -1), success * left), ((1, -1), success * right),
+              ((-1, 0), failure * left), ((1, 0), failure * right), ((0, 0), failure * straight)],
+    }
+
+
+class WindField:
+    """
+    Per-region wind parameters for an N x N grid.
+    """
+
+    def __init__(self, N: int, default: Optional[Dict[str, float]] = None,
+                 regions: Optional[List[Dict[str, Any]]] = None):
+        """
+        Initialize the WindField.
+
+        Args:
+            N: Size of the grid (N x N)
+            default: Wind parameters for cells not covered by any region
+            regions: List of dicts with 'rows' and 'cols' half-open (start, stop)
+                ranges plus any of 'success', 'straight', 'left', 'right'
+        """
+        self.N = N
+        self.default = self._validate(dict(DEFAULT_WIND, **(default or {})))
+        self.regions = []
+        # Incremented on every edit
+        self.version = 0
+        for region in regions or []:
+            self.add_region(**region)
+
+    def _validate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Check a parameter set and, for a region, its bounds; returns params."""
+        if 'rows' in params:
+            (r0, r1), (c0, c1) = params['rows'], params['cols']
+            if not (0 <= r0 < r1 <= self.N and 0 <= c0 < c1 <= self.N):
+                raise ValueError(f"Region rows={params['rows']}, cols={params['cols']} "
+                                 f"is outside the {self.N}x{self.N} grid")
+        for key in DEFAULT_WIND:
+            if not 0.0 <= params[key] <= 1.0:
+                raise ValueError(f"{key} must be in [0, 1], got {params[key]}")
+        drift = params['straight'] + params['left'] + params['right']
+        if abs(drift - 1.0) > 1e-9:
+            raise ValueError(f"straight + left + right must sum to 1, got {drift}")
+        return params
+
+    def add_region(self, rows: Tuple[int, int], cols: Tuple[int, int], **params) -> int:
+        """
+        Append a rectangular region and return its index.
+
+        Unspecified parameters fall back to the field's default.
+        """
+        region = self._validate({'rows': tuple(rows), 'cols': tuple(cols), **self.default, **params})
+        self.regions.append(region)
+        self.version += 1
+        return len(self.regions) - 1
+
+    def set_cell(self, position: Tuple[int, int], **params) -> int:
+        """Override the wind parameters of a single cell."""
+        row, col = position
+        return self.add_region((row, row + 1), (col, col + 1), **params)
+
+    def update_region(self, index: int, **params) -> None:
+        """Change the parameters (or 'rows'/'cols' bounds) of an existing region."""
+        region = dict(self.regions[index], **params)
+        region['rows'], region['cols'] = tuple(region['rows']), tuple(region['cols'])
+        self.regions[index] = self._validate(region)
+        self.version += 1
+
+    def is_uniform(self) -> bool:
+        """True if every cell uses the default parameters."""
+        keys = DEFAULT_WIND.keys()
+        return all(all(region[k] == self.default[k] for k in keys) for region in self.regions)
+
+    def params_at(self, row: int, col: int) -> Dict[str, float]:
+        """Return the wind parameters in effect at a cell."""
+        params = self.default
+        for region in self.regions:
+            r0, r1 = region['rows']
+            c0, c1 = region['cols']
+            if r0 <= row < r1 and c0 <= col < c1:
+                params = region
+        return params
+
+    def outcomes_at(self, row: int, col: int) -> Dict[str, List[Tuple[Tuple[int, int], float]]]:
+        """Return the wind probability table in effect at a cell."""
+        params = self.params_at(row, col)
+        return wind_outcomes(params['success'], params['straight'], params['left'], params['right'])
+
+    def default_outcomes(self) -> Dict[str, List[Tuple[Tuple[int, int], float]]]:
+        """Return the wind probability table of the default parameters."""
+        p = self.default
+        return wind_outcomes(p['success'], p['straight'], p['left'], p['right'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a JSON-serializable description of the field."""
+        keys = list(DEFAULT_WIND.keys())
+        return {
+            'N': self.N,
+            'default': {k: self.default[k] for k in keys},
+            'regions': [{'rows': list(r['rows']), 'cols': list(r['cols']), **{k: r[k] for k in keys}}
+                        for r in self.regions],
+        }
+
+    def fingerprint(self) -> str:
+        """Return a content hash of the field."""
+        return _hash(self.to_dict())
+
+
+def _hash(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+def _remember(cache: OrderedDict, key: str, value: Any, size: int) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+
+def _compile_block(N: int, rows: Tuple[int, int], cols: Tuple[int, int],
+                   params: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Compile (or fetch from cache) the transition rows of one rectangular block."""
+    key = _hash({'N': N, 'rows': list(rows), 'cols': list(cols),
+                 'params': {k: params[k] for k in DEFAULT_WIND}})
+    if key in _block_cache:
+        _block_cache.move_to_end(key)
+        return _block_cache[key]
+
+    rr, cc = np.meshgrid(np.arange(*rows), np.arange(*cols), indexing='ij')
+    table = wind_outcomes(params['success'], params['straight'], params['left'], params['right'])
+    block = compile_rows(N, rr.ravel(), cc.ravel(), table, OUTCOMES_PER_ACTION)
+    _remember(_block_cache, key, block, _BLOCK_CACHE_SIZE)
+    return block
+
+
+def transition_fingerprint(field: WindField, terminal: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """
+    Describe everything a compiled model depends on: grid shape, wind and terminal.
+    """
+    return {
+        'model': 'wind_field',
+        'boundary': 'clip',
+        'width': OUTCOMES_PER_ACTION,
+        'field': field.to_dict(),
+        'terminal': list(terminal) if terminal else None,
+    }
+
+
+def compile_wind_field(field: WindField, terminal: Optional[Tuple[int, int]] = None) -> TransitionModel:
+    """
+    Compile a WindField into a TransitionModel, memoized by content hash.
+
+    The terminal state, if given, is made absorbing.
+    """
+    key = _hash(transition_fingerprint(field, terminal))
+    with _cache_lock:
+        return _compile_model(key, field, terminal)
+
+
+def _compile_model(key: str, field: WindField, terminal: Optional[Tuple[int, int]]) -> TransitionModel:
+    if key in _model_cache:
+        _model_cache.move_to_end(key)
+        return _model_cache[key]
+
+    N = field.N
+    next_states, probs = _compile_block(N, (0, N), (0, N), field.default)
+    next_states = next_states.copy()
+    probs = probs.copy()
+
+    # Overlay regions in order so that later regions win
+    for region in field.regions:
+        r0, r1 = region['rows']
+        c0, c1 = region['cols']
+        block_next, block_probs = _compile_block(N, (r0, r1), (c0, c1), region)
+        rr, cc = np.meshgrid(np.arange(r0, r1), np.arange(c0, c1), indexing='ij')
+        states = (rr * N + cc).ravel()
+        next_states[states] = block_next
+        probs[states] = block_probs
+
+    if terminal is not None:
+        make_absorbing(next_states, probs, terminal[0] * N + terminal[1])
+
+    next_states.flags.writeable = False
+    probs.flags.writeable = False
+    model = TransitionModel(N, next_states, probs, terminal)
+    _remember(_model_cache, key, model, _MODEL_CACHE_SIZE)
+    return model
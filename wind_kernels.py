@@ -0,0 +1,113 @@
+"""
+Stencil (2D convolution) Bellman backups for the windy StochasticGridWorld.
+
+Away from the borders the wind model is translation-invariant: every action is a
+fixed 3x3 stencil of outcome probabilities. The expected one-step return
+E[r + gamma * V(s')] for all cells and all four actions is therefore a handful
+of shifted multiply-adds over a padded copy of (rewards + gamma * values).
+
+The clip-to-boundary semantics of StochasticGridWorld.move and
+get_transition_probabilities are reproduced by the edge fix-up of the padded
+buffer: the one-cell border replicates the outermost row/column, so an offset
+that leaves the grid reads the clamped neighbour.
+"""
+
+import numpy as np
+from typing import Dict, List, Tuple, Optional
+
+
+ACTIONS = ['N', 'S', 'E', 'W']
+
+
+def wind_stencils(wind_probs: Dict[str, List[Tuple[Tuple[int, int], float]]]) -> np.ndarray:
+    """
+    Convert a wind probability table into one 3x3 stencil per action.
+
+    Args:
+        wind_probs: Mapping of action to list of ((row_change, col_change), probability)
+
+    Returns:
+        Array of shape (4, 3, 3) where stencils[a, dr + 1, dc + 1] is the
+        probability of offset (dr, dc) under action ACTIONS[a]
+    """
+    stencils = np.zeros((len(ACTIONS), 3, 3))
+    for a, action in enumerate(ACTIONS):
+        for (row_change, col_change), prob in wind_probs[action]:
+            if abs(row_change) > 1 or abs(col_change) > 1:
+                raise ValueError(f"Wind offset ({row_change}, {col_change}) does not fit a 3x3 stencil")
+            stencils[a, row_change + 1, col_change + 1] += prob
+    return stencils
+
+
+class StencilBackup:
+    """
+    Allocation-free Bellman backup kernel for a uniform wind model.
+
+    All buffers are allocated once in the constructor; each call to backup()
+    only writes into them, so a sweep over a very large map touches a few
+    contiguous arrays and creates no temporaries.
+    """
+
+    def __init__(self, rewards, wind_probs: Dict[str, List[Tuple[Tuple[int, int], float]]]):
+        """
+        Initialize the kernel.
+
+        Args:
+            rewards: 2D list or array of rewards for each cell (N x N)
+            wind_probs: Wind probability table, as built by
+                StochasticGridWorld._initialize_wind_probabilities
+        """
+        self.rewards = np.asarray(rewards, dtype=float)
+        self.N = self.rewards.shape[0]
+        self.stencils = wind_stencils(wind_probs)
+
+        # Non-zero taps per action: (row_offset, col_offset, probability)
+        self.taps = [
+            [(dr - 1, dc - 1, self.stencils[a, dr, dc])
+             for dr in range(3) for dc in range(3) if self.stencils[a, dr, dc] != 0.0]
+            for a in range(len(ACTIONS))
+        ]
+
+        self._target = np.empty((self.N + 2, self.N + 2))
+        self._scratch = np.empty((self.N, self.N))
+        self._q = np.empty((len(ACTIONS), self.N, self.N))
+
+    def _fill_target(self, value: np.ndarray, gamma: float) -> np.ndarray:
+        """Write rewards + gamma * value into the padded buffer and fix up its edges."""
+        target = self._target
+        interior = target[1:-1, 1:-1]
+        np.multiply(value, gamma, out=interior)
+        np.add(interior, self.rewards, out=interior)
+
+        # Edge fix-up: replicate the border so out-of-grid offsets clamp
+        target[0, 1:-1] = target[1, 1:-1]
+        target[-1, 1:-1] = target[-2, 1:-1]
+        target[:, 0] = target[:, 1]
+        target[:, -1] = target[:, -2]
+        return target
+
+    def backup(self, value, gamma: float = 1.0, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compute E[r + gamma * V(s')] for every cell and every action.
+
+        Args:
+            value: Current value function (N x N)
+            gamma: Discount factor
+            out: Optional (4, N, N) array to write into; defaults to an internal buffer
+
+        Returns:
+            Array of shape (4, N, N) indexed like ACTIONS
+        """
+        target = self._fill_target(np.asarray(value, dtype=float), gamma)
+        q = self._q if out is None else out
+        scratch = self._scratch
+        N = self.N
+
+        for a, taps in enumerate(self.taps):
+            q[a].fill(0.0)
+            for row_change, col_change, prob in taps:
+                shifted = target[1 + row_change:1 + row_change + N, 1 + col_change:1 + col_change + N]
+                np.multiply(shifted, prob, out=scratch)
+                np.add(q[a], scratch, out=q[a])
+
+        return q